@@ -1,19 +1,55 @@
 import sqlite3
+import csv
+import json
 import os
+import re
+import shlex
 import sys
+import argparse
 import datetime
-from openai import OpenAI
+import hashlib
+import io
+import mmap
+import queue
+import threading
+import time
+import zlib
+from collections import defaultdict, deque
+from contextlib import contextmanager, redirect_stdout
 
 # ==========================================
 # CONFIGURATION & COLORS
 # ==========================================
-try:
-    client = OpenAI()
-except:
-    print("Warning: OpenAI API Key not found. AI features will fail nicely.")
-    client = None
+# The OpenAI client is built by get_client() on the first question. Importing
+# openai (httpx, pydantic, ...) costs more than the rest of startup put
+# together, and most commands never need it.
+NOT_LOADED = object()
+client = NOT_LOADED
 
 DB_NAME = "pkms_data.db"
+AI_MODEL = "gpt-4o-mini"
+# Upper bound on how much of the database is sent along with each question
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("PKMS_CONTEXT_TOKENS", "1500"))
+# Cached AI answers: how long they stay valid and how many are kept (LRU)
+CACHE_TTL_SECONDS = int(os.environ.get("PKMS_CACHE_TTL", str(24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.environ.get("PKMS_CACHE_SIZE", "500"))
+# Per-command measurements kept for `stats`, and an optional JSONL trace file
+METRICS_HISTORY = int(os.environ.get("PKMS_METRICS_HISTORY", "1000"))
+TRACE_FILE = os.environ.get("PKMS_TRACE")
+# Durability level, the same three levels as the tasks2/3/5 JSON stores:
+#   strict  synchronous=FULL, batch mode commits after every command
+#   normal  synchronous=NORMAL, batch mode commits once at the end (default)
+#   fast    synchronous=OFF, batch mode commits once at the end
+DURABILITY_LEVELS = {
+    "strict": {"synchronous": "FULL", "commit_every": 1},
+    "normal": {"synchronous": "NORMAL", "commit_every": None},
+    "fast": {"synchronous": "OFF", "commit_every": None},
+}
+DURABILITY = os.environ.get("PKMS_DURABILITY", "normal")
+# Note bodies over this many bytes live in the blob store; the row keeps a preview
+NOTE_BLOB_THRESHOLD = int(os.environ.get("PKMS_BLOB_THRESHOLD", "4096"))
+NOTE_PREVIEW_CHARS = 300
+BLOB_GC_GRACE = 3600  # `blobs gc` leaves files touched in the last hour alone
 
 # ANSI Color Codes for Terminal Output
 class Colors:
@@ -27,158 +63,2240 @@ class Colors:
     BOLD = '\033[1m'
     UNDERLINE = '\033[4m'
 
+# ==========================================
+# INSTRUMENTATION
+# ==========================================
+class Metrics:
+    """Wall time, SQL statements and rows fetched for every command, plus AI API calls.
+
+    run_command() opens a record per command; Database.execute() adds to the
+    open record. Records feed `stats` and, if a trace file is set, are also
+    written as one JSON line each for offline analysis.
+    """
+
+    def __init__(self, history=METRICS_HISTORY):
+        self.commands = deque(maxlen=history)
+        self.api_calls = deque(maxlen=history)
+        self.current = None
+        self.trace = None
+
+    def start(self, command):
+        words = command.split()
+        self.current = {"command": command, "name": words[0].lower() if words else "",
+                        "sql": 0, "rows": 0, "started": time.perf_counter()}
+        return self.current
+
+    def finish(self, record, ok):
+        record["wall_ms"] = (time.perf_counter() - record.pop("started")) * 1000
+        record["ok"] = bool(ok)
+        self.current = None
+        self.commands.append(record)
+        self.emit("command", **record)
+
+    def api(self, job):
+        """Record a finished AI job (called on the main thread)."""
+        call = {"job": job.id, "status": job.status, "api_ms": (job.api_seconds or 0) * 1000,
+                "prompt_tokens": job.prompt_tokens, "completion_tokens": job.completion_tokens}
+        self.api_calls.append(call)
+        self.emit("api", **call)
+
+    def open_trace(self, path):
+        self.close_trace()
+        self.trace = open(path, "a", encoding="utf-8")
+
+    def close_trace(self):
+        if self.trace is not None:
+            self.trace.close()
+            self.trace = None
+
+    def emit(self, event, **fields):
+        if self.trace is not None:
+            self.trace.write(json.dumps({"ts": time.time(), "event": event, **fields}, ensure_ascii=False) + "\n")
+            self.trace.flush()
+
+
+class CountingCursor:
+    """Wraps a sqlite3 cursor and counts the rows fetched through it."""
+
+    __slots__ = ("cursor", "record")
+
+    def __init__(self, cursor, record):
+        self.cursor = cursor
+        self.record = record
+
+    def __iter__(self):
+        for row in self.cursor:
+            self.record["rows"] += 1
+            yield row
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        if row is not None:
+            self.record["rows"] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self.cursor.fetchmany(size) if size is not None else self.cursor.fetchmany()
+        self.record["rows"] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        self.record["rows"] += len(rows)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+metrics = Metrics()
+
+# ==========================================
+# BLOB STORE (large note bodies)
+# ==========================================
+class BlobStore:
+    """Large note bodies, zlib-compressed in files named by their SHA-256.
+
+    pkms_data.db keeps its blobs in pkms_data.blobs/ab/abcdef…; identical
+    bodies are stored once. The notes row holds a preview plus the hash, so
+    scans, the page cache and search results stay small, and a body is only
+    read (through mmap) when a note is opened.
+    """
+
+    def __init__(self, db_path):
+        self.root = os.path.splitext(db_path)[0] + ".blobs"
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put(self, text):
+        """Store a body and return its hash. Written (and synced) before the row that points to it."""
+        data = text.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if os.path.exists(path):
+            os.utime(path)  # in use again: keep it out of `blobs gc`
+            return digest
+        folder = os.path.dirname(path)
+        os.makedirs(folder, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(zlib.compress(data))
+            if DURABILITY != "fast":
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        if DURABILITY == "strict" and os.name != "nt":
+            for name in (folder, self.root):
+                fd = os.open(name, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+        return digest
+
+    def get(self, digest):
+        with open(self.path(digest), "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                return zlib.decompress(buf).decode("utf-8")
+
+    def body(self, content, digest):
+        """The full text of a note from its row: `content` itself, or the body `digest` points to."""
+        if digest is None:
+            return content
+        try:
+            return self.get(digest)
+        except (OSError, ValueError, zlib.error):
+            return content  # body missing or damaged: the preview is all we have
+
+    def files(self):
+        """(hash, path) of every stored body."""
+        if not os.path.isdir(self.root):
+            return
+        for folder in os.scandir(self.root):
+            if folder.is_dir():
+                for entry in os.scandir(folder.path):
+                    yield entry.name, entry.path
+
+    def gc(self, referenced):
+        """Remove bodies no note points to (and leftovers of interrupted writes). Returns (files, bytes)."""
+        removed = freed = 0
+        cutoff = time.time() - BLOB_GC_GRACE
+        for name, path in list(self.files()):
+            if name in referenced:
+                continue
+            try:
+                info = os.stat(path)
+                if info.st_mtime > cutoff:
+                    continue  # may belong to a note another process is still saving
+                os.remove(path)
+            except OSError:
+                continue
+            removed += 1
+            freed += info.st_size
+        return removed, freed
+
+
 # ==========================================
 # DATABASE SETUP (SQLite)
 # ==========================================
-def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    
+class Database:
+    """One long-lived SQLite connection shared by the whole REPL session.
+
+    Opening a connection, committing and closing it again for every command
+    used to dominate the runtime. Instead we connect once in init_db(), apply
+    the tuned PRAGMAs a single time and let sqlite3's statement cache keep the
+    compiled version of every query we run.
+    """
+
+    # Applied once per connection (see open()).
+    PRAGMAS = (
+        ("journal_mode", "WAL"),      # readers never block the writer
+        ("cache_size", -20000),       # ~20 MB page cache
+        ("mmap_size", 268435456),     # map up to 256 MB of the file
+        ("temp_store", "MEMORY"),
+    )
+    STATEMENT_CACHE_SIZE = 256
+
+    def __init__(self):
+        self.conn = None
+        self.path = None
+        self.has_fts = False
+        self.captured = None   # list of (sql, params) while `explain` runs a command
+        self.blobs = None
+        self._depth = 0
+
+    def open(self, path):
+        if self.conn is not None:
+            if self.path == path:
+                return self
+            self.close()
+        # isolation_level=None puts the connection in autocommit mode, so a
+        # lone statement is its own (cheap, WAL) transaction and grouped work
+        # goes through transaction() below.
+        self.conn = sqlite3.connect(path, isolation_level=None,
+                                    cached_statements=self.STATEMENT_CACHE_SIZE)
+        for name, value in self.PRAGMAS:
+            self.conn.execute(f"PRAGMA {name} = {value}")
+        self.blobs = BlobStore(path)
+        # NORMAL: no fsync per commit in WAL mode; FULL: fsync every commit
+        self.conn.execute(f"PRAGMA synchronous = {DURABILITY_LEVELS[DURABILITY]['synchronous']}")
+        self.path = path
+        self._depth = 0
+        return self
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+            self.path = None
+            self._depth = 0
+
+    def execute(self, sql, params=()):
+        if self.conn is None:
+            self.open(DB_NAME)
+        if self.captured is not None:
+            self.captured.append((sql, params))
+        cursor = self.conn.execute(sql, params)
+        record = metrics.current
+        if record is None:
+            return cursor
+        record["sql"] += 1
+        return CountingCursor(cursor, record)
+
+    def executemany(self, sql, seq):
+        if self.conn is None:
+            self.open(DB_NAME)
+        cursor = self.conn.executemany(sql, seq)
+        if metrics.current is not None:
+            metrics.current["sql"] += max(cursor.rowcount, 1)
+        return cursor
+
+    def commit(self):
+        """Commit the open transaction and start a new one (group commit in batch mode)."""
+        if self._depth:
+            self.conn.execute("COMMIT")
+            self.conn.execute("BEGIN")
+
+    @contextmanager
+    def transaction(self):
+        """Group several statements into one commit. Nested use joins the outer transaction."""
+        if self.conn is None:
+            self.open(DB_NAME)
+        if self._depth:
+            self._depth += 1
+            try:
+                yield self
+            finally:
+                self._depth -= 1
+            return
+        self.conn.execute("BEGIN")
+        self._depth = 1
+        try:
+            yield self
+        except BaseException:
+            self._depth = 0
+            self.conn.execute("ROLLBACK")
+            raise
+        else:
+            self._depth = 0
+            self.conn.execute("COMMIT")
+
+
+db = Database()
+
+# Priorities and timestamps are stored as integers so they can be indexed and
+# sorted by SQLite directly (schema version 2).
+PRIORITY_RANKS = {"low": 1, "medium": 2, "high": 3}
+PRIORITY_NAMES = {rank: name.capitalize() for name, rank in PRIORITY_RANKS.items()}
+STATUS_VALUES = {"pending": "pending", "done": "DONE"}
+DATE_FORMAT = "%Y-%m-%d %H:%M"
+
+
+def to_epoch(text):
+    """Parse 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM' (local time) into epoch seconds."""
+    for fmt in (DATE_FORMAT, "%Y-%m-%d"):
+        try:
+            return int(datetime.datetime.strptime(text.strip(), fmt).timestamp())
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid date '{text}'. Use YYYY-MM-DD or 'YYYY-MM-DD HH:MM'.")
+
+def format_epoch(epoch):
+    return datetime.datetime.fromtimestamp(epoch).strftime(DATE_FORMAT)
+
+
+# ==========================================
+# SCHEMA MIGRATIONS (tracked in PRAGMA user_version)
+# ==========================================
+def migrate_v1():
+    """Original schema: text columns, plus the notes search index."""
     # Create Tasks Table with Priority and Date
-    c.execute('''CREATE TABLE IF NOT EXISTS tasks (
+    db.execute('''CREATE TABLE IF NOT EXISTS tasks (
                     id INTEGER PRIMARY KEY, 
                     description TEXT, 
                     status TEXT, 
                     priority TEXT,
                     created_at TEXT
                 )''')
-    
+
     # Create Notes Table
-    c.execute('''CREATE TABLE IF NOT EXISTS notes (
+    db.execute('''CREATE TABLE IF NOT EXISTS notes (
                     id INTEGER PRIMARY KEY, 
                     title TEXT, 
                     content TEXT,
                     created_at TEXT
                 )''')
-    conn.commit()
-    conn.close()
+
+    init_search_index()
+
+def migrate_v2():
+    """Typed tasks: integer priority rank, epoch timestamps and composite indexes."""
+    db.execute('''CREATE TABLE tasks_v2 (
+                    id INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    priority INTEGER NOT NULL DEFAULT 2,
+                    created_at INTEGER NOT NULL
+                )''')
+    rows = []
+    for t_id, desc, status, prio, date in db.execute(
+            "SELECT id, description, status, priority, created_at FROM tasks"):
+        rank = PRIORITY_RANKS.get(str(prio).lower(), PRIORITY_RANKS["medium"])
+        try:
+            epoch = to_epoch(date or "")
+        except ValueError:
+            epoch = 0
+        rows.append((t_id, desc or "", status or "pending", rank, epoch))
+    db.executemany("INSERT INTO tasks_v2 VALUES (?, ?, ?, ?, ?)", rows)
+    db.execute("DROP TABLE tasks")
+    db.execute("ALTER TABLE tasks_v2 RENAME TO tasks")
+    # Serve "status + priority order" and "status + date range" from indexes
+    db.execute("CREATE INDEX idx_tasks_status_priority_created ON tasks (status, priority, created_at)")
+    db.execute("CREATE INDEX idx_tasks_status_created ON tasks (status, created_at)")
+
+def migrate_v3():
+    """Response cache for ask_ai."""
+    db.execute('''CREATE TABLE IF NOT EXISTS ai_cache (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at INTEGER NOT NULL,
+                    last_used INTEGER NOT NULL
+                )''')
+    db.execute("CREATE INDEX IF NOT EXISTS idx_ai_cache_last_used ON ai_cache (last_used)")
+
+def migrate_v4():
+    """Large note bodies move to the blob store; the row keeps a preview and the blob hash."""
+    db.execute("ALTER TABLE notes ADD COLUMN blob TEXT")
+    has_fts = db.execute("SELECT 1 FROM sqlite_master WHERE name='notes_fts'").fetchone() is not None
+    # Dropped first: the moved notes keep their full bodies in the index
+    for trigger in ("notes_ai", "notes_ad", "notes_au"):
+        db.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    large = db.execute("SELECT id, content FROM notes WHERE length(CAST(content AS BLOB)) > ?",
+                       (NOTE_BLOB_THRESHOLD,)).fetchall()
+    db.executemany("UPDATE notes SET content = ?, blob = ? WHERE id = ?",
+                   (split_body(content) + (note_id,) for note_id, content in large))
+    if not has_fts:
+        return
+    # The triggers index notes kept inline. A body in the blob store is indexed
+    # by index_note_body() on the write path, so plain SQL (the sqlite3 shell,
+    # backups, other tools) can still insert and delete notes.
+    db.execute('''CREATE TRIGGER notes_ai AFTER INSERT ON notes WHEN new.blob IS NULL BEGIN
+                    INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+                END''')
+    db.execute('''CREATE TRIGGER notes_ad AFTER DELETE ON notes WHEN old.blob IS NULL BEGIN
+                    INSERT INTO notes_fts(notes_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+                END''')
+    db.execute('''CREATE TRIGGER notes_au AFTER UPDATE ON notes BEGIN
+                    INSERT INTO notes_fts(notes_fts, rowid, title, content)
+                        SELECT 'delete', old.id, old.title, old.content WHERE old.blob IS NULL;
+                    INSERT INTO notes_fts(rowid, title, content)
+                        SELECT new.id, new.title, new.content WHERE new.blob IS NULL;
+                END''')
+
+# MIGRATIONS[n] upgrades a database from user_version n to n + 1
+MIGRATIONS = [migrate_v1, migrate_v2, migrate_v3, migrate_v4]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def init_db():
+    db.open(DB_NAME)
+
+    version = db.execute("PRAGMA user_version").fetchone()[0]
+    for target in range(version + 1, SCHEMA_VERSION + 1):
+        with db.transaction():
+            MIGRATIONS[target - 1]()
+            db.execute(f"PRAGMA user_version = {target}")
+
+    db.has_fts = db.execute("SELECT 1 FROM sqlite_master WHERE name='notes_fts'").fetchone() is not None
+
+
+def init_search_index():
+    """Create the FTS5 index over notes and backfill it the first time."""
+    exists = db.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='notes_fts'").fetchone()
+    if exists:
+        return
+    try:
+        # External-content table: the text lives in notes, FTS only keeps the index
+        db.execute('''CREATE VIRTUAL TABLE notes_fts USING fts5(
+                        title, content, content='notes', content_rowid='id'
+                    )''')
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5: search falls back to LIKE
+        return
+
+    # Keep the index in sync with the notes table
+    db.execute('''CREATE TRIGGER IF NOT EXISTS notes_ai AFTER INSERT ON notes BEGIN
+                    INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+                END''')
+    db.execute('''CREATE TRIGGER IF NOT EXISTS notes_ad AFTER DELETE ON notes BEGIN
+                    INSERT INTO notes_fts(notes_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+                END''')
+    db.execute('''CREATE TRIGGER IF NOT EXISTS notes_au AFTER UPDATE ON notes BEGIN
+                    INSERT INTO notes_fts(notes_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+                    INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+                END''')
+
+    # One-time backfill for databases created before the index existed
+    db.execute("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')")
 
 # ==========================================
 # CORE FUNCTIONS
 # ==========================================
 def add_task(description, priority="Medium"):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+    now = int(datetime.datetime.now().timestamp())
     
     # Validate priority
-    if priority.lower() not in ["high", "medium", "low"]:
+    if priority.lower() not in PRIORITY_RANKS:
         priority = "Medium"
         
-    c.execute("INSERT INTO tasks (description, status, priority, created_at) VALUES (?, ?, ?, ?)", 
-              (description, 'pending', priority.capitalize(), date))
-    conn.commit()
-    conn.close()
+    c = db.execute("INSERT INTO tasks (description, status, priority, created_at) VALUES (?, ?, ?, ?)", 
+                   (description, 'pending', PRIORITY_RANKS[priority.lower()], now))
     print(f"{Colors.GREEN}✅ Task added: {description} [{priority}]{Colors.ENDC}")
+    return c.lastrowid
 
 def mark_done(task_id):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("UPDATE tasks SET status = 'DONE' WHERE id = ?", (task_id,))
+    c = db.execute("UPDATE tasks SET status = 'DONE' WHERE id = ?", (task_id,))
     if c.rowcount == 0:
         print(f"{Colors.FAIL}❌ Task ID {task_id} not found.{Colors.ENDC}")
-    else:
-        print(f"{Colors.GREEN}🎉 Task {task_id} marked as COMPLETED!{Colors.ENDC}")
-    conn.commit()
-    conn.close()
+        return False
+    print(f"{Colors.GREEN}🎉 Task {task_id} marked as COMPLETED!{Colors.ENDC}")
+    return True
 
 def delete_item(item_type, item_id):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
     table = "tasks" if item_type == "task" else "notes"
-    c.execute(f"DELETE FROM {table} WHERE id = ?", (item_id,))
-    conn.commit()
+    if table == "notes":
+        # a body in the blob store leaves the search index here, not in a trigger
+        row = db.execute("SELECT title, content, blob FROM notes WHERE id = ? AND blob IS NOT NULL",
+                         (item_id,)).fetchone()
+        if row is not None:
+            index_note_body(item_id, row[0], db.blobs.body(row[1], row[2]), delete=True)
+    c = db.execute(f"DELETE FROM {table} WHERE id = ?", (item_id,))
+    if c.rowcount == 0:
+        print(f"{Colors.FAIL}❌ {item_type.capitalize()} #{item_id} not found.{Colors.ENDC}")
+        return False
+    if table == "notes" and vector_index is not None and vector_index.db_path == db.path:
+        vector_index.remove(item_id)
     print(f"{Colors.WARNING}🗑️  Deleted {item_type} #{item_id}{Colors.ENDC}")
-    conn.close()
-
-def list_tasks():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT id, description, status, priority, created_at FROM tasks")
-    rows = c.fetchall()
-    conn.close()
-    
+    return True
+
+# ORDER BY clauses for `list --sort`. With a status filter the first two are
+# read straight off the composite indexes, without a sort step.
+TASK_SORTS = {
+    "id": "id",
+    "priority": "priority DESC, created_at DESC, id DESC",
+    "date": "created_at, id",
+}
+
+# Keyset pagination: continue after a given task id in the current sort order
+TASK_KEYSETS = {
+    "id": "id > ?",
+    "priority": "(priority, created_at, id) < (SELECT priority, created_at, id FROM tasks WHERE id = ?)",
+    "date": "(created_at, id) > (SELECT created_at, id FROM tasks WHERE id = ?)",
+}
+PAGE_SIZE = 20      # rows per page for `--page`
+
+def anchor_missing(conn, sort, after):
+    """True when `--after` names a deleted task under a sort that needs its keys.
+
+    The keyset subquery would match nothing and the page would come back
+    empty, as if the listing were finished.
+    """
+    return (after is not None and sort != "id"
+            and conn.execute("SELECT 1 FROM tasks WHERE id = ?", (after,)).fetchone() is None)
+
+MISSING_ANCHOR = "Task #{} no longer exists, so the listing cannot continue after it. Start again without --after."
+RENDER_BATCH = 500  # rows fetched and written to the terminal at a time
+
+def query_tasks(status=None, priority=None, since=None, until=None, sort="id", after=None, limit=None):
+    """Build the SELECT for list_tasks. Returns (sql, params)."""
+    where, params = [], []
+    if status is not None:
+        where.append("status = ?")
+        params.append(STATUS_VALUES[status.lower()])
+    if priority is not None:
+        where.append("priority = ?")
+        params.append(PRIORITY_RANKS[priority.lower()])
+    if since is not None:
+        where.append("created_at >= ?")
+        params.append(since)
+    if until is not None:
+        where.append("created_at < ?")
+        params.append(until)
+    if after is not None:
+        where.append(TASK_KEYSETS[sort])
+        params.append(after)
+    sql = "SELECT id, description, status, priority, created_at FROM tasks"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY " + TASK_SORTS[sort]
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return sql, params
+
+def stream_rows(cursor, render, batch_size=RENDER_BATCH):
+    """Write rows to stdout in buffered chunks as they come off the cursor.
+
+    Only one batch is held in memory at a time. Returns (row count, last row).
+    """
+    count, last = 0, None
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        sys.stdout.write("".join(render(r) for r in batch))
+        sys.stdout.flush()
+        count += len(batch)
+        last = batch[-1]
+    return count, last
+
+def paginate(fetch_page, render, limit=None, after=None, page=False):
+    """Stream one page (or every page, with a prompt in between when `page` is set).
+
+    fetch_page(after, limit) returns a cursor; `after` is the id of the last row shown.
+    Returns (rows shown, id to continue after or None when there is nothing left).
+    """
+    if page and limit is None:
+        limit = PAGE_SIZE
+    shown = 0
+    while True:
+        count, last = stream_rows(fetch_page(after, limit), render)
+        shown += count
+        if last is not None:
+            after = last[0]
+        if limit is None or count < limit:
+            return shown, None
+        if not page:
+            return shown, after
+        if input(f"{Colors.BOLD}-- more? [Enter = next page, q = stop] --{Colors.ENDC} ").strip().lower() == "q":
+            return shown, after
+
+def format_task_row(r):
+    t_id, desc, status, rank, created = r
+    prio = PRIORITY_NAMES.get(rank, rank)
+
+    # Color Logic
+    color = Colors.CYAN
+    if status == 'DONE':
+        color = Colors.GREEN
+        desc = f"~{desc}~" # Strikethrough style
+    elif prio == 'High':
+        color = Colors.FAIL
+
+    return f"{color}[{t_id}] {desc} | Status: {status} | Priority: {prio} | {format_epoch(created)}{Colors.ENDC}\n"
+
+def list_tasks(status=None, priority=None, since=None, until=None, sort="id", limit=None, after=None, page=False):
+    def fetch_page(after, limit):
+        sql, params = query_tasks(status, priority, since, until, sort, after, limit)
+        return db.execute(sql, params)
+
+    if anchor_missing(db, sort, after):
+        print(f"{Colors.FAIL}❌ {MISSING_ANCHOR.format(after)}{Colors.ENDC}")
+        return False
     print(f"\n{Colors.HEADER}--- 📝 YOUR TASK LIST ---{Colors.ENDC}")
-    if not rows:
+    shown, next_after = paginate(fetch_page, format_task_row, limit, after, page)
+    if not shown:
         print("(No tasks found)")
-    
-    for r in rows:
-        t_id, desc, status, prio, date = r
-        
-        # Color Logic
-        color = Colors.CYAN
-        if status == 'DONE':
-            color = Colors.GREEN
-            desc = f"~{desc}~" # Strikethrough style
-        elif prio == 'High':
-            color = Colors.FAIL
-        
-        print(f"{color}[{t_id}] {desc} | Status: {status} | Priority: {prio} | {date}{Colors.ENDC}")
+    elif next_after is not None:
+        print(f"(More tasks: add --after {next_after})")
     print("-----------------------\n")
+    return True
+
+def parse_options(text, switches=()):
+    """Split `--name value` pairs (and bare `--switch` flags) into a dict."""
+    tokens = text.split()
+    opts = {}
+    while tokens:
+        flag = tokens.pop(0)
+        if flag.startswith("--") and flag[2:] in switches:
+            opts[flag[2:]] = True
+            continue
+        if not flag.startswith("--") or not tokens:
+            raise ValueError(f"Unexpected argument '{flag}'")
+        # Dates may carry a time: --since 2025-01-31 09:00
+        value = tokens.pop(0)
+        if flag in ("--since", "--until") and tokens and ":" in tokens[0]:
+            value += " " + tokens.pop(0)
+        opts[flag[2:]] = value
+    return opts
+
+def page_options(opts):
+    """Validate --limit/--after/--page, removing them from opts."""
+    paging = {}
+    for key in ("limit", "after"):
+        if key in opts:
+            try:
+                paging[key] = int(opts.pop(key))
+            except ValueError:
+                raise ValueError(f"--{key} must be a number")
+            if paging[key] < (1 if key == "limit" else 0):
+                raise ValueError(f"--{key} must be positive")
+    if opts.pop("page", False):
+        paging["page"] = True
+    return paging
+
+def parse_list_options(text):
+    """Parse `list` flags: --status, --priority, --since, --until, --sort and paging."""
+    opts = parse_options(text, switches=("page",))
+    filters = page_options(opts)
+    for key, value in opts.items():
+        if key == "status":
+            if value.lower() not in STATUS_VALUES:
+                raise ValueError("Status must be pending or done")
+            filters["status"] = value
+        elif key == "priority":
+            if value.lower() not in PRIORITY_RANKS:
+                raise ValueError("Priority must be high, medium or low")
+            filters["priority"] = value
+        elif key == "since":
+            filters["since"] = to_epoch(value)
+        elif key == "until":
+            # A bare date includes the whole day
+            epoch = to_epoch(value)
+            filters["until"] = epoch + 86400 if ":" not in value else epoch + 60
+        elif key == "sort":
+            if value.lower() not in TASK_SORTS:
+                raise ValueError("Sort must be id, priority or date")
+            filters["sort"] = value.lower()
+        else:
+            raise ValueError(f"Unknown option '--{key}'")
+    return filters
+
+def parse_notes_options(text):
+    """Parse `notes` flags: --limit, --after, --page."""
+    opts = parse_options(text, switches=("page",))
+    paging = page_options(opts)
+    if opts:
+        raise ValueError(f"Unknown option '--{next(iter(opts))}'")
+    return paging
+
+def split_body(content):
+    """(text kept in the row, blob hash or None). Bodies over NOTE_BLOB_THRESHOLD bytes go to the blob store."""
+    if len(content) * 4 <= NOTE_BLOB_THRESHOLD or len(content.encode("utf-8")) <= NOTE_BLOB_THRESHOLD:
+        return content, None
+    return content[:NOTE_PREVIEW_CHARS].rstrip() + " …", db.blobs.put(content)
+
+def index_note_body(note_id, title, body, delete=False):
+    """Add (or remove) the full body of a blob-store note in the search index.
+
+    The FTS triggers only see the preview kept in the row, so they skip these
+    notes and the write path indexes them here.
+    """
+    if not db.has_fts:
+        return
+    if delete:
+        db.execute("INSERT INTO notes_fts(notes_fts, rowid, title, content) VALUES ('delete', ?, ?, ?)",
+                   (note_id, title, body))
+    else:
+        db.execute("INSERT INTO notes_fts(rowid, title, content) VALUES (?, ?, ?)", (note_id, title, body))
 
 def add_note(title, content):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
     date = datetime.datetime.now().strftime("%Y-%m-%d")
-    c.execute("INSERT INTO notes (title, content, created_at) VALUES (?, ?, ?)", (title, content, date))
-    conn.commit()
-    conn.close()
+    preview, digest = split_body(content)
+    c = db.execute("INSERT INTO notes (title, content, blob, created_at) VALUES (?, ?, ?, ?)",
+                   (title, preview, digest, date))
+    if digest is not None:
+        index_note_body(c.lastrowid, title, content)
+    if vector_index is not None and vector_index.db_path == db.path:
+        # Large notes are embedded by their preview, like on a rebuild
+        vector_index.add(c.lastrowid, title, preview)
     print(f"{Colors.BLUE}✅ Note saved: {title}{Colors.ENDC}")
+    return c.lastrowid
+
+def fts_query(text, any_term=False):
+    """Turn free text into a safe FTS5 query: every word (or any word) must match as a prefix."""
+    words = re.findall(r"\w+", text)
+    return (" OR " if any_term else " ").join(f'"{w}"*' for w in words)
+
+# Search result text: an FTS snippet around the match, or for a blob-store
+# note the start of its preview (the body is only read when the note is opened)
+NOTE_SNIPPET = "CASE WHEN n.blob IS NULL THEN snippet(notes_fts, 1, ?, ?, '…', 12) ELSE substr(n.content, 1, 80) || ' …' END"
+
+def find_notes(query, limit=20):
+    """Return (id, title, snippet, score) for the best matching notes, best first."""
+    match = fts_query(query)
+    if db.has_fts and match:
+        # Matches are highlighted in yellow; the title goes back to bold afterwards
+        hl_on, hl_off = Colors.WARNING, Colors.ENDC
+        return db.execute(f'''SELECT n.id,
+                                     highlight(notes_fts, 0, ?, ?),
+                                     {NOTE_SNIPPET},
+                                     bm25(notes_fts, 10.0, 1.0) AS score
+                              FROM notes_fts JOIN notes n ON n.id = notes_fts.rowid
+                              WHERE notes_fts MATCH ?
+                              ORDER BY score LIMIT ?''',
+                          (hl_on, hl_off + Colors.BOLD, hl_on, hl_off, match, limit)).fetchall()
+    if db.has_fts:
+        return []
+    return db.execute("SELECT id, title, substr(content, 1, 80), 0 FROM notes WHERE title LIKE ? OR content LIKE ? LIMIT ?", 
+                      (f'%{query}%', f'%{query}%', limit)).fetchall()
 
 def search_notes(query):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT id, title, content FROM notes WHERE title LIKE ? OR content LIKE ?", 
-              (f'%{query}%', f'%{query}%'))
-    rows = c.fetchall()
-    conn.close()
+    rows = find_notes(query)
     print(f"\n{Colors.HEADER}--- 🔍 SEARCH RESULTS FOR '{query}' ---{Colors.ENDC}")
+    if not rows:
+        print("(No matching notes)")
     for r in rows:
         print(f"{Colors.BOLD}[{r[0]}] {r[1]}{Colors.ENDC}: {r[2]}")
 
-def list_notes():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT id, title, content FROM notes")
-    rows = c.fetchall()
-    conn.close()
+def open_note(note_id):
+    """Print a whole note; this is where a large body is read from the blob store."""
+    row = db.execute("SELECT title, content, blob, created_at FROM notes WHERE id = ?", (note_id,)).fetchone()
+    if row is None:
+        print(f"{Colors.FAIL}❌ Note #{note_id} not found.{Colors.ENDC}")
+        return False
+    title, content, digest, created = row
+    print(f"\n{Colors.HEADER}--- 📖 [{note_id}] {title} ({created}) ---{Colors.ENDC}")
+    print(db.blobs.body(content, digest))
+    print("-----------------------\n")
+    return True
+
+def show_blobs(collect=False):
+    """`blobs`: size of the blob store; `blobs gc`: remove bodies no note uses any more."""
+    referenced = {r[0] for r in db.execute("SELECT DISTINCT blob FROM notes WHERE blob IS NOT NULL")}
+    if collect:
+        # Commit first (batch mode): a rolled-back delete must not lose the body
+        db.commit()
+        removed, freed = db.blobs.gc(referenced)
+        print(f"{Colors.GREEN}🧹 Removed {removed} unused note bodies ({freed / 1e6:.1f} MB){Colors.ENDC}")
+        return
+    sizes = [os.path.getsize(path) for _, path in db.blobs.files()]
+    notes = db.execute("SELECT COUNT(*) FROM notes WHERE blob IS NOT NULL").fetchone()[0]
+    print(f"📦 Blob store {db.blobs.root}: {len(sizes)} bodies, {sum(sizes) / 1e6:.1f} MB compressed, "
+          f"used by {notes} notes ({max(len(sizes) - len(referenced), 0)} unused; 'blobs gc' removes them)")
+
+def list_notes(limit=None, after=None, page=False):
+    def fetch_page(after, limit):
+        sql, params = "SELECT id, title FROM notes WHERE id > ? ORDER BY id", [after or 0]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return db.execute(sql, params)
+
     print(f"\n{Colors.HEADER}--- 📚 KNOWLEDGE BASE ---{Colors.ENDC}")
-    for r in rows:
-        print(f"{Colors.BLUE}[{r[0]}] {r[1]}{Colors.ENDC}")
+    shown, next_after = paginate(fetch_page, lambda r: f"{Colors.BLUE}[{r[0]}] {r[1]}{Colors.ENDC}\n",
+                                 limit, after, page)
+    if next_after is not None:
+        print(f"(More notes: add --after {next_after})")
     print("-----------------------\n")
 
+# ==========================================
+# SEMANTIC SEARCH (local vector index)
+# ==========================================
+# Words that say nothing about which tasks or notes are relevant
+STOPWORDS = set("""a an and are as at be but by can do does for from have how i in is it
+me my of on or should so that the this to today what when where which who why
+will with work you your""".split())
+VECTOR_DIM = 1024  # hashed bag-of-words dimensions
+SIMILAR_TOP_K = 10
+
+def stem(word):
+    """Very small suffix stripper so 'meetings' and 'meeting' land in the same bucket."""
+    for suffix in ("ing", "ed", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+def embed(np, title, content=""):
+    """Hash words into a signed, L2-normalised VECTOR_DIM vector. Title words count double."""
+    vec = np.zeros(VECTOR_DIM, dtype=np.float32)
+    for text, weight in ((title, 2.0), (content, 1.0)):
+        for word in re.findall(r"\w+", text.lower()):
+            if word in STOPWORDS:
+                continue
+            h = zlib.crc32(stem(word).encode("utf-8"))
+            vec[h % VECTOR_DIM] += weight if h & 0x80000000 else -weight
+    vec = np.sign(vec) * np.log1p(np.abs(vec))  # dampen repeated words
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+class NoteVectorIndex:
+    """In-memory matrix of note vectors, saved as NumPy arrays next to the database.
+
+    Rows are added and removed in place as notes change; on load the saved
+    arrays are reconciled with the notes table, so notes added, deleted or
+    replaced by another process (or before a crash) are picked up without a
+    full rebuild. Each row keeps the note's text length as a cheap check that
+    an id still refers to the same note (SQLite can reuse a deleted max id).
+    """
+
+    def __init__(self, np, db_path):
+        self.np = np
+        self.db_path = db_path
+        self.path = os.path.splitext(db_path)[0] + ".vectors.npz"
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.lengths = np.zeros(0, dtype=np.int64)
+        self.vectors = np.zeros((0, VECTOR_DIM), dtype=np.float32)
+        self.size = 0
+        self.rows = {}  # note id -> row number
+        self.dirty = False
+
+    def load(self):
+        np = self.np
+        if os.path.exists(self.path):
+            try:
+                with np.load(self.path) as data:
+                    ids, lengths, vectors = data["ids"], data["lengths"], data["vectors"]
+                if vectors.shape[1:] == (VECTOR_DIM,):
+                    self.ids, self.lengths, self.vectors = ids.copy(), lengths.copy(), vectors.copy()
+                    self.size = len(ids)
+                    self.rows = {int(i): n for n, i in enumerate(ids)}
+            except (OSError, ValueError, KeyError):
+                pass  # unreadable file: rebuilt from the database below
+        self.reconcile()
+        return self
+
+    def reconcile(self):
+        np = self.np
+        current = np.array(db.execute("SELECT id, length(title) + length(content) FROM notes").fetchall(),
+                           dtype=np.int64).reshape(-1, 2)
+        db_ids = current[:, 0]
+        for stale in np.setdiff1d(self.ids[:self.size], db_ids, assume_unique=True):
+            self.remove(int(stale))
+        # Ids we have never seen, or whose text length changed
+        known = np.fromiter((self.lengths[self.rows[i]] if i in self.rows else -1 for i in db_ids.tolist()),
+                            dtype=np.int64, count=len(db_ids))
+        missing = db_ids[known != current[:, 1]]
+        for start in range(0, len(missing), 500):
+            chunk = [int(i) for i in missing[start:start + 500]]
+            marks = ",".join("?" * len(chunk))
+            for note_id, title, content in db.execute(f"SELECT id, title, content FROM notes WHERE id IN ({marks})", chunk):
+                self.add(note_id, title or "", content or "")
+
+    def add(self, note_id, title, content):
+        np = self.np
+        if note_id in self.rows:
+            self.remove(note_id)
+        if self.size == len(self.ids):
+            # Grow geometrically so appends stay amortised O(1)
+            capacity = max(64, 2 * self.size)
+            self.ids = np.resize(self.ids, capacity)
+            self.lengths = np.resize(self.lengths, capacity)
+            vectors = np.zeros((capacity, VECTOR_DIM), dtype=np.float32)
+            vectors[:self.size] = self.vectors[:self.size]
+            self.vectors = vectors
+        self.ids[self.size] = note_id
+        self.lengths[self.size] = len(title) + len(content)
+        self.vectors[self.size] = embed(np, title, content)
+        self.rows[note_id] = self.size
+        self.size += 1
+        self.dirty = True
+
+    def remove(self, note_id):
+        row = self.rows.pop(note_id, None)
+        if row is None:
+            return
+        # Move the last row into the hole
+        last = self.size - 1
+        if row != last:
+            self.ids[row] = self.ids[last]
+            self.lengths[row] = self.lengths[last]
+            self.vectors[row] = self.vectors[last]
+            self.rows[int(self.ids[row])] = row
+        self.size = last
+        self.dirty = True
+
+    def query(self, text, k=SIMILAR_TOP_K):
+        """Top-k (note id, cosine similarity) pairs, best first."""
+        np = self.np
+        if not self.size:
+            return []
+        scores = self.vectors[:self.size] @ embed(np, text)
+        k = min(k, self.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.ids[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmp_path = self.path + ".tmp.npz"
+        self.np.savez(tmp_path, ids=self.ids[:self.size], lengths=self.lengths[:self.size],
+                      vectors=self.vectors[:self.size])
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+
+vector_index = None
+
+def get_vector_index():
+    """Load (or build) the vector index for the open database. None without NumPy."""
+    global vector_index
+    if vector_index is not None and vector_index.db_path == db.path:
+        return vector_index
+    try:
+        import numpy as np
+    except ImportError:
+        return None
+    vector_index = NoteVectorIndex(np, db.path).load()
+    return vector_index
+
+def close_db():
+    """Flush the vector index and close the session's connection."""
+    global vector_index
+    if vector_index is not None and vector_index.db_path == db.path:
+        vector_index.save()
+    vector_index = None
+    db.close()
+
+def similar_notes(text, k=SIMILAR_TOP_K):
+    index = get_vector_index()
+    if index is None:
+        print(f"{Colors.FAIL}❌ Semantic search needs NumPy (pip install numpy).{Colors.ENDC}")
+        return False
+    hits = index.query(text, k)
+    titles = {}
+    if hits:
+        marks = ",".join("?" * len(hits))
+        titles = dict(db.execute(f"SELECT id, title FROM notes WHERE id IN ({marks})", [h[0] for h in hits]))
+    print(f"\n{Colors.HEADER}--- 🧭 NOTES SIMILAR TO '{text}' ---{Colors.ENDC}")
+    if not hits:
+        print("(No similar notes)")
+    for note_id, score in hits:
+        print(f"{Colors.BOLD}[{note_id}] {titles.get(note_id, '')}{Colors.ENDC} ({score:.2f})")
+
+# ==========================================
+# BULK IMPORT / EXPORT
+# ==========================================
+TASK_FIELDS = ["id", "description", "status", "priority", "created_at"]
+NOTE_FIELDS = ["id", "title", "content", "created_at"]
+IMPORT_BATCH = 1000
+FORMATS = ("csv", "json", "jsonl")
+
+def file_format(path, fmt=None):
+    fmt = (fmt or os.path.splitext(path)[1].lstrip(".")).lower()
+    if fmt == "ndjson":
+        fmt = "jsonl"
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}'. Use csv, json or jsonl.")
+    return fmt
+
+def read_records(path, fmt):
+    """Yield one dict per record. CSV and JSONL are read line by line."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        elif fmt == "jsonl":
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            data = json.load(f)
+            if not isinstance(data, list):
+                raise ValueError(f"{path} does not contain a JSON array")
+            yield from data
+
+def parse_timestamp(value, default):
+    """Epoch seconds from an epoch number, our date formats or ISO 8601 (tasks5 writes '...Z')."""
+    if value in (None, ""):
+        return default
+    if isinstance(value, (int, float)) or str(value).isdigit():
+        return int(value)
+    try:
+        return to_epoch(value)
+    except ValueError:
+        pass
+    try:
+        return int(datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp())
+    except ValueError:
+        return default
+
+def convert_record(record, now):
+    """Map one imported record to ("task", row) or ("note", row).
+
+    Understands our own export format and the legacy tasks.json layouts:
+    tasks1 ({description}), tasks2/tasks3 ({description, status: pending|completed})
+    and tasks5 ({id, description, completed, created_at}).
+    """
+    if not isinstance(record, dict):
+        # tasks1 style list of plain strings
+        return "task", (str(record), "pending", PRIORITY_RANKS["medium"], now)
+    kind = record.get("type")
+    if kind == "note" or (kind is None and "title" in record and "description" not in record):
+        created = parse_timestamp(record.get("created_at"), now)
+        date = datetime.datetime.fromtimestamp(created).strftime("%Y-%m-%d")
+        return "note", (record.get("title") or "", record.get("content") or "", date)
+
+    status = str(record.get("status") or "pending").lower()
+    completed = record.get("completed")
+    if isinstance(completed, str):
+        completed = completed.lower() in ("1", "true", "yes")
+    done = completed or status in ("done", "completed")
+    priority = record.get("priority")
+    if isinstance(priority, str) and priority.isdigit():
+        priority = int(priority)
+    if not isinstance(priority, int):
+        priority = PRIORITY_RANKS.get(str(priority or "medium").lower(), PRIORITY_RANKS["medium"])
+    return "task", (record.get("description") or "", "DONE" if done else "pending",
+                    priority, parse_timestamp(record.get("created_at"), now))
+
+@contextmanager
+def deferred_indexes(tables=("tasks", "notes")):
+    """Drop the indexes and triggers on `tables`, and recreate them on exit.
+
+    Building an index once at the end is much cheaper than updating it for
+    every inserted row. Must run inside a transaction.
+    """
+    marks = ",".join("?" * len(tables))
+    saved = db.execute(f"""SELECT type, name, sql FROM sqlite_master
+                           WHERE type IN ('index', 'trigger') AND sql IS NOT NULL
+                           AND tbl_name IN ({marks})""", tables).fetchall()
+    for kind, name, _ in saved:
+        db.execute(f"DROP {kind.upper()} {name}")
+    try:
+        yield
+    finally:
+        for _, _, sql in saved:
+            db.execute(sql)
+
+def import_file(path, fmt=None):
+    fmt = file_format(path, fmt)
+    started = time.perf_counter()
+    now = int(time.time())
+    counts = {"task": 0, "note": 0}
+    batches = {"task": [], "note": []}
+    inserts = {
+        "task": "INSERT INTO tasks (description, status, priority, created_at) VALUES (?, ?, ?, ?)",
+        "note": "INSERT INTO notes (title, content, blob, created_at) VALUES (?, ?, ?, ?)",
+    }
+
+    def flush(kind):
+        db.executemany(inserts[kind], batches[kind])
+        counts[kind] += len(batches[kind])
+        batches[kind].clear()
+
+    # One transaction for the whole file; indexes, FTS triggers rebuilt once at the end.
+    # The savepoint undoes a failed import even inside a batch's open transaction.
+    with db.transaction():
+        last_note = db.execute("SELECT COALESCE(MAX(id), 0) FROM notes").fetchone()[0]
+        db.execute("SAVEPOINT import_file")
+        try:
+            with deferred_indexes():
+                for record in read_records(path, fmt):
+                    kind, row = convert_record(record, now)
+                    if kind == "note":
+                        title, content, date = row
+                        row = (title, *split_body(content), date)
+                    batches[kind].append(row)
+                    if len(batches[kind]) >= IMPORT_BATCH:
+                        flush(kind)
+                flush("task")
+                flush("note")
+                if db.has_fts and counts["note"]:
+                    db.execute("""INSERT INTO notes_fts(rowid, title, content)
+                                  SELECT id, title, content FROM notes WHERE id > ? AND blob IS NULL""", (last_note,))
+                    for note_id, title, content, digest in db.execute(
+                            "SELECT id, title, content, blob FROM notes WHERE id > ? AND blob IS NOT NULL",
+                            (last_note,)).fetchall():
+                        index_note_body(note_id, title, db.blobs.body(content, digest))
+        except BaseException:
+            db.execute("ROLLBACK TO import_file")
+            db.execute("RELEASE import_file")
+            raise
+        db.execute("RELEASE import_file")
+    if vector_index is not None and vector_index.db_path == db.path and counts["note"]:
+        vector_index.reconcile()
+
+    elapsed = time.perf_counter() - started
+    print(f"{Colors.GREEN}📥 Imported {counts['task']} tasks and {counts['note']} notes from {path} in {elapsed:.2f}s{Colors.ENDC}")
+    return counts
+
+def export_rows(table):
+    """Cursor over a table in export form (priority names, formatted dates)."""
+    if table == "tasks":
+        return TASK_FIELDS, ((r[0], r[1], r[2], PRIORITY_NAMES.get(r[3], r[3]), format_epoch(r[4]))
+                             for r in db.execute("SELECT id, description, status, priority, created_at FROM tasks ORDER BY id"))
+    return NOTE_FIELDS, ((r[0], r[1], db.blobs.body(r[2], r[3]), r[4])
+                         for r in db.execute("SELECT id, title, content, blob, created_at FROM notes ORDER BY id"))
+
+def export_file(table, path, fmt=None):
+    """Write a table to CSV/JSON/JSONL straight from the cursor, one row at a time."""
+    if table not in ("tasks", "notes"):
+        raise ValueError("Export 'tasks' or 'notes'")
+    fmt = file_format(path, fmt)
+    fields, rows = export_rows(table)
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            writer = csv.writer(f)
+            writer.writerow(fields)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        else:
+            if fmt == "json":
+                f.write("[")
+            for row in rows:
+                line = json.dumps(dict(zip(fields, row)), ensure_ascii=False)
+                if fmt == "json":
+                    f.write(("," if count else "") + "\n  " + line)
+                else:
+                    f.write(line + "\n")
+                count += 1
+            if fmt == "json":
+                f.write("\n]\n")
+    print(f"{Colors.GREEN}📤 Exported {count} {table} to {path}{Colors.ENDC}")
+    return count
+
+def parse_transfer_command(text):
+    """Split `[tasks|notes] <path> [--format csv|json|jsonl]` (quotes allowed in paths)."""
+    tokens = shlex.split(text)
+    fmt = None
+    if "--format" in tokens:
+        i = tokens.index("--format")
+        if i + 1 >= len(tokens):
+            raise ValueError("--format needs a value")
+        fmt = tokens[i + 1]
+        del tokens[i:i + 2]
+    return tokens, fmt
+
 # ==========================================
 # AI AGENT
 # ==========================================
-def ask_ai(user_query):
-    if not client:
-        print(f"{Colors.FAIL}❌ OpenAI client not initialized.{Colors.ENDC}")
+TASK_CONTEXT_SHARE = 0.4  # part of the budget reserved for tasks, the rest goes to notes
+TASK_CANDIDATES = 200     # pending tasks considered by priority/recency alone
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token for English text)."""
+    return max(1, len(text) // 4)
+
+def query_terms(text):
+    return [w for w in re.findall(r"\w+", text.lower()) if w not in STOPWORDS]
+
+def rank_tasks(terms):
+    """Pending tasks ordered by relevance: matching words, then priority, then recency."""
+    candidates = {}
+    # Highest priority / newest first, served by idx_tasks_status_priority_created
+    for row in db.execute("""SELECT id, description, priority, created_at FROM tasks
+                             WHERE status = 'pending' ORDER BY priority DESC, created_at DESC LIMIT ?""",
+                          (TASK_CANDIDATES,)):
+        candidates[row[0]] = row
+    if terms:
+        like = " OR ".join("description LIKE ?" for _ in terms)
+        for row in db.execute(f"SELECT id, description, priority, created_at FROM tasks WHERE status = 'pending' AND ({like}) LIMIT ?",
+                              [f"%{t}%" for t in terms] + [TASK_CANDIDATES]):
+            candidates[row[0]] = row
+
+    now = datetime.datetime.now().timestamp()
+    def score(row):
+        words = set(re.findall(r"\w+", row[1].lower()))
+        overlap = sum(1 for t in terms if any(w.startswith(t) for w in words))
+        age_days = max(0.0, (now - row[3]) / 86400)
+        return 3 * overlap + row[2] + 1 / (1 + age_days)
+    return sorted(candidates.values(), key=score, reverse=True)
+
+def rank_notes(query, limit=50):
+    """Notes relevant to the query, best first.
+
+    Keyword hits (FTS, bm25) and semantic hits (vector index) are merged with
+    reciprocal rank fusion, so a note near the top of either list ranks well.
+    """
+    terms = " ".join(query_terms(query))
+    match = fts_query(terms, any_term=True)
+    rankings = []
+    if db.has_fts and match:
+        rankings.append([r[0] for r in db.execute(
+            """SELECT rowid FROM notes_fts WHERE notes_fts MATCH ?
+               ORDER BY bm25(notes_fts, 10.0, 1.0) LIMIT ?""", (match, limit))])
+    index = get_vector_index()
+    if index is not None:
+        rankings.append([note_id for note_id, _ in index.query(query, limit)])
+    if not any(rankings):
+        return db.execute("SELECT id, title, content FROM notes ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+
+    fused = {}
+    for ranking in rankings:
+        for position, note_id in enumerate(ranking):
+            fused[note_id] = fused.get(note_id, 0) + 1 / (60 + position)
+    best = sorted(fused, key=fused.get, reverse=True)[:limit]
+    marks = ",".join("?" * len(best))
+    rows = {r[0]: r for r in db.execute(f"SELECT id, title, content FROM notes WHERE id IN ({marks})", best)}
+    return [rows[i] for i in best if i in rows]
+
+def pack(lines, budget):
+    """Greedily keep lines (best first) while they fit; trim the first one that doesn't."""
+    kept, used = [], 0
+    for kind, item_id, text in lines:
+        cost = estimate_tokens(text)
+        if used + cost > budget:
+            room = budget - used
+            if room < 25:
+                break
+            text = text[:room * 4 - 1] + "…"
+            cost = estimate_tokens(text)
+        kept.append((kind, item_id, text, cost))
+        used += cost
+    return kept, used
+
+def build_context(user_query, budget=None):
+    """Select the tasks and notes most relevant to the query, within a token budget.
+
+    Returns (context string, selected items as (kind, id, text, tokens), tokens used).
+    """
+    budget = CONTEXT_TOKEN_BUDGET if budget is None else budget
+    terms = query_terms(user_query)
+
+    task_lines = [("task", r[0], f"{r[1]} ({PRIORITY_NAMES.get(r[2], r[2])} Priority, added {format_epoch(r[3])})")
+                  for r in rank_tasks(terms)]
+    note_lines = [("note", r[0], f"{r[1]}: {r[2]}") for r in rank_notes(user_query)]
+
+    tasks, task_tokens = pack(task_lines, int(budget * TASK_CONTEXT_SHARE))
+    notes, note_tokens = pack(note_lines, budget - task_tokens)
+    # Hand whatever the notes did not need back to the remaining tasks
+    extra, extra_tokens = pack(task_lines[len(tasks):], budget - task_tokens - note_tokens)
+    tasks += extra
+    used = task_tokens + note_tokens + extra_tokens
+
+    context_str = "User's Pending Tasks:\n" + "\n".join(f"- {t[2]}" for t in tasks)
+    context_str += "\nUser's Notes:\n" + "\n".join(f"- {n[2]}" for n in notes)
+    return context_str, tasks + notes, used
+
+def print_context(selected, used, budget):
+    print(f"{Colors.HEADER}--- 📎 CONTEXT SENT ({used}/{budget} tokens) ---{Colors.ENDC}")
+    if not selected:
+        print("(nothing selected)")
+    for kind, item_id, text, cost in selected:
+        print(f"{Colors.BLUE}[{kind} {item_id}] ~{cost} tokens{Colors.ENDC} {text[:70]}")
+
+SYSTEM_PROMPT = "You are a smart productivity assistant. Use the user's tasks and notes to give specific advice. If they have High priority tasks, warn them."
+
+cache_stats = {"hits": 0, "misses": 0}
+
+def cache_key(user_query, model, context_str):
+    """Hash of the normalised question, the model and the exact context sent."""
+    query = " ".join(user_query.lower().split()).rstrip("?!. ")
+    fingerprint = hashlib.sha256(context_str.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{query}\x00{model}\x00{fingerprint}".encode("utf-8")).hexdigest()
+
+def cache_get(key):
+    now = int(time.time())
+    row = db.execute("SELECT response, created_at FROM ai_cache WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return None
+    if now - row[1] > CACHE_TTL_SECONDS:
+        db.execute("DELETE FROM ai_cache WHERE key = ?", (key,))
+        return None
+    db.execute("UPDATE ai_cache SET last_used = ? WHERE key = ?", (now, key))
+    return row[0]
+
+def cache_put(key, response):
+    now = int(time.time())
+    with db.transaction():
+        db.execute("INSERT OR REPLACE INTO ai_cache (key, response, created_at, last_used) VALUES (?, ?, ?, ?)",
+                   (key, response, now, now))
+        # Drop expired answers, then the least recently used ones over the cap
+        db.execute("DELETE FROM ai_cache WHERE created_at < ?", (now - CACHE_TTL_SECONDS,))
+        count = db.execute("SELECT COUNT(*) FROM ai_cache").fetchone()[0]
+        if count > CACHE_MAX_ENTRIES:
+            db.execute("DELETE FROM ai_cache WHERE key IN (SELECT key FROM ai_cache ORDER BY last_used LIMIT ?)",
+                       (count - CACHE_MAX_ENTRIES,))
+
+def show_cache_stats():
+    entries = db.execute("SELECT COUNT(*) FROM ai_cache").fetchone()[0]
+    print(f"💾 AI cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses this session, "
+          f"{entries}/{CACHE_MAX_ENTRIES} answers stored")
+
+def parse_ask_options(text):
+    """Split leading `--show-context` / `--budget N` / `--no-cache` flags from the question."""
+    opts = {}
+    tokens = text.split()
+    while tokens and tokens[0].startswith("--"):
+        flag = tokens.pop(0)
+        if flag == "--show-context":
+            opts["show_context"] = True
+        elif flag == "--no-cache":
+            opts["use_cache"] = False
+        elif flag == "--budget" and tokens and tokens[0].isdigit():
+            opts["budget"] = int(tokens.pop(0))
+        else:
+            raise ValueError(f"Unknown option '{flag}'")
+    return " ".join(tokens), opts
+
+class AIJob:
+    """One `ask` running on a background thread, streaming its answer as it arrives."""
+
+    def __init__(self, job_id, query, key, use_cache):
+        self.id = job_id
+        self.query = query
+        self.key = key
+        self.use_cache = use_cache
+        self.status = "running"   # running -> done / cancelled / error
+        self.parts = []
+        self.error = None
+        self.stream = None
+        self.cancel_event = threading.Event()
+        self.started = time.perf_counter()
+        self.first_token = None   # seconds until the first token arrived
+        self.elapsed = None
+        self.api_seconds = None   # time spent in the API call itself
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.thread = None
+
+    @property
+    def answer(self):
+        return "".join(self.parts)
+
+    def cancel(self):
+        self.cancel_event.set()
+        # Closing the HTTP response also unblocks a worker still waiting for data
+        stream = self.stream
+        if stream is not None:
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+
+ai_jobs = {}
+finished_jobs = queue.Queue()
+
+def stream_answer(job, messages, echo=True):
+    """Worker thread: write the completion to the terminal token by token (collect it only if not echo)."""
+    api_started = time.perf_counter()
+    try:
+        # include_usage: the last chunk reports prompt/completion token counts
+        job.stream = client.chat.completions.create(model=AI_MODEL, messages=messages, stream=True,
+                                                    stream_options={"include_usage": True})
+        for chunk in job.stream:
+            if job.cancel_event.is_set():
+                break
+            usage = getattr(chunk, "usage", None)
+            if usage is not None:
+                job.prompt_tokens = usage.prompt_tokens
+                job.completion_tokens = usage.completion_tokens
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            if job.first_token is None:
+                job.first_token = time.perf_counter() - job.started
+                if echo:
+                    sys.stdout.write(f"\n{Colors.CYAN}🤖 [job {job.id}] ")
+            job.parts.append(chunk.choices[0].delta.content)
+            if echo:
+                sys.stdout.write(chunk.choices[0].delta.content)
+                sys.stdout.flush()
+        job.status = "cancelled" if job.cancel_event.is_set() else "done"
+    except Exception as e:
+        if job.cancel_event.is_set():
+            job.status = "cancelled"
+        else:
+            job.status = "error"
+            job.error = str(e)
+    finally:
+        if job.stream is not None:
+            job.stream.close()
+    job.api_seconds = time.perf_counter() - api_started
+    job.elapsed = time.perf_counter() - job.started
+    if echo and job.status == "error":
+        print(f"{Colors.ENDC}\nAI Error: {job.error}")
+    elif echo:
+        print(f"{Colors.ENDC}\n{Colors.WARNING}[job {job.id} {job.status} in {job.elapsed:.1f}s]{Colors.ENDC}")
+    finished_jobs.put(job)
+
+def collect_finished_jobs():
+    """Store answers of finished jobs in the cache. Runs on the main thread, which owns the connection."""
+    while True:
+        try:
+            job = finished_jobs.get_nowait()
+        except queue.Empty:
+            return
+        metrics.api(job)
+        if job.status == "done" and job.use_cache:
+            cache_put(job.key, job.answer)
+
+def list_jobs():
+    print(f"\n{Colors.HEADER}--- ⏳ AI JOBS ---{Colors.ENDC}")
+    if not ai_jobs:
+        print("(No AI requests this session)")
+    for job in ai_jobs.values():
+        elapsed = job.elapsed if job.elapsed is not None else time.perf_counter() - job.started
+        first = f", first token {job.first_token:.2f}s" if job.first_token is not None else ""
+        print(f"[{job.id}] {job.status} {elapsed:.1f}s{first} | {job.query[:50]}")
+
+def cancel_job(job_id):
+    job = ai_jobs.get(job_id)
+    if job is None or job.status != "running":
+        print(f"{Colors.FAIL}❌ No running AI job #{job_id}.{Colors.ENDC}")
         return
+    job.cancel()
+    print(f"{Colors.WARNING}🛑 Cancelling job #{job_id}{Colors.ENDC}")
+
+def shutdown_jobs(timeout=2.0):
+    """Cancel jobs still running at exit and cache the ones that finished."""
+    for job in ai_jobs.values():
+        if job.status == "running":
+            job.cancel()
+            job.thread.join(timeout)
+    collect_finished_jobs()
+
+def get_client():
+    """Import openai and build the client on first use. None if that fails."""
+    global client
+    if client is NOT_LOADED:
+        try:
+            from openai import OpenAI
+            client = OpenAI()
+        except Exception:
+            print("Warning: OpenAI API Key not found. AI features will fail nicely.")
+            client = None
+    return client
+
+def ai_messages(user_query, context_str):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "system", "content": f"DATABASE STATE:\n{context_str}"},
+        {"role": "user", "content": user_query}
+    ]
+
+def ask_ai(user_query, show_context=False, budget=None, use_cache=True, wait=False):
+    """Answer from the cache, or start a background job that streams the answer.
 
+    Returns the AIJob (already finished when wait=True), None when answered
+    from the cache, or False if there is no client to ask.
+    """
     # 1. Gather context
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("SELECT description, priority FROM tasks WHERE status='pending'")
-    tasks = [f"{r[0]} ({r[1]} Priority)" for r in c.fetchall()]
-    c.execute("SELECT title, content FROM notes")
-    notes = [f"{r[0]}: {r[1]}" for r in c.fetchall()]
-    conn.close()
-
-    context_str = f"User's Pending Tasks: {tasks}\nUser's Notes: {notes}"
+    budget = CONTEXT_TOKEN_BUDGET if budget is None else budget
+    context_str, selected, used = build_context(user_query, budget)
+    if show_context:
+        print_context(selected, used, budget)
+
+    # 2. Same question, same model, same data: answer from the cache
+    key = cache_key(user_query, AI_MODEL, context_str)
+    if use_cache:
+        answer = cache_get(key)
+        if answer is not None:
+            cache_stats["hits"] += 1
+            print(f"\n{Colors.CYAN}AI Response:\n{answer}{Colors.ENDC}\n")
+            print(f"💾 (cached answer; {cache_stats['hits']} hits / {cache_stats['misses']} misses this session)")
+            return None
+        cache_stats["misses"] += 1
+
+    if not get_client():
+        print(f"{Colors.FAIL}❌ OpenAI client not initialized.{Colors.ENDC}")
+        return False
+
+    # 3. Stream the answer on a worker thread; the REPL stays usable meanwhile
+    messages = ai_messages(user_query, context_str)
+    job = AIJob(len(ai_jobs) + 1, user_query, key, use_cache)
+    ai_jobs[job.id] = job
+    job.thread = threading.Thread(target=stream_answer, args=(job, messages), daemon=True)
+    print(f"{Colors.WARNING}🤖 AI is thinking... (job #{job.id}; 'jobs' to check, 'cancel {job.id}' to stop){Colors.ENDC}")
+    job.thread.start()
+    if wait:
+        job.thread.join()
+        collect_finished_jobs()
+    return job
+
+# ==========================================
+# STATS & EXPLAIN
+# ==========================================
+# Commands `explain` can run: it executes them inside a savepoint that is
+# rolled back, collecting the SQL they issue.
+EXPLAIN_COMMANDS = ("task", "done", "list", "note", "notes", "search", "delete")
+LATENCY_BUCKETS = ((1, "<1ms"), (10, "1-10ms"), (100, "10-100ms"), (1000, "0.1-1s"), (float("inf"), ">=1s"))
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))]
+
+def show_stats():
+    records = list(metrics.commands)
+    print(f"\n{Colors.HEADER}--- 📊 COMMAND STATS (last {len(records)} commands) ---{Colors.ENDC}")
+    if not records:
+        print("(No commands recorded yet)")
+        return
+    by_name = defaultdict(list)
+    for r in records:
+        by_name[r["name"]].append(r)
+    print(f"{'command':<10}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'SQL/cmd':>9}{'rows/cmd':>10}")
+    for name, rs in sorted(by_name.items()):
+        wall = [r["wall_ms"] for r in rs]
+        print(f"{name:<10}{len(rs):>7}{percentile(wall, 50):>10.2f}{percentile(wall, 95):>10.2f}"
+              f"{percentile(wall, 99):>10.2f}{max(wall):>10.2f}"
+              f"{sum(r['sql'] for r in rs) / len(rs):>9.1f}{sum(r['rows'] for r in rs) / len(rs):>10.1f}")
+
+    print("\nLatency histogram (all commands):")
+    counts = [0] * len(LATENCY_BUCKETS)
+    for r in records:
+        counts[next(i for i, (limit, _) in enumerate(LATENCY_BUCKETS) if r["wall_ms"] < limit)] += 1
+    for (_, label), count in zip(LATENCY_BUCKETS, counts):
+        print(f"  {label:>9} {'█' * round(40 * count / len(records)):<40} {count}")
+
+    calls = list(metrics.api_calls)
+    if calls:
+        api = [c["api_ms"] / 1000 for c in calls]
+        prompt = sum(c["prompt_tokens"] or 0 for c in calls)
+        completion = sum(c["completion_tokens"] or 0 for c in calls)
+        print(f"\nAI API: {len(calls)} calls, p50 {percentile(api, 50):.2f}s, p95 {percentile(api, 95):.2f}s, "
+              f"p99 {percentile(api, 99):.2f}s | tokens: {prompt} prompt, {completion} completion")
+    print("-----------------------\n")
+
+def explain_command(command):
+    """Run a command without keeping its changes and print the query plan of every statement it ran."""
+    global vector_index
+    name = command.split()[0].lower() if command.split() else ""
+    if name not in EXPLAIN_COMMANDS:
+        print(f"Usage: explain <command>  (one of: {', '.join(EXPLAIN_COMMANDS)})")
+        return False
+    captured = []
+    saved_index = vector_index
+    db.execute("SAVEPOINT explain")
+    db.captured = captured
+    vector_index = None  # keep rolled-back notes out of the in-memory index
+    try:
+        with redirect_stdout(io.StringIO()):
+            dispatch_command(command)
+    finally:
+        db.captured = None
+        vector_index = saved_index
+        db.execute("ROLLBACK TO explain")
+        db.execute("RELEASE explain")
+
+    print(f"\n{Colors.HEADER}--- 🔍 QUERY PLAN: {command} ---{Colors.ENDC}")
+    shown = 0
+    for sql, params in captured:
+        if not sql.lstrip().upper().startswith(("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")):
+            continue
+        shown += 1
+        print(f"{Colors.BOLD}{' '.join(sql.split())}{Colors.ENDC}")
+        depth = {0: 0}
+        for node_id, parent, _, detail in db.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall():
+            depth[node_id] = depth.get(parent, 0) + 1
+            print(f"{'  ' * depth[node_id]}{detail}")
+    if not shown:
+        print("(No SQL statements)")
+    print("-----------------------\n")
+    return True
+
+# ==========================================
+# COMMAND DISPATCH
+# ==========================================
+def run_command(command, wait=False):
+    """Execute one command line, recording its metrics. Returns False if it failed.
+
+    `wait` makes `ask` block until the answer is complete (used by batch mode).
+    """
+    record = metrics.start(command)
+    ok = False
+    try:
+        ok = dispatch_command(command, wait)
+    finally:
+        metrics.finish(record, ok)
+    return ok
+
+def dispatch_command(command, wait=False):
+    # --- TASK COMMANDS ---
+    if command.lower().startswith("task "):
+        parts = command[5:].split()
+        # Check if last word is a priority
+        if parts[-1].lower() in ["high", "medium", "low"]:
+            prio = parts[-1]
+            desc = " ".join(parts[:-1])
+            add_task(desc, prio)
+        else:
+            add_task(" ".join(parts))
     
-    print(f"{Colors.WARNING}🤖 AI is thinking...{Colors.ENDC}")
+    elif command.lower().startswith("done "):
+        try:
+            t_id = int(command.split()[1])
+        except:
+            print("Usage: done <id>")
+            return False
+        return mark_done(t_id)
+
+    elif command.lower() == "list" or command.lower().startswith("list "):
+        try:
+            filters = parse_list_options(command[4:])
+        except ValueError as e:
+            print(f"{Colors.FAIL}❌ {e}{Colors.ENDC}")
+            print("Usage: list [--status pending|done] [--priority high|medium|low] [--since YYYY-MM-DD] [--until YYYY-MM-DD] [--sort id|priority|date] [--limit N] [--after ID] [--page]")
+            return False
+        return list_tasks(**filters)
+
+    # --- NOTE COMMANDS ---    
+    elif command.lower().startswith("note "):
+        parts = command[5:].split("|")
+        if len(parts) < 2:
+            print("❌ Use format: note Title | Content")
+            return False
+        add_note(parts[0].strip(), parts[1].strip())
+
+    elif command.lower() == "notes" or command.lower().startswith("notes "):
+        try:
+            paging = parse_notes_options(command[5:])
+        except ValueError as e:
+            print(f"{Colors.FAIL}❌ {e}{Colors.ENDC}")
+            print("Usage: notes [--limit N] [--after ID] [--page]")
+            return False
+        list_notes(**paging)
+        
+    elif command.lower().startswith("open "):
+        try:
+            note_id = int(command.split()[1])
+        except ValueError:
+            print("Usage: open <note id>")
+            return False
+        return open_note(note_id)
+
+    elif command.lower() in ("blobs", "blobs gc"):
+        show_blobs(collect=command.lower() == "blobs gc")
+
+    elif command.lower().startswith("search "):
+        query = command[7:]
+        search_notes(query)
+
+    elif command.lower().startswith("similar "):
+        return similar_notes(command[8:]) is not False
+
+    # --- BULK IMPORT / EXPORT ---
+    elif command.lower().startswith("import "):
+        try:
+            args, fmt = parse_transfer_command(command[7:])
+            if len(args) != 1:
+                raise ValueError("Usage: import <file> [--format csv|json|jsonl]")
+            import_file(args[0], fmt)
+        except (ValueError, KeyError, OSError, csv.Error, sqlite3.Error) as e:
+            print(f"{Colors.FAIL}❌ Import failed: {e}{Colors.ENDC}")
+            return False
+
+    elif command.lower().startswith("export "):
+        try:
+            args, fmt = parse_transfer_command(command[7:])
+            if len(args) != 2:
+                raise ValueError("Usage: export tasks|notes <file> [--format csv|json|jsonl]")
+            export_file(args[0].lower(), args[1], fmt)
+        except (ValueError, OSError) as e:
+            print(f"{Colors.FAIL}❌ Export failed: {e}{Colors.ENDC}")
+            return False
+
+    # --- DELETION ---
+    elif command.lower().startswith("delete task ") or command.lower().startswith("delete note "):
+        item_type = command.split()[1].lower()
+        try:
+            item_id = int(command.split()[2])
+        except:
+            print(f"Usage: delete {item_type} <id>")
+            return False
+        return delete_item(item_type, item_id)
+
+    # --- AI ---    
+    elif command.lower() == "jobs":
+        list_jobs()
+
+    elif command.lower().startswith("cancel "):
+        try:
+            cancel_job(int(command.split()[1]))
+        except ValueError:
+            print("Usage: cancel <job id>")
+            return False
+
+    elif command.lower() == "cache":
+        show_cache_stats()
+
+    # --- INSTRUMENTATION ---
+    elif command.lower() == "stats":
+        show_stats()
+
+    elif command.lower().startswith("explain "):
+        return explain_command(command[8:].strip())
+
+    elif command.lower().startswith("ask "):
+        try:
+            query, opts = parse_ask_options(command[4:])
+        except ValueError as e:
+            print(f"{Colors.FAIL}❌ {e}{Colors.ENDC}")
+            print("Usage: ask [--show-context] [--budget N] [--no-cache] <query>")
+            return False
+        job = ask_ai(query, wait=wait, **opts)
+        return job is not False and (job is None or job.status != "error")
+        
+    else:
+        print("Unknown command. Try: list, task, note, ask, quit")
+        return False
+    return True
+
+# ==========================================
+# BATCH / SCRIPT MODE
+# ==========================================
+ANSI_CODES = re.compile(r"\033\[[0-9;]*m")
+
+def run_batch(lines, commit_every=None, as_json=False, out=None):
+    """Run commands from an iterable of lines in one process and one transaction.
+
+    With commit_every=N the transaction is committed after every N commands.
+    With as_json each command produces one JSON line: {"line", "command", "ok", "output"}.
+    Blank lines and lines starting with '#' are skipped; 'quit' stops early.
+    Returns the number of failed commands.
+    """
+    out = out or sys.stdout
+    ran = failed = 0
+    started = time.perf_counter()
+    with db.transaction():
+        for number, line in enumerate(lines, 1):
+            command = line.strip()
+            if not command or command.startswith("#"):
+                continue
+            if command.lower() in ["quit", "exit"]:
+                break
+            buffer = io.StringIO()
+            with redirect_stdout(buffer):
+                try:
+                    if "--page" in command.split():
+                        # paging waits for a keypress; with `--batch -` it would eat the next line
+                        raise ValueError("--page needs the interactive REPL; use --limit and --after in scripts")
+                    ok = run_command(command, wait=True)
+                except Exception as e:
+                    print(f"{Colors.FAIL}❌ Error: {e}{Colors.ENDC}")
+                    ok = False
+            ran += 1
+            failed += not ok
+            if as_json:
+                out.write(json.dumps({"line": number, "command": command, "ok": ok,
+                                      "output": ANSI_CODES.sub("", buffer.getvalue()).strip()},
+                                     ensure_ascii=False) + "\n")
+            else:
+                out.write(buffer.getvalue())
+            if commit_every and ran % commit_every == 0:
+                db.commit()
+    shutdown_jobs()
+    elapsed = time.perf_counter() - started
+    print(f"Ran {ran} commands ({failed} failed) in {elapsed:.3f}s", file=sys.stderr)
+    return failed
+
+# ==========================================
+# DAEMON MODE (HTTP/JSON API)
+# ==========================================
+# `--serve` keeps one warm process: the connections, the AI cache and the
+# vector index stay loaded between requests. asyncio and http.client are
+# imported only by the daemon and by `--connect`, so ordinary runs start fast.
+SERVER_ADDRESS = os.environ.get("PKMS_SERVER", "127.0.0.1:8765")
+SERVER_READERS = int(os.environ.get("PKMS_READERS", "4"))  # read-only connections
+WRITE_GROUP = 256            # queued writes that may share one commit
+API_PAGE_SIZE = 100          # rows per GET /tasks or /notes unless ?limit= says otherwise
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+                405: "Method Not Allowed", 413: "Payload Too Large", 415: "Unsupported Media Type",
+                500: "Internal Server Error", 503: "Service Unavailable"}
+LOOPBACK_HOSTS = ("localhost", "127.0.0.1", "::1")
+# POST /command refuses these: they need a terminal, the REPL's own job list
+# or a commit of their own, or they read and write arbitrary files
+SERVER_REJECTED = ("cancel", "jobs", "blobs", "import", "export")
+
+class ApiError(Exception):
+    """A request the daemon answers with an HTTP error status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def parse_address(address):
+    """'host:port' -> ("tcp", (host, port)); 'unix:PATH' or a path -> ("unix", path)."""
+    if address.startswith("unix:"):
+        return "unix", address[5:]
+    if "/" in address or os.sep in address:
+        return "unix", address
+    host, _, port = address.rpartition(":")
+    return "tcp", (host or "127.0.0.1", int(port))
+
+def check_headers(method, headers):
+    """Refuse what a web page could send: the daemon has no login, so only local, non-browser clients get in.
+
+    Browsers add Origin to cross-site requests and cannot send application/json
+    without a preflight, and a non-loopback Host means DNS rebinding.
+    """
+    if "origin" in headers:
+        raise ApiError(403, "Cross-origin requests are not allowed")
+    host = headers.get("host")
+    if host is not None:
+        name = host[1:].partition("]")[0] if host.startswith("[") else host.rpartition(":")[0] or host
+        if name.lower() not in LOOPBACK_HOSTS:
+            raise ApiError(403, f"Host '{host}' is not a loopback address")
+    content_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+    if method != "GET" and content_type != "application/json":
+        raise ApiError(415, "Requests must be sent as Content-Type: application/json")
+
+def task_json(r):
+    return {"id": r[0], "description": r[1], "status": r[2],
+            "priority": PRIORITY_NAMES.get(r[3], r[3]), "created_at": format_epoch(r[4])}
+
+def query_flags(query):
+    """{"status": "pending", "limit": "5"} -> "--status pending --limit 5" for the REPL option parsers."""
+    return " ".join(f"--{key} {value}" for key, value in query.items())
+
+# --- Reads: run on reader threads, each with its own read-only connection ---
+def read_tasks(conn, query):
+    filters = parse_list_options(query_flags(query))
+    filters.pop("page", None)
+    filters.setdefault("limit", API_PAGE_SIZE)
+    if anchor_missing(conn, filters.get("sort", "id"), filters.get("after")):
+        raise ApiError(404, MISSING_ANCHOR.format(filters["after"]))
+    sql, params = query_tasks(**filters)
+    rows = conn.execute(sql, params).fetchall()
+    more = len(rows) == filters["limit"]
+    return {"ok": True, "tasks": [task_json(r) for r in rows], "next_after": rows[-1][0] if more else None}
+
+def read_notes(conn, query):
+    paging = parse_notes_options(query_flags(query))
+    limit = paging.get("limit", API_PAGE_SIZE)
+    rows = conn.execute("SELECT id, title, created_at FROM notes WHERE id > ? ORDER BY id LIMIT ?",
+                        (paging.get("after", 0), limit)).fetchall()
+    notes = [{"id": r[0], "title": r[1], "created_at": r[2]} for r in rows]
+    return {"ok": True, "notes": notes, "next_after": rows[-1][0] if len(rows) == limit else None}
+
+def read_note(conn, note_id):
+    row = conn.execute("SELECT id, title, content, blob, created_at FROM notes WHERE id = ?", (note_id,)).fetchone()
+    if row is None:
+        raise ApiError(404, f"Note #{note_id} not found.")
+    return {"ok": True, "note": {"id": row[0], "title": row[1], "content": BlobStore(db.path).body(row[2], row[3]),
+                                 "created_at": row[4]}}
+
+def read_search(conn, query):
+    text = query.get("q", "").strip()
+    if not text:
+        raise ApiError(400, "Give the search text as ?q=")
+    limit = int(query.get("limit", 20))
+    match = fts_query(text)
+    has_fts = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'notes_fts'").fetchone() is not None
+    if has_fts and not match:
+        rows = []
+    elif has_fts:
+        rows = conn.execute(f"""SELECT n.id, n.title, {NOTE_SNIPPET},
+                                      bm25(notes_fts, 10.0, 1.0) AS score
+                               FROM notes_fts JOIN notes n ON n.id = notes_fts.rowid
+                               WHERE notes_fts MATCH ? ORDER BY score LIMIT ?""", ("", "", match, limit)).fetchall()
+    else:
+        rows = conn.execute("SELECT id, title, substr(content, 1, 80), 0 FROM notes "
+                            "WHERE title LIKE ? OR content LIKE ? LIMIT ?",
+                            (f"%{text}%", f"%{text}%", limit)).fetchall()
+    return {"ok": True, "results": [{"id": r[0], "title": r[1], "snippet": r[2], "score": r[3]} for r in rows]}
+
+# --- Writes: run one at a time on the writer thread, which owns `db` ---
+def required(body, key):
+    value = body.get(key)
+    if not isinstance(value, str) or not value.strip():
+        raise ApiError(400, f"Missing '{key}'")
+    return value.strip()
+
+def write_add_task(body):
+    return {"ok": True, "id": add_task(required(body, "description"), str(body.get("priority", "Medium")))}
+
+def write_done(task_id):
+    if not mark_done(task_id):
+        raise ApiError(404, f"Task ID {task_id} not found.")
+    return {"ok": True}
+
+def write_delete(item_type, item_id):
+    if not delete_item(item_type, item_id):
+        raise ApiError(404, f"{item_type.capitalize()} #{item_id} not found.")
+    return {"ok": True}
+
+def write_add_note(body):
+    return {"ok": True, "id": add_note(required(body, "title"), str(body.get("content", "")))}
+
+def write_command(command):
+    words = command.split()
+    if words and words[0].lower() in SERVER_REJECTED or "--page" in words:
+        raise ApiError(400, f"'{command}' only works in the interactive REPL")
+    buffer = io.StringIO()
+    with redirect_stdout(buffer):
+        ok = run_command(command)
+    return {"ok": bool(ok), "output": ANSI_CODES.sub("", buffer.getvalue()).strip()}
+
+def prepare_answer(user_query, use_cache=True, budget=None):
+    """Writer thread: the cached answer to a question, or (job, messages) to send to the API."""
+    context_str, _, _ = build_context(user_query, CONTEXT_TOKEN_BUDGET if budget is None else budget)
+    key = cache_key(user_query, AI_MODEL, context_str)
+    if use_cache:
+        answer = cache_get(key)
+        if answer is not None:
+            cache_stats["hits"] += 1
+            return answer
+        cache_stats["misses"] += 1
+    if not get_client():
+        raise ApiError(503, "OpenAI client not initialized.")
+    job = AIJob(len(ai_jobs) + 1, user_query, key, use_cache)
+    ai_jobs[job.id] = job
+    return job, ai_messages(user_query, context_str)
+
+class PKMSServer:
+    """The daemon behind `--serve`: a small HTTP/JSON API over TCP or a Unix socket.
+
+    Writes go through one queue to a single thread that owns the main
+    connection. Writes that queue up while it is busy are applied together in
+    one transaction (group commit), each in its own savepoint so one bad
+    request cannot undo the others, and nobody gets a reply before their write
+    is committed. Reads run at the same time on a pool of read-only
+    connections; WAL lets them see the last commit without waiting for it.
+    """
+
+    def __init__(self, readers=SERVER_READERS):
+        from concurrent.futures import ThreadPoolExecutor
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pkms-writer")
+        self.readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="pkms-reader")
+        self.local = threading.local()
+        self.reader_conns = []
+        self.queue = None
+        self.server = None
+        self.writer_task = None
+        self.socket_path = None
+        self.commits = 0
+
+    async def start(self, address):
+        """Open the database and start listening. Returns the address actually bound."""
+        import asyncio
+        await asyncio.get_running_loop().run_in_executor(self.writer, init_db)
+        self.queue = asyncio.Queue()
+        self.writer_task = asyncio.create_task(self.write_loop())
+        kind, where = parse_address(address)
+        if kind == "unix":
+            import stat
+            # a socket left behind by a daemon that was killed
+            if os.path.exists(where) and stat.S_ISSOCK(os.stat(where).st_mode):
+                os.remove(where)
+            self.server = await asyncio.start_unix_server(self.handle, path=where)
+            self.socket_path = where
+            return f"unix:{where}"
+        self.server = await asyncio.start_server(self.handle, *where)
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"{host}:{port}"
+
+    async def close(self):
+        import asyncio
+        self.server.close()
+        await self.server.wait_closed()
+        await self.queue.put(None)
+        await self.writer_task
+        await asyncio.get_running_loop().run_in_executor(self.writer, self.close_writer)
+        self.writer.shutdown()
+        self.readers.shutdown()
+        for conn in self.reader_conns:
+            conn.close()
+        if self.socket_path and os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    @staticmethod
+    def close_writer():
+        shutdown_jobs()
+        close_db()
+
+    # --- HTTP ---
+    async def handle(self, reader, writer):
+        """One request per connection: read it, route it, answer with JSON."""
+        try:
+            status, payload = await self.respond(reader)
+        except ApiError as e:
+            status, payload = e.status, {"ok": False, "error": str(e)}
+        except (ValueError, UnicodeDecodeError) as e:
+            status, payload = 400, {"ok": False, "error": str(e)}
+        except ConnectionError:
+            writer.close()
+            return
+        except Exception as e:
+            status, payload = 500, {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n")
+        try:
+            writer.write(head.encode("ascii") + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, reader):
+        import asyncio
+        from urllib.parse import parse_qsl, urlsplit
+        try:
+            request_line = (await reader.readline()).decode("latin-1")
+            method, target, _ = request_line.split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            check_headers(method.upper(), headers)
+            length = int(headers.get("content-length", 0))
+            if length > MAX_REQUEST_BYTES:
+                raise ApiError(413, f"Request body over {MAX_REQUEST_BYTES} bytes")
+            raw = await reader.readexactly(length) if length else b""
+        except asyncio.IncompleteReadError as e:
+            raise ConnectionError("client hung up") from e
+        body = json.loads(raw) if raw else {}
+        if not isinstance(body, dict):
+            raise ApiError(400, "The request body must be a JSON object")
+        url = urlsplit(target)
+        return 200, await self.route(method.upper(), url.path.strip("/").split("/"), dict(parse_qsl(url.query)), body)
+
+    async def route(self, method, parts, query, body):
+        resource, rest = parts[0], parts[1:]
+        item_id = None
+        if rest:
+            if not rest[0].isdigit():
+                raise ApiError(404, f"Unknown path /{'/'.join(parts)}")
+            item_id = int(rest[0])
+
+        if resource == "tasks" and not rest:
+            if method == "GET":
+                return await self.read(read_tasks, query)
+            if method == "POST":
+                return await self.write(write_add_task, body)
+        elif resource == "tasks" and rest[1:] == ["done"] and method == "POST":
+            return await self.write(write_done, item_id)
+        elif resource in ("tasks", "notes") and len(rest) == 1 and method == "DELETE":
+            return await self.write(write_delete, resource[:-1], item_id)
+        elif resource == "notes" and not rest:
+            if method == "GET":
+                return await self.read(read_notes, query)
+            if method == "POST":
+                return await self.write(write_add_note, body)
+        elif resource == "notes" and len(rest) == 1 and method == "GET":
+            return await self.read(read_note, item_id)
+        elif resource == "search" and not rest and method == "GET":
+            return await self.read(read_search, query)
+        elif resource == "ask" and not rest and method == "POST":
+            return await self.ask(required(body, "query"), body.get("no_cache") is not True, body.get("budget"))
+        elif resource == "command" and not rest and method == "POST":
+            command = required(body, "command")
+            if command.lower().startswith("ask "):
+                question, opts = parse_ask_options(command[4:])
+                return await self.ask(question, opts.get("use_cache", True), opts.get("budget"))
+            return await self.write(write_command, command)
+        else:
+            raise ApiError(404, f"Unknown path /{'/'.join(parts)}")
+        raise ApiError(405, f"{method} is not allowed on /{'/'.join(parts)}")
+
+    # --- Reads and writes ---
+    async def read(self, func, *args):
+        import asyncio
+        return await asyncio.get_running_loop().run_in_executor(self.readers, self.run_read, func, args)
+
+    def run_read(self, func, args):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            from pathlib import Path
+            uri = Path(db.path).resolve().as_uri() + "?mode=ro"
+            conn = self.local.conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self.reader_conns.append(conn)
+        return func(conn, *args)
+
+    async def write(self, func, *args):
+        import asyncio
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((func, args, future))
+        return await future
+
+    async def write_loop(self):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is None:
+                return
+            group = [item]
+            while len(group) < WRITE_GROUP and not self.queue.empty():
+                item = self.queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                group.append(item)
+            try:
+                results = await loop.run_in_executor(self.writer, self.apply_writes,
+                                                     [(func, args) for func, args, _ in group])
+            except Exception as e:  # the commit itself failed: nothing in the group was saved
+                results = [e] * len(group)
+            for (_, _, future), result in zip(group, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def apply_writes(self, group):
+        """Writer thread: run a group of writes in one transaction."""
+        results = []
+        with db.transaction():
+            for func, args in group:
+                db.execute("SAVEPOINT api_write")
+                try:
+                    # the REPL functions print their confirmation; nobody reads it here
+                    with redirect_stdout(io.StringIO()):
+                        results.append(func(*args))
+                except Exception as e:
+                    db.execute("ROLLBACK TO api_write")
+                    results.append(e)
+                db.execute("RELEASE api_write")
+        self.commits += 1
+        return results
+
+    async def ask(self, question, use_cache=True, budget=None):
+        import asyncio
+        if not question.strip():
+            raise ApiError(400, "Missing 'query'")
+        if budget is not None and (type(budget) is not int or budget <= 0):
+            raise ApiError(400, "'budget' must be a positive whole number of tokens")
+        prepared = await self.write(prepare_answer, question, use_cache, budget)
+        if isinstance(prepared, str):
+            return {"ok": True, "answer": prepared, "cached": True}
+        job, messages = prepared
+        # the API call runs off both the event loop and the writer thread
+        await asyncio.get_running_loop().run_in_executor(None, stream_answer, job, messages, False)
+        await self.write(collect_finished_jobs)
+        if job.status != "done":
+            raise ApiError(503, f"AI request failed: {job.error or job.status}")
+        return {"ok": True, "answer": job.answer, "cached": False, "seconds": round(job.elapsed, 3)}
+
+def serve(address):
+    """Run the daemon until Ctrl+C."""
+    import asyncio
+
+    async def run():
+        import signal
+        server = PKMSServer()
+        bound = await server.start(address)
+        # Ctrl+C or `kill`: stop listening, finish queued writes, close cleanly
+        serving = asyncio.current_task()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                asyncio.get_running_loop().add_signal_handler(signum, serving.cancel)
+            except NotImplementedError:  # Windows: Ctrl+C raises KeyboardInterrupt instead
+                pass
+        print(f"{Colors.GREEN}🛰️  PKMS daemon serving {db.path} on {bound} (Ctrl+C to stop){Colors.ENDC}", flush=True)
+        try:
+            await server.server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await server.close()
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a smart productivity assistant. Use the user's tasks and notes to give specific advice. If they have High priority tasks, warn them."},
-                {"role": "system", "content": f"DATABASE STATE:\n{context_str}"},
-                {"role": "user", "content": user_query}
-            ]
-        )
-        print(f"\n{Colors.CYAN}AI Response:\n{response.choices[0].message.content}{Colors.ENDC}\n")
-    except Exception as e:
-        print(f"AI Error: {e}")
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    print("Daemon stopped.")
+
+# --- Thin client ---
+def api_request(address, method, path, payload=None, timeout=300):
+    """Send one request to a running daemon. Returns (HTTP status, decoded JSON reply)."""
+    import http.client
+    kind, where = parse_address(address)
+    if kind == "unix":
+        import socket
+        conn = http.client.HTTPConnection("localhost", timeout=timeout)
+        conn.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.sock.settimeout(timeout)
+        conn.sock.connect(where)
+    else:
+        conn = http.client.HTTPConnection(*where, timeout=timeout)
+    try:
+        body = None if payload is None else json.dumps(payload).encode("utf-8")
+        conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read() or b"{}")
+    finally:
+        conn.close()
+
+def run_client(address, commands):
+    """`--connect`: send each command to the daemon and print its output. Returns the number that failed."""
+    failed = 0
+    for command in commands:
+        try:
+            _, reply = api_request(address, "POST", "/command", {"command": command})
+        except OSError as e:
+            print(f"{Colors.FAIL}❌ Cannot reach the PKMS daemon at {address}: {e}{Colors.ENDC}", file=sys.stderr)
+            return len(commands)
+        text = reply.get("output", reply.get("answer", reply.get("error", "")))
+        if text:
+            print(text)
+        failed += not reply.get("ok")
+    return failed
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="main.py", description="SmartTask AI: PKMS + Task Manager")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="Run commands from FILE ('-' for stdin) instead of the interactive prompt")
+    parser.add_argument("--commit-every", type=int, metavar="N",
+                        help="In batch mode, commit after every N commands "
+                             "(default: every command with --durability strict, else once at the end)")
+    parser.add_argument("--json", action="store_true", help="In batch mode, print one JSON result per command")
+    parser.add_argument("--trace", metavar="FILE", default=TRACE_FILE,
+                        help="Append one JSON line per command and AI call to FILE (default: $PKMS_TRACE)")
+    parser.add_argument("--serve", nargs="?", const=SERVER_ADDRESS, metavar="ADDR",
+                        help=f"Run as a daemon serving the HTTP/JSON API on host:port or unix:PATH "
+                             f"(default: $PKMS_SERVER or {SERVER_ADDRESS})")
+    parser.add_argument("--connect", nargs="?", const=SERVER_ADDRESS, metavar="ADDR",
+                        help="Send the COMMANDs to a running daemon instead of opening the database")
+    parser.add_argument("commands", nargs="*", metavar="COMMAND",
+                        help="With --connect: commands to run, e.g. 'task Write report high' (default: read stdin)")
+    parser.add_argument("--durability", choices=sorted(DURABILITY_LEVELS), default=DURABILITY,
+                        help="strict, normal or fast: how much a crash can lose (default: $PKMS_DURABILITY or normal)")
+    return parser.parse_args(argv)
 
 # ==========================================
 # MAIN LOOP
@@ -195,77 +2313,63 @@ def print_banner():
     FINAL PROJECT | PKMS + TASK MANAGER | AI
     {Colors.ENDC}""")
 
-def main():
+def main(argv=None):
+    global DURABILITY
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.durability not in DURABILITY_LEVELS:
+        print(f"{Colors.FAIL}❌ Unknown durability '{args.durability}'. Use strict, normal or fast.{Colors.ENDC}")
+        sys.exit(2)
+    DURABILITY = args.durability
+    if args.connect:
+        commands = args.commands or [line.strip() for line in sys.stdin if line.strip()]
+        sys.exit(1 if run_client(args.connect, commands) else 0)
+    if args.serve:
+        if args.trace:
+            metrics.open_trace(args.trace)
+        serve(args.serve)
+        metrics.close_trace()
+        return
     init_db()
+    if args.trace:
+        metrics.open_trace(args.trace)
+
+    if args.batch:
+        # Exit code 0: every command succeeded, 1: at least one failed
+        commit_every = args.commit_every or DURABILITY_LEVELS[DURABILITY]["commit_every"]
+        try:
+            if args.batch == "-":
+                failed = run_batch(sys.stdin, commit_every, args.json)
+            else:
+                with open(args.batch, "r", encoding="utf-8") as f:
+                    failed = run_batch(f, commit_every, args.json)
+        finally:
+            close_db()
+            metrics.close_trace()
+        sys.exit(1 if failed else 0)
+
     print_banner()
-    print("Commands: 'task <desc> [High/Med/Low]', 'done <id>', 'delete task <id>', 'list', 'note <title>|<content>', 'search <text>', 'ask <query>'")
+    print("Commands: 'task <desc> [High/Med/Low]', 'done <id>', 'delete task <id>', 'list', 'note <title>|<content>', 'search <text>', 'similar <text>', 'ask <query>'")
     
     while True:
         try:
             command = input(f"{Colors.BOLD}COMMAND > {Colors.ENDC}").strip()
+            collect_finished_jobs()
             
             if command.lower() in ["quit", "exit"]:
                 break
-            
-            # --- TASK COMMANDS ---
-            elif command.lower().startswith("task "):
-                parts = command[5:].split()
-                # Check if last word is a priority
-                if parts[-1].lower() in ["high", "medium", "low"]:
-                    prio = parts[-1]
-                    desc = " ".join(parts[:-1])
-                    add_task(desc, prio)
-                else:
-                    add_task(" ".join(parts))
-            
-            elif command.lower().startswith("done "):
-                try:
-                    t_id = int(command.split()[1])
-                    mark_done(t_id)
-                except:
-                    print("Usage: done <id>")
-
-            elif command.lower() == "list":
-                list_tasks()
-
-            # --- NOTE COMMANDS ---    
-            elif command.lower().startswith("note "):
-                parts = command[5:].split("|")
-                if len(parts) < 2:
-                    print("❌ Use format: note Title | Content")
-                else:
-                    add_note(parts[0].strip(), parts[1].strip())
-
-            elif command.lower() == "notes":
-                list_notes()
-                
-            elif command.lower().startswith("search "):
-                query = command[7:]
-                search_notes(query)
-
-            # --- DELETION ---
-            elif command.lower().startswith("delete task "):
-                try:
-                    delete_item("task", int(command.split()[2]))
-                except:
-                    print("Usage: delete task <id>")
-                    
-            elif command.lower().startswith("delete note "):
-                try:
-                    delete_item("note", int(command.split()[2]))
-                except:
-                    print("Usage: delete note <id>")
 
-            # --- AI ---    
-            elif command.lower().startswith("ask "):
-                ask_ai(command[4:])
+            run_command(command)
                 
-            else:
-                print("Unknown command. Try: list, task, note, ask, quit")
-                
-        except KeyboardInterrupt:
+        except (KeyboardInterrupt, EOFError):
             print("\nGoodbye!")
             break
+        except Exception as e:
+            # A failed command (bad input, database error) must not end the session
+            print(f"{Colors.FAIL}❌ Error: {e}{Colors.ENDC}")
+
+    shutdown_jobs()
+    close_db()
+    metrics.close_trace()
 
 if __name__ == "__main__":
     main()
@@ -1,15 +1,22 @@
 # prototype_main.py - Initial Proof of Concept
 import sqlite3
 import os
-from openai import OpenAI
 
 # Uses a separate DB to avoid breaking the main app
 DB_NAME = "prototype.db" 
 
-try:
-    client = OpenAI()
-except:
-    client = None
+# Created on the first "ask": importing openai is the slowest part of startup
+client = None
+
+def get_client():
+    global client
+    if client is None:
+        try:
+            from openai import OpenAI
+            client = OpenAI()
+        except Exception:  # openai missing or no API key; Ctrl+C still stops the import
+            client = False
+    return client
 
 def init_db():
     conn = sqlite3.connect(DB_NAME)
@@ -40,7 +47,7 @@ def main():
             for r in rows: print(r)
             
         elif cmd.startswith("ask "):
-            if client:
+            if get_client():
                 res = client.chat.completions.create(
                     model="gpt-4o-mini",
                     messages=[{"role": "user", "content": cmd[4:]}]
@@ -1,3 +1,5 @@
+import io
+import json
 import pytest
 import sqlite3
 import os
@@ -25,4 +27,712 @@ def test_priority_logic():
     # Test that priority strings are valid
     valid_priorities = ["High", "Medium", "Low"]
     input_prio = "High"
-    assert input_prio in valid_priorities
\ No newline at end of file
+    assert input_prio in valid_priorities
+
+# --- Tests against the real main.py ---
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import main
+
+
+@pytest.fixture
+def pkms(tmp_path, monkeypatch):
+    """Point main.py at a throwaway database for the duration of a test."""
+    monkeypatch.setattr(main, "DB_NAME", str(tmp_path / "pkms_test.db"))
+    main.init_db()
+    yield main
+    main.close_db()
+
+
+def test_connection_is_shared_and_tuned(pkms):
+    conn = pkms.db.conn
+    pkms.add_task("Write report", "High")
+    pkms.add_note("Ideas", "Use one connection")
+    # Every command reuses the connection opened by init_db
+    assert pkms.db.conn is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+
+
+def test_transaction_rolls_back_on_error(pkms):
+    with pytest.raises(RuntimeError):
+        with pkms.db.transaction():
+            pkms.add_task("Never saved")
+            raise RuntimeError("boom")
+    assert pkms.db.execute("SELECT COUNT(*) FROM tasks").fetchone()[0] == 0
+
+    with pkms.db.transaction():
+        pkms.add_task("Saved")
+        pkms.mark_done(1)
+    assert pkms.db.execute("SELECT status FROM tasks").fetchall() == [("DONE",)]
+
+
+def test_search_uses_ranked_fts_index(pkms):
+    pkms.add_note("Groceries", "milk and eggs")
+    pkms.add_note("Python tips", "use sqlite for storage; sqlite is fast")
+    pkms.add_note("Misc", "someone mentioned sqlite once")
+
+    rows = pkms.find_notes("sqlite")
+    ids = [r[0] for r in rows]
+    assert set(ids) == {2, 3}
+    assert ids[0] == 2  # more mentions rank higher
+    assert pkms.Colors.WARNING in rows[0][2]  # snippet is highlighted
+
+    # Triggers keep the index in sync on update and delete
+    pkms.db.execute("UPDATE notes SET content = 'nothing here' WHERE id = 3")
+    pkms.delete_item("note", 2)
+    assert pkms.find_notes("sqlite") == []
+
+
+def test_search_index_backfills_existing_notes(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE notes (id INTEGER PRIMARY KEY, title TEXT, content TEXT, created_at TEXT)")
+    conn.execute("INSERT INTO notes (title, content) VALUES ('Old note', 'written before fts')")
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(main, "DB_NAME", db_path)
+    main.init_db()
+    try:
+        assert [r[0] for r in main.find_notes("fts")] == [1]
+    finally:
+        main.close_db()
+
+
+def test_migration_converts_legacy_tasks(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE tasks (id INTEGER PRIMARY KEY, description TEXT, status TEXT, priority TEXT, created_at TEXT)")
+    conn.execute("INSERT INTO tasks VALUES (1, 'Old task', 'pending', 'High', '2024-05-01 09:30')")
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(main, "DB_NAME", db_path)
+    main.init_db()
+    try:
+        assert main.db.execute("PRAGMA user_version").fetchone()[0] == main.SCHEMA_VERSION
+        desc, prio, created = main.db.execute("SELECT description, priority, created_at FROM tasks").fetchone()
+        assert (desc, prio) == ("Old task", 3)
+        assert main.format_epoch(created) == "2024-05-01 09:30"
+    finally:
+        main.close_db()
+
+
+def test_list_filters_and_sorts_with_indexes(pkms, capsys):
+    pkms.add_task("low one", "Low")
+    pkms.add_task("high one", "High")
+    pkms.add_task("high two", "High")
+    pkms.mark_done(3)
+    capsys.readouterr()
+
+    sql, params = pkms.query_tasks(status="pending", sort="priority")
+    assert [r[0] for r in pkms.db.execute(sql, params)] == [2, 1]
+    plan = " ".join(r[3] for r in pkms.db.execute("EXPLAIN QUERY PLAN " + sql, params))
+    assert "idx_tasks_status_priority_created" in plan
+    assert "TEMP B-TREE" not in plan
+
+    pkms.list_tasks(**pkms.parse_list_options("--priority high --status done"))
+    out = capsys.readouterr().out
+    assert "high two" in out and "high one" not in out
+
+    pkms.list_tasks(**pkms.parse_list_options("--until 2000-01-01"))
+    assert "(No tasks found)" in capsys.readouterr().out
+    with pytest.raises(ValueError):
+        pkms.parse_list_options("--sort banana")
+
+
+def test_list_pages_with_keyset_cursor(pkms, capsys):
+    with pkms.db.transaction():
+        for i in range(1, 8):
+            pkms.add_task(f"task {i}", "High" if i % 2 else "Low")
+    capsys.readouterr()
+
+    pkms.list_tasks(**pkms.parse_list_options("--limit 3 --after 2"))
+    out = capsys.readouterr().out
+    assert "[3] task 3" in out and "[5] task 5" in out and "[6]" not in out
+    assert "--after 5" in out
+
+    # Keyset continues in the chosen sort order: high (7, 5, 3, 1) then low (6, 4, 2)
+    pkms.list_tasks(**pkms.parse_list_options("--sort priority --limit 3 --after 3"))
+    out = capsys.readouterr().out
+    assert [line.split("]")[0][-1] for line in out.splitlines() if "] task" in line] == ["1", "6", "4"]
+
+    # The anchor was deleted between pages: say so instead of an empty, "finished" page
+    pkms.delete_item("task", 3)
+    capsys.readouterr()
+    assert not pkms.run_command("list --sort priority --limit 3 --after 3")
+    assert "Task #3 no longer exists" in capsys.readouterr().out
+    with pytest.raises(pkms.ApiError, match="no longer exists"):
+        pkms.read_tasks(pkms.db, {"sort": "date", "after": "3"})
+    assert pkms.run_command("list --limit 3 --after 3")  # id order needs no anchor row
+
+
+def test_page_mode_prompts_between_pages(pkms, capsys, monkeypatch):
+    with pkms.db.transaction():
+        for i in range(5):
+            pkms.add_note(f"note {i}", "body")
+    prompts = []
+    monkeypatch.setattr("builtins.input", lambda prompt: prompts.append(prompt) or "")
+
+    pkms.list_notes(**pkms.parse_notes_options("--page --limit 2"))
+    out = capsys.readouterr().out
+    assert all(f"note {i}" in out for i in range(5))
+    assert len(prompts) == 2  # after pages 1 and 2; page 3 is short
+
+
+def test_stream_rows_writes_in_batches(pkms, monkeypatch):
+    writes = []
+    monkeypatch.setattr(sys.stdout, "write", writes.append)
+    cursor = pkms.db.execute("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 1200) SELECT i FROM n")
+    count, last = pkms.stream_rows(cursor, lambda r: f"{r[0]}\n", batch_size=500)
+    assert (count, last) == (1200, (1200,))
+    assert len(writes) == 3
+
+
+def test_context_builder_picks_relevant_items_within_budget(pkms, capsys, monkeypatch):
+    with pkms.db.transaction():
+        for i in range(50):
+            pkms.add_note(f"Filler {i}", "lorem ipsum " * 100)
+        pkms.add_note("Exam prep", "Chapter 4 covers database indexing and B-trees")
+        pkms.add_task("Study for the database exam", "Low")
+        pkms.add_task("Buy milk", "Low")
+        pkms.add_task("File taxes", "High")
+        pkms.mark_done(3)
+
+    context, selected, used = pkms.build_context("How should I prepare for my database exam?", budget=200)
+    assert used <= 200
+    assert ("note", 51) in [(kind, item_id) for kind, item_id, _, _ in selected]
+    assert "Filler" not in context
+    # Matching task first, completed tasks never included
+    assert selected[0][:2] == ("task", 1)
+    assert "File taxes" not in context
+
+    monkeypatch.setattr(pkms, "client", None)
+    query, opts = pkms.parse_ask_options("--show-context --budget 200 database exam?")
+    pkms.ask_ai(query, **opts)
+    out = capsys.readouterr().out
+    assert "CONTEXT SENT" in out and "[note 51]" in out
+
+
+def test_vector_index_updates_incrementally_and_persists(pkms, capsys):
+    pytest.importorskip("numpy")
+    pkms.add_note("Gardening", "planting tomatoes and watering the vegetable garden")
+    index = pkms.get_vector_index()
+    assert index.size == 1
+
+    # Loaded index follows add_note / delete_item without a rebuild
+    pkms.add_note("Team meetings", "weekly meeting agenda for the project team")
+    pkms.add_note("Recipes", "tomato soup with basil")
+    pkms.add_note("Scratch", "temporary")
+    pkms.delete_item("note", 2)
+    assert index.size == 3
+    assert [note_id for note_id, _ in index.query("basil soup")][0] == 3
+
+    pkms.similar_notes("planting vegetables")
+    assert "[1] Gardening" in capsys.readouterr().out
+
+    # Saved on close, reconciled with the table on the next load
+    pkms.close_db()
+    pkms.init_db()
+    with pkms.db.transaction():
+        # Another process deletes note 4 and SQLite hands its id to a new note
+        pkms.db.execute("DELETE FROM notes WHERE id = 4")
+        pkms.db.execute("INSERT INTO notes (title, content) VALUES ('Garden tools', 'rake, spade and gloves')")
+    index = pkms.get_vector_index()
+    assert sorted(index.rows) == [1, 3, 4]
+    assert index.query("spade and rake")[0][0] == 4
+
+
+class FakeStream(list):
+    def close(self):
+        pass
+
+
+class FakeClient:
+    """Stands in for OpenAI(); counts calls and streams a fixed reply word by word."""
+
+    def __init__(self, reply="Do the report first."):
+        self.calls = 0
+        self.reply = reply
+        self.chat = self
+        self.completions = self
+
+    def create(self, **kwargs):
+        self.calls += 1
+        assert kwargs["stream"] is True
+        chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))])
+                  for word in self.reply.split()]
+        if kwargs.get("stream_options", {}).get("include_usage"):
+            chunks.append(SimpleNamespace(choices=[], usage=SimpleNamespace(
+                prompt_tokens=120, completion_tokens=len(chunks))))
+        return FakeStream(chunks)
+
+
+def test_ask_ai_answers_repeat_questions_from_cache(pkms, capsys, monkeypatch):
+    fake = FakeClient()
+    monkeypatch.setattr(pkms, "client", fake)
+    monkeypatch.setattr(pkms, "cache_stats", {"hits": 0, "misses": 0})
+    pkms.add_task("Write report", "High")
+
+    job = pkms.ask_ai("What should I work on today?", wait=True)
+    assert job.answer == "Do the report first. "
+    pkms.ask_ai("what should i work on   today")
+    assert fake.calls == 1
+    assert pkms.cache_stats == {"hits": 1, "misses": 1}
+    assert "cached answer" in capsys.readouterr().out
+
+    # --no-cache bypasses; changed data changes the key
+    pkms.ask_ai("What should I work on today?", use_cache=False, wait=True)
+    pkms.add_task("Call the bank", "High")
+    pkms.ask_ai("What should I work on today?", wait=True)
+    assert fake.calls == 3
+
+
+def test_cache_expires_and_evicts_least_recently_used(pkms, monkeypatch):
+    monkeypatch.setattr(pkms, "CACHE_MAX_ENTRIES", 2)
+    pkms.cache_put("a", "1")
+    pkms.cache_put("b", "2")
+    pkms.db.execute("UPDATE ai_cache SET last_used = last_used - 100 WHERE key = 'b'")
+    pkms.cache_put("c", "3")
+    assert pkms.cache_get("b") is None  # least recently used went first
+    assert pkms.cache_get("a") == "1"
+
+    monkeypatch.setattr(pkms, "CACHE_TTL_SECONDS", -1)
+    assert pkms.cache_get("a") is None
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    """Mimics the chat completions streaming protocol (server-sent events)."""
+
+    words = ["Start ", "with ", "the ", "report."]
+    delay = 0.05
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for word in self.words:
+            chunk = {"id": "c1", "object": "chat.completion.chunk", "created": 0, "model": "stub",
+                     "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]}
+            try:
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+            except OSError:
+                return  # client hung up (cancelled)
+            time.sleep(self.delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_client():
+    openai = pytest.importorskip("openai")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOpenAIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield openai.OpenAI(api_key="test", base_url=f"http://127.0.0.1:{server.server_port}/v1")
+    server.shutdown()
+
+
+def test_ask_ai_streams_in_background(pkms, stub_client, monkeypatch, capsys):
+    monkeypatch.setattr(pkms, "client", stub_client)
+    job = pkms.ask_ai("What first?")
+    # The REPL keeps working while the answer streams in
+    pkms.add_task("Added while waiting")
+    job.thread.join(5)
+    assert job.status == "done"
+    assert job.answer == "Start with the report."
+    assert job.first_token < job.elapsed
+    pkms.collect_finished_jobs()
+    assert pkms.db.execute("SELECT COUNT(*) FROM ai_cache").fetchone()[0] == 1
+
+    pkms.list_jobs()
+    assert "first token" in capsys.readouterr().out
+
+
+def test_cancel_stops_a_streaming_job(pkms, stub_client, monkeypatch):
+    monkeypatch.setattr(pkms, "client", stub_client)
+    monkeypatch.setattr(StubOpenAIHandler, "delay", 0.5)
+    job = pkms.ask_ai("What first?")
+    while job.first_token is None and job.thread.is_alive():
+        time.sleep(0.01)
+    pkms.cancel_job(job.id)
+    job.thread.join(5)
+    assert job.status == "cancelled"
+    assert job.answer != "Start with the report."
+    pkms.collect_finished_jobs()
+    assert pkms.db.execute("SELECT COUNT(*) FROM ai_cache").fetchone()[0] == 0
+
+
+def test_repl_survives_a_failing_command(pkms, monkeypatch, capsys):
+    def locked(**filters):
+        raise sqlite3.OperationalError("database is locked")
+    monkeypatch.setattr(pkms, "list_tasks", locked)
+    commands = iter(["list", "task still running", "quit"])
+    monkeypatch.setattr("builtins.input", lambda prompt: next(commands))
+    pkms.main([])
+    assert "❌ Error: database is locked" in capsys.readouterr().out
+    assert pkms.db.execute("SELECT description FROM tasks").fetchall() == [("still running",)]
+
+
+def test_import_reads_legacy_task_files(pkms, tmp_path):
+    tasks1 = tmp_path / "tasks1.json"
+    tasks1.write_text(json.dumps([{"description": "from tasks1"}]))
+    tasks2 = tmp_path / "tasks2.json"
+    tasks2.write_text(json.dumps([{"description": "from tasks2", "status": "completed"}]))
+    tasks5 = tmp_path / "tasks5.json"
+    tasks5.write_text(json.dumps([{"id": 7, "description": "from tasks5", "completed": False,
+                                   "created_at": "2025-01-02T03:04:05.000000Z"}]))
+
+    for path in (tasks1, tasks2, tasks5):
+        pkms.import_file(str(path))
+    rows = pkms.db.execute("SELECT description, status, priority FROM tasks ORDER BY id").fetchall()
+    assert rows == [("from tasks1", "pending", 2), ("from tasks2", "DONE", 2), ("from tasks5", "pending", 2)]
+
+
+def test_export_import_round_trip_keeps_indexes(pkms, tmp_path):
+    with pkms.db.transaction():
+        for i in range(2500):
+            pkms.add_note(f"note {i}", f"content number {i}")
+        pkms.add_task("ship it", "High")
+    schema = sorted(pkms.db.execute("SELECT name FROM sqlite_master WHERE type IN ('index', 'trigger')"))
+
+    for fmt in ("csv", "json", "jsonl"):
+        pkms.export_file("notes", str(tmp_path / f"notes.{fmt}"))
+    pkms.export_file("tasks", str(tmp_path / "tasks.csv"))
+    assert len(json.loads((tmp_path / "notes.json").read_text())) == 2500
+
+    pkms.import_file(str(tmp_path / "notes.jsonl"))
+    counts = pkms.import_file(str(tmp_path / "tasks.csv"))
+    assert counts == {"task": 1, "note": 0}
+    assert pkms.db.execute("SELECT COUNT(*) FROM notes").fetchone()[0] == 5000
+    assert pkms.db.execute("SELECT priority FROM tasks WHERE id = 2").fetchone()[0] == 3
+
+    # Indexes and triggers are back, and imported notes are searchable
+    assert sorted(pkms.db.execute("SELECT name FROM sqlite_master WHERE type IN ('index', 'trigger')")) == schema
+    assert len(pkms.find_notes("number 2499")) == 2
+    pkms.add_note("after import", "trigger still works")
+    assert pkms.find_notes("trigger")[0][0] == 5001
+
+
+def test_failed_import_leaves_no_rows_and_keeps_indexes(pkms, tmp_path, monkeypatch):
+    pkms.add_note("kept", "searchable before")
+    schema = sorted(pkms.db.execute("SELECT name FROM sqlite_master WHERE type IN ('index', 'trigger')"))
+    broken = tmp_path / "broken.jsonl"
+    broken.write_text('{"description": "imported"}\n{"title": "n", "content": "x"}\nnot json\n')
+    monkeypatch.setattr(pkms, "IMPORT_BATCH", 1)  # rows are flushed before the bad line
+
+    out = io.StringIO()
+    assert pkms.run_batch([f"import {broken}", "task after the failure"], out=out) == 1
+    assert pkms.db.execute("SELECT description FROM tasks").fetchall() == [("after the failure",)]
+    assert pkms.db.execute("SELECT COUNT(*) FROM notes").fetchone()[0] == 1
+    assert sorted(pkms.db.execute("SELECT name FROM sqlite_master WHERE type IN ('index', 'trigger')")) == schema
+    pkms.add_note("later", "trigger still searchable")
+    assert {row[1] for row in pkms.find_notes("searchable")} == {"later", "kept"}
+
+
+def test_batch_mode_runs_script_in_one_transaction(pkms, tmp_path, capsys):
+    script = [f"task batch item {i} low" for i in range(10000)] + ["", "# comment", "done 3", "done 99999"]
+    out = io.StringIO()
+    started = time.perf_counter()
+    failed = pkms.run_batch(script, as_json=True, out=out)
+    assert time.perf_counter() - started < 1.0
+    assert failed == 1
+
+    results = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert len(results) == 10002
+    assert results[-2] == {"line": 10003, "command": "done 3", "ok": True,
+                           "output": "🎉 Task 3 marked as COMPLETED!"}
+    assert results[-1]["ok"] is False
+    assert pkms.db.execute("SELECT COUNT(*) FROM tasks").fetchone()[0] == 10000
+
+
+def test_batch_rejects_page_mode(pkms, monkeypatch):
+    monkeypatch.setattr("builtins.input", lambda prompt: pytest.fail("batch mode prompted"))
+    out = io.StringIO()
+    lines = ["task one", "list --page --limit 1", "notes --page", "task two"]
+    assert pkms.run_batch(lines, as_json=True, out=out) == 2
+    results = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [r["ok"] for r in results] == [True, False, False, True]
+    assert "--page needs the interactive REPL" in results[1]["output"]
+    assert pkms.db.execute("SELECT COUNT(*) FROM tasks").fetchone()[0] == 2
+
+
+def test_batch_exit_code_and_commit_every(pkms, tmp_path, monkeypatch):
+    script = tmp_path / "cmds.txt"
+    script.write_text("task one\ntask two\ntask three\nbogus command\n")
+    commits = []
+    monkeypatch.setattr(pkms.db, "commit", lambda: commits.append(1))
+    with pytest.raises(SystemExit) as exit_info:
+        pkms.main(["--batch", str(script), "--commit-every", "2"])
+    assert exit_info.value.code == 1
+    assert len(commits) == 2
+
+
+# Import budget for a command that never talks to the AI (openai alone used to take ~1s)
+STARTUP_IMPORT_BUDGET = 0.5
+
+
+def test_non_ai_command_starts_without_openai(tmp_path):
+    import subprocess
+    script = tmp_path / "cmds.txt"
+    script.write_text("task startup check\nlist\n")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", str(Path(main.__file__)), "--batch", str(script)],
+        cwd=tmp_path, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+
+    # -X importtime lines: "import time: self [us] | cumulative | module"
+    rows = [line.split("|") for line in result.stderr.splitlines() if line.startswith("import time:")]
+    modules = {row[2].strip() for row in rows[1:]}
+    total = sum(int(row[0].split(":")[1]) for row in rows[1:]) / 1e6
+    assert not {m for m in modules if m.split(".")[0] in ("openai", "httpx", "pydantic")}
+    assert total < STARTUP_IMPORT_BUDGET, f"imports took {total:.3f}s"
+
+
+def test_client_is_built_on_first_question(pkms, monkeypatch):
+    fake = SimpleNamespace()
+    built = []
+    fake_openai = SimpleNamespace(OpenAI=lambda: built.append(1) or fake)
+    monkeypatch.setitem(sys.modules, "openai", fake_openai)
+    monkeypatch.setattr(pkms, "client", pkms.NOT_LOADED)
+    assert built == []
+    assert pkms.get_client() is fake
+    assert pkms.get_client() is fake
+    assert built == [1]
+
+
+def test_commands_record_latency_sql_and_rows(pkms, capsys, monkeypatch):
+    monkeypatch.setattr(pkms, "metrics", pkms.Metrics())
+    for i in range(20):
+        pkms.run_command(f"task item {i} low")
+    pkms.run_command("list")
+    assert pkms.run_command("done 99999") is False
+
+    records = list(pkms.metrics.commands)
+    assert len(records) == 22
+    assert records[0]["name"] == "task" and records[0]["sql"] == 1 and records[0]["ok"]
+    assert records[20]["name"] == "list" and records[20]["rows"] == 20
+    assert records[21]["ok"] is False
+    assert pkms.percentile([1, 2, 3, 4], 50) == 2
+    assert pkms.percentile(list(range(1, 101)), 99) == 99
+
+    capsys.readouterr()
+    pkms.run_command("stats")
+    out = capsys.readouterr().out
+    assert "COMMAND STATS (last 22 commands)" in out
+    assert "p99 ms" in out and "Latency histogram" in out
+
+
+def test_explain_shows_query_plan_without_changing_data(pkms, capsys):
+    pkms.add_task("Write report", "High")
+    capsys.readouterr()
+    assert pkms.run_command("explain list --status pending")
+    out = capsys.readouterr().out
+    assert "QUERY PLAN" in out and "idx_tasks_" in out
+
+    pkms.run_command("explain task Scratch high")
+    pkms.run_command("explain done 1")
+    assert pkms.db.execute("SELECT COUNT(*) FROM tasks").fetchone()[0] == 1
+    assert pkms.db.execute("SELECT status FROM tasks").fetchone()[0] == "pending"
+    assert pkms.run_command("explain ask anything") is False
+
+
+def test_trace_file_and_api_usage(pkms, tmp_path, monkeypatch):
+    monkeypatch.setattr(pkms, "metrics", pkms.Metrics())
+    monkeypatch.setattr(pkms, "client", FakeClient())
+    trace = tmp_path / "trace.jsonl"
+    pkms.metrics.open_trace(str(trace))
+    pkms.run_command("task traced")
+    job = pkms.ask_ai("What first?", use_cache=False, wait=True)
+    pkms.collect_finished_jobs()
+    pkms.metrics.close_trace()
+
+    assert (job.prompt_tokens, job.completion_tokens) == (120, 4)
+    assert job.api_seconds is not None
+    events = [json.loads(line) for line in trace.read_text().splitlines()]
+    assert events[0]["event"] == "command" and events[0]["command"] == "task traced"
+    assert events[-1]["event"] == "api" and events[-1]["prompt_tokens"] == 120
+
+
+def test_durability_sets_synchronous_and_group_commit(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "DB_NAME", str(tmp_path / "pkms_test.db"))
+    # registered before main() changes it, so teardown restores the original level
+    monkeypatch.setattr(main, "DURABILITY", main.DURABILITY)
+    script = tmp_path / "cmds.txt"
+    script.write_text("task one\ntask two\ntask three\n")
+    for level, synchronous, expected_commits in (("strict", 2, 3), ("normal", 1, 0), ("fast", 0, 0)):
+        commits = []
+        monkeypatch.setattr(main.db, "commit", lambda: commits.append(1))
+        with pytest.raises(SystemExit) as exit_info:
+            main.main(["--durability", level, "--batch", str(script)])
+        assert exit_info.value.code == 0
+        assert len(commits) == expected_commits
+        main.init_db()
+        assert main.db.conn.execute("PRAGMA synchronous").fetchone()[0] == synchronous
+        main.close_db()
+    main.DURABILITY = "normal"
+    assert main.db.execute("SELECT COUNT(*) FROM tasks").fetchone()[0] == 9
+    main.close_db()
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    """A PKMS daemon on a free port, running on its own event loop thread."""
+    import asyncio
+    monkeypatch.setattr(main, "DB_NAME", str(tmp_path / "pkms_test.db"))
+    main.close_db()
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    server = main.PKMSServer()
+    address = asyncio.run_coroutine_threadsafe(server.start("127.0.0.1:0"), loop).result(10)
+    yield server, address
+    asyncio.run_coroutine_threadsafe(server.close(), loop).result(10)
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def test_daemon_handles_concurrent_writes_and_reads(daemon):
+    from concurrent.futures import ThreadPoolExecutor
+    server, address = daemon
+
+    def add(i):
+        return main.api_request(address, "POST", "/tasks", {"description": f"task {i}", "priority": "high"})
+
+    with ThreadPoolExecutor(100) as pool:
+        writes = list(pool.map(add, range(300)))
+        reads = list(pool.map(lambda _: main.api_request(address, "GET", "/tasks?limit=10"), range(100)))
+    assert all(status == 200 for status, _ in writes + reads)
+    assert sorted(reply["id"] for _, reply in writes) == list(range(1, 301))
+    # queued writes shared commits instead of one commit each
+    assert server.commits < 300
+
+    status, page = main.api_request(address, "GET", "/tasks?limit=250")
+    assert len(page["tasks"]) == 250 and page["next_after"] == 250
+    assert main.api_request(address, "POST", "/tasks/7/done") == (200, {"ok": True})
+    assert main.api_request(address, "POST", "/tasks/999/done")[0] == 404
+    assert main.api_request(address, "GET", "/tasks?status=done")[1]["tasks"][0]["id"] == 7
+    assert main.api_request(address, "PUT", "/tasks")[0] == 405
+
+
+def test_daemon_notes_search_and_commands(daemon, monkeypatch):
+    server, address = daemon
+    status, reply = main.api_request(address, "POST", "/notes", {"title": "Garden", "content": "Plant tomatoes"})
+    assert reply == {"ok": True, "id": 1}
+    results = main.api_request(address, "GET", "/search?q=tomato")[1]["results"]
+    assert [r["id"] for r in results] == [1]
+    assert main.api_request(address, "GET", "/notes/1")[1]["note"]["content"] == "Plant tomatoes"
+    assert main.api_request(address, "GET", "/search")[0] == 400
+
+    # the thin client sends REPL commands; AI questions are answered off the writer thread
+    monkeypatch.setattr(main, "client", FakeClient())
+    assert main.run_client(address, ["task From the client high", "done 42"]) == 1
+    status, reply = main.api_request(address, "POST", "/command", {"command": "list"})
+    assert "From the client" in reply["output"]
+    first = main.api_request(address, "POST", "/ask", {"query": "What first?"})[1]
+    again = main.api_request(address, "POST", "/command", {"command": "ask What first?"})[1]
+    assert first["answer"] == "Do the report first. " and first["cached"] is False
+    assert again["cached"] is True
+    for budget in ("500", -1, 0, 2.5, True):
+        status, reply = main.api_request(address, "POST", "/ask", {"query": "What first?", "budget": budget})
+        assert status == 400 and "budget" in reply["error"]
+
+
+def test_daemon_refuses_browser_requests(daemon, tmp_path):
+    import http.client
+    server, address = daemon
+    host, port = address.rsplit(":", 1)
+
+    def send(headers, body=b'{"command": "task sneaky"}'):
+        conn = http.client.HTTPConnection(host, int(port), timeout=10)
+        conn.request("POST", "/command", body=body, headers=headers)
+        status = conn.getresponse().status
+        conn.close()
+        return status
+
+    # a cross-site "simple" form post, a page on another origin, a DNS-rebound host name
+    assert send({"Content-Type": "text/plain"}) == 415
+    assert send({"Content-Type": "application/json", "Origin": "https://evil.example"}) == 403
+    assert send({"Content-Type": "application/json", "Host": "evil.example:8765"}) == 403
+    assert send({"Content-Type": "application/json", "Host": f"localhost:{port}"}) == 200
+    assert main.api_request(address, "GET", "/tasks")[1]["tasks"][0]["description"] == "sneaky"
+
+    target = tmp_path / "stolen.csv"
+    status, reply = main.api_request(address, "POST", "/command", {"command": f"export tasks {target}"})
+    assert status == 400 and not target.exists()
+    assert main.api_request(address, "POST", "/command", {"command": f"import {target}"})[0] == 400
+
+
+def test_large_note_bodies_go_to_the_blob_store(pkms, tmp_path, capsys, monkeypatch):
+    body = "Server log\n" + "GET /health 200 ok\n" * 2000 + "finally a kernel panic"
+    pkms.add_note("Crash log", body)
+    pkms.add_note("Same log again", body)
+    pkms.add_note("Short", "stays inline")
+
+    rows = pkms.db.execute("SELECT content, blob FROM notes ORDER BY id").fetchall()
+    assert rows[0][1] == rows[1][1] and rows[2] == ("stays inline", None)
+    assert len(rows[0][0]) < pkms.NOTE_PREVIEW_CHARS + 5
+    # one compressed copy for both notes
+    files = list(pkms.db.blobs.files())
+    assert len(files) == 1 and os.path.getsize(files[0][1]) < len(body) // 20
+
+    # the full body is searchable; results show the preview without reading the body
+    def no_reads(digest):
+        raise AssertionError("search read a blob")
+    with monkeypatch.context() as m:
+        m.setattr(pkms.db.blobs, "get", no_reads)
+        results = pkms.find_notes("kernel panic")
+    assert [r[0] for r in results] == [1, 2] and results[0][2].startswith("Server log")
+
+    # plain SQLite connections (the sqlite3 shell, other tools) can still write notes
+    conn = sqlite3.connect(pkms.DB_NAME)
+    conn.execute("INSERT INTO notes (title, content) VALUES ('From the shell', 'zucchini')")
+    conn.execute("DELETE FROM notes WHERE id = 3")
+    conn.commit()
+    conn.close()
+    assert [r[0] for r in pkms.find_notes("zucchini")] == [4] and pkms.find_notes("inline") == []
+
+    # the body comes back when the note is opened or exported
+    capsys.readouterr()
+    assert pkms.run_command("open 1")
+    assert "finally a kernel panic" in capsys.readouterr().out
+    out = tmp_path / "notes.jsonl"
+    pkms.export_file("notes", str(out))
+    assert json.loads(out.read_text().splitlines()[0])["content"] == body
+
+    # gc keeps bodies still in use and removes the rest
+    monkeypatch.setattr(pkms, "BLOB_GC_GRACE", -1)
+    pkms.delete_item("note", 1)
+    pkms.run_command("blobs gc")
+    assert len(list(pkms.db.blobs.files())) == 1
+    pkms.delete_item("note", 2)
+    pkms.run_command("blobs gc")
+    assert list(pkms.db.blobs.files()) == []
+    assert pkms.find_notes("kernel") == []
+
+
+def test_migration_moves_existing_large_notes_to_blobs(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE notes (id INTEGER PRIMARY KEY, title TEXT, content TEXT, created_at TEXT)")
+    conn.execute("INSERT INTO notes (title, content) VALUES ('Pasted doc', ?)", ("lorem ipsum " * 1000 + "zebra",))
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(main, "DB_NAME", db_path)
+    main.init_db()
+    try:
+        content, digest = main.db.execute("SELECT content, blob FROM notes").fetchone()
+        assert digest is not None and content.endswith("…")
+        assert [r[0] for r in main.find_notes("zebra")] == [1]
+        assert main.db.blobs.get(digest).endswith("zebra")
+    finally:
+        main.close_db()
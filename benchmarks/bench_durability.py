@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Write throughput of every store at each durability level (strict, normal, fast).
+
+Usage: python benchmarks/bench_durability.py [--size 1000] [--writes 200]
+
+Each store is preloaded with `--size` tasks and then `--writes` tasks are
+added one at a time, the way each program saves a change. Final is measured
+twice: interactively (one commit per command) and as a batch script, where the
+level also picks the group commit interval.
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from contextlib import redirect_stderr, redirect_stdout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "tasks5"))
+sys.path.insert(0, os.path.join(ROOT, "tasks3", "src"))
+sys.path.insert(0, os.path.join(ROOT, "Final"))
+
+import datagen  # noqa: E402
+
+LEVELS = ("strict", "normal", "fast")
+
+
+def tasks5_writes(storage):
+    def run(tmp, level, size, writes, rng):
+        import tasks
+        tasks.TASKS_FILE = os.path.join(tmp, "tasks.json")
+        tasks.STORAGE, tasks.FORMAT, tasks.DURABILITY = "json", None, level
+        tasks.save_tasks(datagen.tasks5_tasks(size, rng.random()), "pretty")
+        tasks.STORAGE = storage
+        if storage == "sqlite":
+            tasks.SQLiteBackend(tasks.db_path()).close()
+        return lambda: tasks.add_task(datagen.sentence(rng))
+    return run
+
+
+def tasks3_writes(tmp, level, size, writes, rng):
+    import tasks3
+    tasks3.TASKS_FILE = os.path.join(tmp, "tasks.json")
+    tasks3.DURABILITY = level
+    state = datagen.legacy_tasks(size, rng.random())
+
+    def add():
+        state.append({"description": datagen.sentence(rng), "status": "pending"})
+        tasks3.save_tasks(state, "pretty")
+    return add
+
+
+def final_writes(batch):
+    def run(tmp, level, size, writes, rng):
+        import main
+        main.close_db()
+        main.DB_NAME = os.path.join(tmp, "pkms.db")
+        main.DURABILITY = level
+        main.init_db()
+        data = os.path.join(tmp, "data.jsonl")
+        datagen.write_jsonl(datagen.final_records(size, rng.random()), data)
+        main.import_file(data)
+        if not batch:
+            return lambda: main.run_command(f"task {datagen.sentence(rng)} high")
+        script = [f"task {datagen.sentence(rng)} high" for _ in range(writes)]
+        commit_every = main.DURABILITY_LEVELS[level]["commit_every"]
+        # the whole script is one timed "write"; normalised by `writes` below
+        return lambda: main.run_batch(script, commit_every, out=io.StringIO())
+    return run
+
+
+STORES = {
+    "tasks5-json": tasks5_writes("json"),
+    "tasks5-journal": tasks5_writes("journal"),
+    "tasks5-sqlite": tasks5_writes("sqlite"),
+    "tasks3": tasks3_writes,
+    "final": final_writes(batch=False),
+    "final-batch": final_writes(batch=True),
+}
+
+
+def measure(name, level, size, writes, seed):
+    rng = random.Random(f"{seed}-{name}-{level}")
+    with tempfile.TemporaryDirectory() as tmp:
+        with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+            write = STORES[name](tmp, level, size, writes, rng)
+            repeat = 1 if name == "final-batch" else writes
+            started = time.perf_counter()
+            for _ in range(repeat):
+                write()
+            elapsed = time.perf_counter() - started
+        if name.startswith("final"):
+            import main
+            main.close_db()
+    return writes / elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=1_000, help="Tasks (and notes for Final) preloaded")
+    parser.add_argument("--writes", type=int, default=200, help="Tasks added per measurement")
+    parser.add_argument("--stores", nargs="+", choices=sorted(STORES), default=list(STORES))
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    print(f"{'store':<15} " + " ".join(f"{level + ' w/s':>12}" for level in LEVELS) + f" {'fast/strict':>12}")
+    for name in args.stores:
+        rates = [measure(name, level, args.size, args.writes, args.seed) for level in LEVELS]
+        print(f"{name:<15} " + " ".join(f"{rate:>12.1f}" for rate in rates) + f" {rates[2] / rates[0]:>11.1f}x")
+
+
+if __name__ == "__main__":
+    main()
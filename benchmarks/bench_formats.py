@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Compare the task file formats: save time, load time and file size.
+
+Usage: python benchmarks/bench_formats.py [--sizes 10000 100000 1000000] [--repeat 3]
+
+Runs the tasks5 store (id/description/completed/created_at records) and the
+tasks2/tasks3 store (description/status records, same code in both) for every
+format in pretty, compact and binary.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "tasks5"))
+sys.path.insert(0, os.path.join(ROOT, "tasks3", "src"))
+
+import tasks as tasks5  # noqa: E402
+import tasks3  # noqa: E402
+from datagen import legacy_tasks, tasks5_tasks  # noqa: E402
+
+
+def best_of(repeat, func):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def bench(name, module, records, fmt, path, repeat):
+    module.TASKS_FILE = path
+    save = best_of(repeat, lambda: module.save_tasks(records, fmt))
+    loaded = []
+    load = best_of(repeat, lambda: loaded.append(module.load_tasks() if module is tasks3 else module.load_snapshot()))
+    assert loaded[-1] == records, f"{name}/{fmt}: round trip changed the data"
+    return save, load, os.path.getsize(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the best is kept")
+    args = parser.parse_args(argv)
+
+    print(f"{'store':<8} {'tasks':>9} {'format':<8} {'save s':>8} {'load s':>8} {'size MB':>9} {'vs pretty':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tasks.json")
+        for name, module, make in (("tasks5", tasks5, tasks5_tasks), ("tasks3", tasks3, legacy_tasks)):
+            for n in args.sizes:
+                records = make(n)
+                pretty_size = None
+                for fmt in module.FORMATS:
+                    save, load, size = bench(name, module, records, fmt, path, args.repeat)
+                    pretty_size = pretty_size or size
+                    print(f"{name:<8} {n:>9} {fmt:<8} {save:>8.3f} {load:>8.3f} "
+                          f"{size / 1e6:>9.1f} {size / pretty_size:>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""Latency and throughput of every task store, with regression checks.
+
+Usage:
+  python benchmarks/bench_stores.py [--sizes 1000 10000 100000] [--samples 20]
+                                    [--stores tasks5-json final ...] [--output results.json]
+  python benchmarks/bench_stores.py --compare baseline.json [--threshold 0.25]
+  python benchmarks/bench_stores.py --input results.json --compare baseline.json
+
+Each store is preloaded with synthetic data (see datagen.py) and then every
+operation it supports (load/add/complete/delete/list/search) is timed
+`--samples` times, the way its program runs it. Results are written as JSON.
+With --compare, any operation whose median got slower than the baseline by
+more than --threshold is flagged, and the exit code is 1.
+"""
+import argparse
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import redirect_stderr, redirect_stdout
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "tasks5"))
+sys.path.insert(0, os.path.join(ROOT, "tasks3", "src"))
+sys.path.insert(0, os.path.join(ROOT, "Final"))
+
+import datagen  # noqa: E402
+
+
+def load_module(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# --- Stores ---
+#
+# setup(tmp, size, rng) prepares a store holding `size` tasks (and notes) and
+# returns {operation: callable}. Each callable performs one operation.
+
+def tasks5_store(storage):
+    def setup(tmp, size, rng):
+        import tasks
+        tasks.TASKS_FILE = os.path.join(tmp, "tasks.json")
+        tasks.STORAGE, tasks.FORMAT = "json", None
+        tasks.save_tasks(datagen.tasks5_tasks(size, rng.random()), "pretty")
+        tasks.STORAGE = storage
+        if storage == "sqlite":
+            # first open imports tasks.json; keep that out of the timings
+            tasks.SQLiteBackend(tasks.db_path()).close()
+        ids = iter(rng.sample(range(1, size + 1), size))
+        ops = {
+            "add": lambda: tasks.add_task(datagen.sentence(rng)),
+            "complete": lambda: tasks.main(["complete", str(next(ids))]),
+            "delete": lambda: tasks.main(["delete", str(next(ids))]),
+            "list": lambda: tasks.list_tasks(),
+        }
+        if storage != "sqlite":
+            # every json/journal change starts with a full load
+            ops = {"load": lambda: tasks.load_tasks(), **ops}
+        return ops
+    return setup
+
+
+def legacy_store(module_name):
+    def setup(tmp, size, rng):
+        if module_name == "tasks3":
+            import tasks3 as module
+        else:
+            module = load_module("task_manager", os.path.join(ROOT, "tasks2", "task_manager.py"))
+        module.TASKS_FILE = os.path.join(tmp, "tasks.json")
+        module.save_tasks(datagen.legacy_tasks(size, rng.random()), "pretty")
+        # the programs load once at startup and save the whole list after each change
+        state = {"tasks": module.load_tasks()}
+        positions = iter(rng.sample(range(size), size))
+
+        def add():
+            state["tasks"].append({"description": datagen.sentence(rng), "status": "pending"})
+            module.save_tasks(state["tasks"])
+
+        def complete():
+            state["tasks"][next(positions)]["status"] = "completed"
+            module.save_tasks(state["tasks"])
+
+        return {
+            "load": lambda: state.update(tasks=module.load_tasks()),
+            "add": add,
+            "complete": complete,
+            "list": lambda: module.view_tasks(state["tasks"]),
+        }
+    return setup
+
+
+def final_store(tmp, size, rng):
+    import main
+    main.close_db()
+    main.DB_NAME = os.path.join(tmp, "pkms.db")
+    main.init_db()
+    data = os.path.join(tmp, "data.jsonl")
+    datagen.write_jsonl(datagen.final_records(size, rng.random()), data)
+    main.import_file(data)
+    ids = iter(rng.sample(range(1, size + 1), size))
+    return {
+        "add": lambda: main.run_command(f"task {datagen.sentence(rng)} high"),
+        "complete": lambda: main.run_command(f"done {next(ids)}"),
+        "delete": lambda: main.run_command(f"delete task {next(ids)}"),
+        "list": lambda: main.run_command("list"),
+        "search": lambda: main.run_command(f"search {rng.choice(datagen.VOCABULARY)}"),
+    }
+
+
+STORES = {
+    "tasks5-json": tasks5_store("json"),
+    "tasks5-journal": tasks5_store("journal"),
+    "tasks5-sqlite": tasks5_store("sqlite"),
+    "tasks2": legacy_store("tasks2"),
+    "tasks3": legacy_store("tasks3"),
+    "final": final_store,
+}
+
+
+# --- Running ---
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_store(name, size, samples, seed):
+    rng = random.Random(f"{seed}-{name}-{size}")
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+            ops = STORES[name](tmp, size, rng)
+        for op, func in ops.items():
+            times = []
+            for _ in range(samples):
+                with open(os.devnull, "w") as sink, redirect_stdout(sink):
+                    started = time.perf_counter()
+                    func()
+                    times.append(time.perf_counter() - started)
+            median = statistics.median(times)
+            results.append({
+                "store": name, "size": size, "op": op, "samples": samples,
+                "median_ms": round(median * 1000, 3),
+                "p95_ms": round(percentile(times, 95) * 1000, 3),
+                "ops_per_sec": round(samples / sum(times), 1) if sum(times) else None,
+            })
+        if name == "final":
+            import main
+            main.close_db()
+    return results
+
+
+def run_suite(stores, sizes, samples, seed):
+    results = []
+    for size in sizes:
+        for name in stores:
+            print(f"  {name} @ {size} ...", file=sys.stderr, flush=True)
+            results.extend(run_store(name, size, samples, seed))
+    return {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": sizes, "samples": samples, "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def print_results(report):
+    print(f"{'store':<15} {'size':>8} {'op':<9} {'median ms':>10} {'p95 ms':>10} {'ops/s':>10}")
+    for r in report["results"]:
+        print(f"{r['store']:<15} {r['size']:>8} {r['op']:<9} {r['median_ms']:>10.3f} "
+              f"{r['p95_ms']:>10.3f} {r['ops_per_sec'] or 0:>10.1f}")
+
+
+def compare(report, baseline, threshold):
+    """Print current vs baseline medians. Returns the number of regressions."""
+    before = {(r["store"], r["size"], r["op"]): r for r in baseline["results"]}
+    regressions = 0
+    print(f"{'store':<15} {'size':>8} {'op':<9} {'baseline ms':>12} {'now ms':>10} {'change':>8}")
+    for r in report["results"]:
+        old = before.get((r["store"], r["size"], r["op"]))
+        if old is None or not old["median_ms"]:
+            continue
+        change = r["median_ms"] / old["median_ms"] - 1
+        flag = ""
+        if change > threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{r['store']:<15} {r['size']:>8} {r['op']:<9} {old['median_ms']:>12.3f} "
+              f"{r['median_ms']:>10.3f} {change:>+8.0%}{flag}")
+    print(f"\n{regressions} regression(s) beyond {threshold:.0%}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+                        help="Dataset sizes (tasks, and notes for Final); up to 1000000")
+    parser.add_argument("--samples", type=int, default=20, help="Timed runs per operation")
+    parser.add_argument("--stores", nargs="+", choices=sorted(STORES), default=list(STORES))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--input", help="Use an existing results file instead of running")
+    parser.add_argument("--compare", metavar="BASELINE", help="Baseline results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Flag medians slower than the baseline by more than this fraction (default 0.25)")
+    args = parser.parse_args(argv)
+
+    if args.input:
+        with open(args.input, "r", encoding="utf-8") as f:
+            report = json.load(f)
+    else:
+        report = run_suite(args.stores, args.sizes, args.samples, args.seed)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        sys.exit(1 if compare(report, baseline, args.threshold) else 0)
+    print_results(report)
+
+
+if __name__ == "__main__":
+    main()
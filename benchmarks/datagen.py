@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Synthetic, reproducible task and note data for the benchmarks.
+
+Usage: python benchmarks/datagen.py {tasks5,legacy,final} COUNT [--seed 42] [--out FILE]
+
+  tasks5  tasks5/tasks.py records: {id, description, completed, created_at}
+  legacy  tasks2/tasks3 records:   {description, status}
+  final   Final/main.py import records: COUNT tasks and COUNT notes (JSONL)
+
+The same seed always gives the same data, so runs can be compared.
+"""
+import argparse
+import json
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+
+# Small fixed vocabulary so searches have realistic hit rates
+VOCABULARY = (
+    "report budget meeting client invoice design review deploy server backup "
+    "database migrate schema index query cache latency release sprint roadmap "
+    "email call draft outline research paper exam lecture homework project "
+    "garden grocery dentist flight hotel passport renew insurance taxes rent "
+    "python sqlite json benchmark profile refactor test bug fix feature docs"
+).split()
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def sentence(rng, low=4, high=12):
+    return " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(low, high))).capitalize()
+
+
+def timestamp(rng, i):
+    # roughly in insertion order, a few minutes apart
+    return (START + timedelta(minutes=5 * i + rng.randint(0, 4))).strftime("%Y-%m-%dT%H:%M:%S.000000Z")
+
+
+def tasks5_tasks(count, seed=42, completed_ratio=0.6):
+    rng = random.Random(seed)
+    return [{"id": i, "description": sentence(rng), "completed": rng.random() < completed_ratio,
+             "created_at": timestamp(rng, i)}
+            for i in range(1, count + 1)]
+
+
+def legacy_tasks(count, seed=42, completed_ratio=0.6):
+    rng = random.Random(seed)
+    return [{"description": sentence(rng), "status": "completed" if rng.random() < completed_ratio else "pending"}
+            for _ in range(count)]
+
+
+def final_records(count, seed=42, completed_ratio=0.6):
+    """Yield `count` tasks then `count` notes in Final's import format."""
+    rng = random.Random(seed)
+    for i in range(1, count + 1):
+        yield {"type": "task", "description": sentence(rng),
+               "status": "DONE" if rng.random() < completed_ratio else "pending",
+               "priority": rng.choice(("low", "medium", "high")), "created_at": timestamp(rng, i)}
+    for i in range(1, count + 1):
+        yield {"type": "note", "title": sentence(rng, 2, 5), "content": sentence(rng, 20, 80),
+               "created_at": timestamp(rng, i)}
+
+
+def write_jsonl(records, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("kind", choices=("tasks5", "legacy", "final"))
+    parser.add_argument("count", type=int)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="Output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    try:
+        if args.kind == "final":
+            for record in final_records(args.count, args.seed):
+                out.write(json.dumps(record) + "\n")
+        else:
+            make = tasks5_tasks if args.kind == "tasks5" else legacy_tasks
+            json.dump(make(args.count, args.seed), out)
+    finally:
+        if args.out:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,136 @@
 import json
+import mmap
 import os
+import struct
+import sys
+from array import array
+from itertools import accumulate
 
 # Define the file where tasks will be stored
 TASKS_FILE = "tasks.json"
 
+# File formats: "pretty" (indented JSON), "compact" (JSON without spaces) or
+# "binary" (packed columns, read with mmap). Loading detects the format from
+# the first bytes of the file, so every format can be read. Saving uses
+# TASKS_FORMAT if it is set, otherwise it keeps the format the file has.
+FORMATS = ("pretty", "compact", "binary")
+TASKS_FORMAT = os.environ.get("TASKS_FORMAT") or None
+
+# Durability (TASKS_DURABILITY), the same levels as tasks5 and Final:
+#   "strict"  fsync the file and its folder: a finished save survives a power cut
+#   "normal"  fsync the file before it replaces the old one: a power cut can undo
+#             the last save, but tasks.json is never half written (default)
+#   "fast"    no fsync: safe if the program crashes, a power cut can lose saves
+DURABILITY_LEVELS = ("strict", "normal", "fast")
+DURABILITY = os.environ.get("TASKS_DURABILITY") or "normal"
+BINARY_MAGIC = b"TSK2"
+# magic, number of tasks, bytes of description text, bytes of the status names
+BINARY_HEADER = struct.Struct("<4sQQQ")
+
+def detect_format(path):
+    """Returns "binary", "pretty" or "compact" for an existing file, or None."""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(len(BINARY_MAGIC))
+    except OSError:
+        return None
+    if head == BINARY_MAGIC:
+        return "binary"
+    if head.strip() == b"[]":
+        return None  # an empty list reads the same in both: keep the configured format
+    # json.dump(indent=...) always starts a non-empty list with "[\n"
+    return "pretty" if head[:2] == b"[\n" else "compact"
+
 def load_tasks():
-    """Loads tasks from the tasks.json file."""
-    # Check if the file exists
+    """Loads tasks from the tasks.json file (any format)."""
     if not os.path.exists(TASKS_FILE):
-        return []  # Return an empty list if no file
-    
-    # Open the file and load the JSON data
+        return []
     try:
-        with open(TASKS_FILE, 'r') as f:
-            tasks = json.load(f)
-            return tasks
-    except json.JSONDecodeError:
-        return [] # Return empty list if file is empty or corrupted
+        with open(TASKS_FILE, 'rb') as f:
+            if f.read(len(BINARY_MAGIC)) == BINARY_MAGIC:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                    return decode_binary(buf)
+            f.seek(0)
+            return json.loads(f.read())
+    except (ValueError, struct.error):
+        return []
 
-def save_tasks(tasks):
+def save_tasks(tasks, fmt=None):
     """Saves the current list of tasks to the tasks.json file."""
-    # Open the file in 'write' mode and dump the data
-    with open(TASKS_FILE, 'w') as f:
-        # indent=4 makes the JSON file human-readable
-        json.dump(tasks, f, indent=4)
+    fmt = fmt or TASKS_FORMAT or detect_format(TASKS_FILE) or "pretty"
+    # Write a temporary file and swap it in, so a crash never leaves half a file
+    tmp_path = TASKS_FILE + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(encode_tasks(tasks, fmt))
+        if DURABILITY != "fast":
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, TASKS_FILE)
+    if DURABILITY == "strict":
+        sync_folder(TASKS_FILE)
+
+def sync_folder(path):
+    """Saves the folder entry of `path` to disk, so the rename is not lost (not possible on Windows)."""
+    if os.name == "nt":
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def encode_tasks(tasks, fmt):
+    """Turns the task list into the bytes of the chosen format."""
+    if fmt == "binary":
+        return encode_binary(tasks)
+    if fmt == "compact":
+        return json.dumps(tasks, separators=(",", ":")).encode("utf-8")
+    return json.dumps(tasks, indent=4).encode("utf-8")
+
+def encode_binary(tasks):
+    """Packs tasks as: header, description lengths, status codes, status names, description text."""
+    descriptions = [str(task['description']) for task in tasks]
+    # There are only a few different statuses, so store each one once
+    names = list(dict.fromkeys(str(task['status']) for task in tasks))
+    number = {name: i for i, name in enumerate(names)}
+    codes = array("H", (number[str(task['status'])] for task in tasks))
+    desc_lens = array("I", map(len, descriptions))
+    if sys.byteorder == "big":
+        desc_lens.byteswap()
+        codes.byteswap()
+    desc_text = "".join(descriptions).encode("utf-8")
+    names_text = json.dumps(names).encode("utf-8")
+    header = BINARY_HEADER.pack(BINARY_MAGIC, len(tasks), len(desc_text), len(names_text))
+    return b"".join([header, desc_lens.tobytes(), codes.tobytes(), names_text, desc_text])
+
+def decode_binary(buf):
+    """Reads tasks back from the bytes written by encode_binary."""
+    magic, count, desc_size, names_size = BINARY_HEADER.unpack_from(buf, 0)
+    pos = BINARY_HEADER.size
+    desc_lens = array("I")
+    desc_lens.frombytes(buf[pos:pos + desc_lens.itemsize * count])
+    pos += desc_lens.itemsize * count
+    codes = array("H")
+    codes.frombytes(buf[pos:pos + codes.itemsize * count])
+    pos += codes.itemsize * count
+    if sys.byteorder == "big":
+        desc_lens.byteswap()
+        codes.byteswap()
+    names = json.loads(buf[pos:pos + names_size])
+    desc_text = str(buf[pos + names_size:pos + names_size + desc_size], "utf-8")
+    return [{"description": description, "status": names[code]}
+            for description, code in zip(split_text(desc_text, desc_lens), codes)]
+
+def split_text(text, lengths):
+    """Cuts one long string back into pieces of the given lengths."""
+    ends = list(accumulate(lengths))
+    return [text[start:end] for start, end in zip([0] + ends[:-1], ends)]
+
+def convert(fmt):
+    """Rewrites tasks.json in another format (pretty, compact or binary)."""
+    tasks = load_tasks()
+    save_tasks(tasks, fmt)
+    print(f"Converted {len(tasks)} tasks to {fmt} ({os.path.getsize(TASKS_FILE)} bytes).")
 
 def view_tasks(tasks):
     """Displays the list of tasks."""
@@ -104,4 +211,15 @@ def main_menu():
 
 # Run the main menu when the script is executed
 if __name__ == "__main__":
-    main_menu()
\ No newline at end of file
+    if DURABILITY not in DURABILITY_LEVELS:
+        print(f"Error: unknown TASKS_DURABILITY '{DURABILITY}'. Use one of: {', '.join(DURABILITY_LEVELS)}.",
+              file=sys.stderr)
+        sys.exit(2)
+    # "python task_manager.py convert binary" rewrites tasks.json and exits
+    if sys.argv[1:2] == ["convert"]:
+        if len(sys.argv) != 3 or sys.argv[2] not in FORMATS:
+            print(f"Usage: python task_manager.py convert {{{'|'.join(FORMATS)}}}")
+            sys.exit(2)
+        convert(sys.argv[2])
+    else:
+        main_menu()
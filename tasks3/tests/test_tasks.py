@@ -61,4 +61,84 @@ def test_complete_task(monkeypatch):
     
     # Check 2: Was the 'tasks.json' file saved correctly?
     loaded_tasks = load_tasks()
-    assert loaded_tasks[0]['status'] == "completed"
\ No newline at end of file
+    assert loaded_tasks[0]['status'] == "completed"
+
+# --- Test 3: Every file format loads back the same tasks ---
+@pytest.mark.parametrize("fmt", tasks3.FORMATS)
+def test_formats_round_trip(fmt):
+    """Verify that each format saves and loads the same list, and is detected from the header."""
+    tasks = [{"description": f"Task {i} ✓", "status": "completed" if i % 2 else "pending"}
+             for i in range(50)]
+    tasks3.save_tasks(tasks, fmt)
+    assert tasks3.detect_format("tasks.json") == fmt
+    assert load_tasks() == tasks
+
+    # A later save keeps the file's format
+    tasks.append({"description": "One more", "status": "pending"})
+    tasks3.save_tasks(tasks)
+    assert tasks3.detect_format("tasks.json") == fmt
+    assert load_tasks() == tasks
+
+# --- Test 4: The convert command rewrites the file ---
+def test_convert_command(capsys):
+    """Verify that 'tasks3 convert binary' shrinks the file and keeps the tasks."""
+    tasks = [{"description": "Write tests", "status": "pending"}] * 100
+    tasks3.save_tasks(tasks, "pretty")
+    before = os.path.getsize("tasks.json")
+
+    tasks3.main(["convert", "binary"])
+
+    assert "Converted 100 tasks to binary" in capsys.readouterr().out
+    assert os.path.getsize("tasks.json") < before
+    assert load_tasks() == tasks
+
+# --- Test 5: The uv entry point starts fast ---
+def test_entry_point_imports_stay_light():
+    """Verify that importing tasks3 (what 'uv run tasks3' does first) pulls in nothing heavy."""
+    import subprocess
+    import sys
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import tasks3"],
+                            capture_output=True, text=True, env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)})
+    rows = [line.split("|") for line in result.stderr.splitlines() if line.startswith("import time:")][1:]
+    modules = {row[2].strip().split(".")[0] for row in rows}
+    total = sum(int(row[0].split(":")[1]) for row in rows) / 1e6
+    assert "tasks3" in modules
+    assert not modules & {"openai", "httpx", "pydantic"}
+    assert total < 0.3, f"imports took {total:.3f}s"
+
+# --- Test 6: Durability levels decide what gets fsynced ---
+@pytest.mark.parametrize("level, expected", [("strict", 2), ("normal", 1), ("fast", 0)])
+def test_durability_levels(monkeypatch, level, expected):
+    """Verify that each level fsyncs the right amount and that saves are atomic."""
+    calls = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: calls.append(fd) or real_fsync(fd))
+    monkeypatch.setattr(tasks3, "DURABILITY", level)
+
+    tasks3.save_tasks([{"description": "Back up", "status": "pending"}])
+
+    assert len(calls) == expected
+    assert load_tasks() == [{"description": "Back up", "status": "pending"}]
+    assert not os.path.exists("tasks.json.tmp")
+
+# --- Test 7: An emptied file keeps its format ---
+def test_empty_pretty_file_stays_pretty(monkeypatch):
+    """Verify that a list emptied in pretty mode is still pretty after the next add."""
+    tasks = []
+    tasks3.save_tasks(tasks, "pretty")
+    assert tasks3.detect_format("tasks.json") is None  # "[]" could be either
+
+    monkeypatch.setattr('builtins.input', lambda _: "Buy groceries")
+    add_task(tasks)
+
+    assert tasks3.detect_format("tasks.json") == "pretty"
+
+# --- Test 8: A misspelled durability level is an error, not "normal" ---
+def test_unknown_durability_level_is_rejected(monkeypatch, capsys):
+    """Verify that TASKS_DURABILITY=strcit stops with the list of valid levels."""
+    monkeypatch.setattr(tasks3, "DURABILITY", "strcit")
+    with pytest.raises(SystemExit) as exit_info:
+        tasks3.main([])
+    assert exit_info.value.code == 2
+    assert "strict, normal, fast" in capsys.readouterr().err
+    assert not os.path.exists("tasks.json")
@@ -1,25 +1,322 @@
+import argparse
+import asyncio
+import hashlib
+import json
 import os
-from openai import OpenAI
-# We don't need 'load_dotenv' anymore
+import random
+import sqlite3
+import sys
+import time
+# openai is imported where a client is built: it is slow to import, and
+# --help or a fully cached batch never needs it
 
-def main():
+MODEL = "gpt-5-mini"
+SYSTEM_PROMPT = "You are an expert summarizer. Your job is to take a long task description and summarize it into a short, actionable phrase of 10 words or less."
+CACHE_FILE = "summary_cache.db"
+
+
+# --- Summary cache: never pay twice for the same description ---
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token)."""
+    return max(1, len(text) // 4)
+
+
+class SummaryCache:
+    """Summaries stored in a local SQLite file, keyed by hash(model, system prompt, description).
+
+    Editing a description (or the prompt, or the model) changes the key, so only
+    new or changed descriptions reach the API. Keeps at most `max_entries`
+    summaries, dropping the least recently used ones first.
+    """
+
+    def __init__(self, path=CACHE_FILE, max_entries=10000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS summaries (
+                                 key TEXT PRIMARY KEY,
+                                 summary TEXT NOT NULL,
+                                 tokens INTEGER NOT NULL,
+                                 last_used REAL NOT NULL
+                             )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_summaries_last_used ON summaries (last_used)")
+
+    @staticmethod
+    def key(description, model=MODEL, system_prompt=SYSTEM_PROMPT):
+        return hashlib.sha256(f"{model}\x00{system_prompt}\x00{description}".encode("utf-8")).hexdigest()
+
+    def get(self, description):
+        key = self.key(description)
+        row = self.conn.execute("SELECT summary, tokens FROM summaries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.tokens_saved += row[1]
+        self.conn.execute("UPDATE summaries SET last_used = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put(self, description, summary, tokens=None):
+        if tokens is None:
+            tokens = estimate_tokens(SYSTEM_PROMPT + description + summary)
+        self.conn.execute("INSERT OR REPLACE INTO summaries (key, summary, tokens, last_used) VALUES (?, ?, ?, ?)",
+                          (self.key(description), summary, tokens, time.time()))
+        self.evict()
+
+    def evict(self):
+        count = self.conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute("DELETE FROM summaries WHERE key IN "
+                              "(SELECT key FROM summaries ORDER BY last_used LIMIT ?)",
+                              (count - self.max_entries,))
+
+    def report(self):
+        lookups = self.hits + self.misses
+        ratio = self.hits / lookups if lookups else 0.0
+        return (f"Cache: {self.hits}/{lookups} hits ({ratio:.0%}), "
+                f"~{self.tokens_saved} tokens saved")
+
+    def close(self):
+        self.conn.close()
+
+
+# --- Batch mode: summarize many descriptions concurrently ---
+
+class TokenBucket:
+    """Rate limiter: on average `rate` requests per second, bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        # The lock makes waiting requests take their turn in order
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def read_descriptions(source):
+    """Read descriptions from a file path (or '-' for stdin).
+
+    Accepts a JSON array or JSON Lines. Each item is either a string or an
+    object with a "description" key (and an optional "id").
+    Returns a list of (id, description) pairs in input order. Raises
+    ValueError if the input is not valid JSON or an item has no description.
+    """
+    if source == "-":
+        text = sys.stdin.read()
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            text = f.read()
+
+    if text.lstrip().startswith("["):
+        items = json.loads(text)
+    else:
+        items = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    descriptions = []
+    bad = []
+    for index, item in enumerate(items):
+        if isinstance(item, str):
+            descriptions.append((index, item))
+        elif isinstance(item, dict) and isinstance(item.get("description"), str):
+            descriptions.append((item.get("id", index), item["description"]))
+        else:
+            bad.append(str(index))
+    if bad:
+        # Checked before any request, so a bad file costs nothing
+        raise ValueError(f"item {', '.join(bad)} of {source} is not a string or an object with a \"description\"")
+    return descriptions
+
+
+def is_retryable(error):
+    """Rate limits (429), server errors (5xx) and network problems are worth retrying."""
+    status = getattr(error, "status_code", None)  # openai.APIStatusError and its subclasses
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    # An openai network error implies openai is already imported
+    openai = sys.modules.get("openai")
+    return openai is not None and isinstance(error, (openai.APIConnectionError, openai.APITimeoutError))
+
+
+def retry_delay(error, attempt, base_delay):
+    """Honour Retry-After when the server sends it, otherwise exponential backoff with jitter."""
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            return float(response.headers.get("retry-after"))
+        except (TypeError, ValueError):
+            pass
+    return base_delay * (2 ** attempt) * (0.5 + random.random())
+
+
+async def summarize_one(client, description, limiter, semaphore, max_retries, base_delay):
+    """Summarize one description. Returns (summary, attempts used, tokens billed or None)."""
+    attempt = 0
+    while True:
+        async with semaphore:
+            await limiter.acquire()
+            try:
+                chat_completion = await client.chat.completions.create(
+                    model=MODEL,
+                    messages=[
+                        {"role": "system", "content": SYSTEM_PROMPT},
+                        {"role": "user", "content": description}
+                    ]
+                )
+                usage = getattr(chat_completion, "usage", None)
+                tokens = getattr(usage, "total_tokens", None)
+                return chat_completion.choices[0].message.content, attempt + 1, tokens
+            except Exception as e:
+                if attempt >= max_retries or not is_retryable(e):
+                    raise
+                delay = retry_delay(e, attempt, base_delay)
+        # Back off outside the semaphore so other requests can use the slot
+        attempt += 1
+        await asyncio.sleep(delay)
+
+
+async def run_batch(descriptions, concurrency, rate, max_retries, base_delay=0.5, out=None, client=None, cache=None):
+    """Summarize all descriptions concurrently, writing one JSON line per result
+    as soon as it finishes. The "index" field gives the position in the input.
+    With a cache, known descriptions are answered first without any request."""
+    out = out or sys.stdout
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = TokenBucket(rate)
+
+    def emit(record):
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+
+    async def worker(index, task_id, description):
+        record = {"index": index, "id": task_id}
+        try:
+            record["summary"], record["attempts"], record["tokens"] = await summarize_one(
+                client, description, limiter, semaphore, max_retries, base_delay)
+        except Exception as e:
+            record["error"] = str(e)
+        return record
+
+    started = time.monotonic()
+    pending = []
+    for i, (task_id, desc) in enumerate(descriptions):
+        summary = cache.get(desc) if cache is not None else None
+        if summary is not None:
+            emit({"index": i, "id": task_id, "summary": summary, "cached": True})
+        else:
+            pending.append((i, task_id, desc))
+
+    if pending and client is None:
+        if api_key_missing(file=sys.stderr):
+            return len(pending)
+        from openai import AsyncOpenAI
+        # Our own retry loop handles 429/5xx, so turn off the SDK's
+        client = AsyncOpenAI(max_retries=0)
+    jobs = [asyncio.create_task(worker(i, task_id, desc)) for i, task_id, desc in pending]
+    failed = 0
+    for finished in asyncio.as_completed(jobs):
+        record = await finished
+        if "error" in record:
+            failed += 1
+        elif cache is not None:
+            cache.put(descriptions[record["index"]][1], record["summary"] or "", record["tokens"])
+        emit(record)
+
+    elapsed = time.monotonic() - started
+    total = len(descriptions)
+    print(f"Summarized {total - failed}/{total} descriptions in {elapsed:.2f}s "
+          f"({total / elapsed if elapsed else 0:.1f}/s, {len(jobs)} API requests, "
+          f"concurrency {concurrency}, rate {rate}/s)", file=sys.stderr)
+    if cache is not None:
+        print(cache.report(), file=sys.stderr)
+    return failed
+
+
+def positive(kind):
+    """argparse type: a number of `kind` greater than zero."""
+    def parse(text):
+        try:
+            value = kind(text)
+        except ValueError:
+            value = 0
+        if not value > 0:
+            raise argparse.ArgumentTypeError(f"must be a number greater than 0, not '{text}'")
+        return value
+    return parse
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="tasks4", description="Task Summarization Bot")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="Summarize descriptions from a JSON/JSONL file ('-' for stdin), output JSONL")
+    parser.add_argument("--concurrency", type=positive(int), default=8, help="Requests in flight at once (default 8)")
+    parser.add_argument("--rate", type=positive(float), default=5.0, help="Max requests per second (default 5)")
+    parser.add_argument("--retries", type=int, default=5, help="Retries on 429/5xx (default 5)")
+    parser.add_argument("--cache", default=CACHE_FILE, help=f"Summary cache file (default {CACHE_FILE})")
+    parser.add_argument("--cache-size", type=int, default=10000,
+                        help="Max cached summaries, least recently used dropped first (default 10000)")
+    parser.add_argument("--no-cache", action="store_true", help="Always call the API")
+    return parser.parse_args(argv)
+
+
+def api_key_missing(file=None):
+    """Explain how to set OPENAI_API_KEY and return True when it is not set."""
     # The key is now loaded from Windows, not a .env file
     # The OpenAI client will find it automatically if you set it correctly.
-    api_key = os.environ.get("OPENAI_API_KEY")
-    
-    if not api_key:
-        print("Error: OPENAI_API_KEY not found in your environment.")
-        print("Please make sure you set it in the Control Panel and RESTARTED your terminal.")
+    if os.environ.get("OPENAI_API_KEY"):
+        return False
+    print("Error: OPENAI_API_KEY not found in your environment.", file=file)
+    print("Please make sure you set it in the Control Panel and RESTARTED your terminal.", file=file)
+    return True
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+
+    if args.batch:
+        # The key is checked by run_batch, only if some description is not cached
+        try:
+            descriptions = read_descriptions(args.batch)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(2)
+        cache = None if args.no_cache else SummaryCache(args.cache, args.cache_size)
+        try:
+            failed = asyncio.run(run_batch(descriptions, args.concurrency, args.rate, args.retries, cache=cache))
+        finally:
+            if cache is not None:
+                cache.close()
+        sys.exit(1 if failed else 0)
+
+    if api_key_missing():
         return
 
     try:
         # When you initialize OpenAI without an api_key argument,
         # it automatically looks for the 'OPENAI_API_KEY' environment variable.
+        from openai import OpenAI
         client = OpenAI()
     except Exception as e:
         print(f"Error initializing OpenAI client: {e}")
         return
 
+    # Opened after the client is built, so a failed start leaves no cache open
+    cache = None if args.no_cache else SummaryCache(args.cache, args.cache_size)
+
     # 1. Your two sample paragraph-length descriptions
     task_descriptions = [
         "Create a new Python script that reads a JSON file named 'tasks.json'. The script needs to parse this file, find all tasks that have a 'status' key set to 'pending', and then print their 'task_name' and 'due_date' to the console.",
@@ -33,14 +330,19 @@ def main():
         print(f"\nProcessing Task {i+1}...")
         print(f"Original: \"{desc}\"")
 
+        cached = cache.get(desc) if cache is not None else None
+        if cached is not None:
+            print(f"Summary: {cached} (cached)")
+            continue
+
         try:
             # 3. Use the Chat Completions API
             chat_completion = client.chat.completions.create(
-                model="gpt-5-mini",
+                model=MODEL,
                 messages=[
                     {
                         "role": "system",
-                        "content": "You are an expert summarizer. Your job is to take a long task description and summarize it into a short, actionable phrase of 10 words or less."
+                        "content": SYSTEM_PROMPT
                     },
                     {
                         "role": "user",
@@ -53,9 +355,16 @@ def main():
             
             # 4. Print the summary
             print(f"Summary: {summary}")
+            if cache is not None:
+                usage = getattr(chat_completion, "usage", None)
+                cache.put(desc, summary or "", getattr(usage, "total_tokens", None))
 
         except Exception as e:
             print(f"An error occurred while contacting OpenAI: {e}")
 
+    if cache is not None:
+        print(f"\n{cache.report()}")
+        cache.close()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,167 @@
+# tasks4/tests/test_batch.py
+
+import asyncio
+import io
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import tasks4
+from tasks4 import TokenBucket, retry_delay, run_batch
+
+
+class FakeStatusError(Exception):
+    """Looks like openai.APIStatusError: a status code and the HTTP response."""
+
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        headers = {} if retry_after is None else {"retry-after": retry_after}
+        self.response = SimpleNamespace(headers=headers)
+
+
+class FakeClient:
+    """Stands in for AsyncOpenAI. `failures` maps a description to the errors
+    its first calls raise; every other call succeeds after `delay` seconds."""
+
+    def __init__(self, delay=0.01, failures=None):
+        self.delay = delay
+        self.failures = {desc: list(errors) for desc, errors in (failures or {}).items()}
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages):
+        description = messages[-1]["content"]
+        self.calls.append((description, time.monotonic()))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            errors = self.failures.get(description)
+            if errors:
+                raise errors.pop(0)
+            message = SimpleNamespace(content=f"summary of {description}")
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)],
+                                   usage=SimpleNamespace(total_tokens=42))
+        finally:
+            self.in_flight -= 1
+
+
+def batch(descriptions, client, concurrency=4, rate=1000, retries=3, **kwargs):
+    """Run run_batch and return (failed count, results by index)."""
+    out = io.StringIO()
+    items = [(i, desc) for i, desc in enumerate(descriptions)]
+    failed = asyncio.run(run_batch(items, concurrency, rate, retries, base_delay=0.001,
+                                   out=out, client=client, **kwargs))
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    return failed, {record["index"]: record for record in records}
+
+
+def test_concurrency_is_bounded():
+    client = FakeClient(delay=0.02)
+    failed, results = batch([f"task {i}" for i in range(20)], client, concurrency=3)
+    assert failed == 0
+    assert client.max_in_flight == 3
+    assert [results[i]["summary"] for i in range(20)] == [f"summary of task {i}" for i in range(20)]
+    assert results[0]["attempts"] == 1 and results[0]["tokens"] == 42
+
+
+def test_token_bucket_limits_the_request_rate():
+    async def acquire_all(bucket, count):
+        started = time.monotonic()
+        for _ in range(count):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # a burst of `capacity`, then one request every 1/rate seconds
+    assert asyncio.run(acquire_all(TokenBucket(rate=100, capacity=5), 5)) < 0.05
+    assert asyncio.run(acquire_all(TokenBucket(rate=100, capacity=1), 11)) >= 0.095
+
+    client = FakeClient(delay=0)
+    batch([f"task {i}" for i in range(6)], client, concurrency=6, rate=50)
+    starts = sorted(at for _, at in client.calls)
+    assert starts[-1] - starts[0] < 0.05  # the first `rate` requests are one burst
+
+
+def test_rate_limits_and_server_errors_are_retried():
+    client = FakeClient(failures={
+        "busy": [FakeStatusError(429, retry_after="0.1"), FakeStatusError(503)],
+    })
+    failed, results = batch(["busy", "calm"], client)
+    assert failed == 0
+    assert results[0] == {"index": 0, "id": 0, "summary": "summary of busy", "attempts": 3, "tokens": 42}
+    assert results[1]["attempts"] == 1
+    busy = [at for desc, at in client.calls if desc == "busy"]
+    assert busy[1] - busy[0] >= 0.1  # waited as long as Retry-After asked
+
+
+def test_retry_delay_uses_retry_after_or_backoff():
+    assert retry_delay(FakeStatusError(429, retry_after="2"), 0, 0.5) == 2.0
+    assert retry_delay(FakeStatusError(429, retry_after="soon"), 0, 0.5) <= 0.75
+    for attempt in range(4):
+        delay = retry_delay(FakeStatusError(500), attempt, 0.5)
+        assert 0.25 * 2 ** attempt <= delay < 0.75 * 2 ** attempt
+
+
+def test_failures_that_retrying_cannot_fix():
+    client = FakeClient(failures={
+        "bad request": [FakeStatusError(400)],
+        "bug": [ValueError("unexpected reply")],
+        "always busy": [FakeStatusError(429)] * 10,
+    })
+    failed, results = batch(["bad request", "bug", "always busy", "fine"], client, retries=2)
+    assert failed == 3
+    assert results[0]["error"] == "HTTP 400" and results[1]["error"] == "unexpected reply"
+    assert results[2]["error"] == "HTTP 429"
+    assert results[3]["summary"] == "summary of fine"
+    calls = [desc for desc, _ in client.calls]
+    assert calls.count("bad request") == 1 and calls.count("bug") == 1
+    assert calls.count("always busy") == 3  # the first try plus --retries
+
+
+def test_cached_batch_runs_without_an_api_key(tmp_path, monkeypatch, capsys):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    cache_file = str(tmp_path / "cache.db")
+    cache = tasks4.SummaryCache(cache_file)
+    cache.put("known task", "already summarized")
+    cache.close()
+    source = tmp_path / "tasks.jsonl"
+
+    source.write_text(json.dumps({"id": 7, "description": "known task"}) + "\n")
+    with pytest.raises(SystemExit) as exit_info:
+        tasks4.main(["--batch", str(source), "--cache", cache_file])
+    assert exit_info.value.code == 0
+    out, _ = capsys.readouterr()
+    assert json.loads(out) == {"index": 0, "id": 7, "summary": "already summarized", "cached": True}
+
+    # a description that needs the API fails cleanly instead of reaching OpenAI
+    source.write_text(json.dumps(["known task", "new task"]))
+    with pytest.raises(SystemExit) as exit_info:
+        tasks4.main(["--batch", str(source), "--cache", cache_file])
+    assert exit_info.value.code == 1
+    assert "OPENAI_API_KEY not found" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("option, value", [("--concurrency", "0"), ("--rate", "0"), ("--rate", "-1"),
+                                           ("--concurrency", "many")])
+def test_concurrency_and_rate_must_be_positive(option, value, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        tasks4.parse_args(["--batch", "tasks.jsonl", option, value])
+    assert exit_info.value.code == 2
+    assert "must be a number greater than 0" in capsys.readouterr().err
+
+
+def test_malformed_items_are_reported_before_any_request(tmp_path, capsys):
+    source = tmp_path / "tasks.json"
+    source.write_text(json.dumps(["fine", {"id": 2, "title": "no description"}, 42]))
+    with pytest.raises(ValueError, match="item 1, 2 of"):
+        tasks4.read_descriptions(str(source))
+
+    with pytest.raises(SystemExit) as exit_info:
+        tasks4.main(["--batch", str(source), "--no-cache"])
+    assert exit_info.value.code == 2
+    assert "not a string or an object" in capsys.readouterr().err
@@ -0,0 +1,61 @@
+# tasks4/tests/test_cache.py
+
+import itertools
+
+import pytest
+
+import tasks4
+from tasks4 import MODEL, SYSTEM_PROMPT, SummaryCache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # A clock that ticks once per call, so "least recently used" is unambiguous
+    clock = itertools.count(1000)
+    monkeypatch.setattr(tasks4.time, "time", lambda: float(next(clock)))
+    cache = SummaryCache(str(tmp_path / "cache.db"), max_entries=3)
+    yield cache
+    cache.close()
+
+
+def test_key_depends_on_model_prompt_and_description():
+    key = SummaryCache.key("Write the report")
+    assert key == SummaryCache.key("Write the report", MODEL, SYSTEM_PROMPT)
+    assert key != SummaryCache.key("Write the report!")
+    assert key != SummaryCache.key("Write the report", model="another-model")
+    assert key != SummaryCache.key("Write the report", system_prompt=SYSTEM_PROMPT + " Be brief.")
+
+
+def test_hits_misses_and_tokens_saved(cache):
+    assert cache.get("Write the report") is None
+    cache.put("Write the report", "Write report", tokens=120)
+    cache.put("Plan the trip", "Plan trip")  # no usage reported: estimated
+    assert cache.get("Write the report") == "Write report"
+    assert cache.get("Write the report") == "Write report"
+    assert cache.get("Plan the trip") == "Plan trip"
+    assert cache.get("Plan the trip, edited") is None
+
+    estimated = tasks4.estimate_tokens(SYSTEM_PROMPT + "Plan the trip" + "Plan trip")
+    assert (cache.hits, cache.misses) == (3, 2)
+    assert cache.tokens_saved == 2 * 120 + estimated
+    assert cache.report() == f"Cache: 3/5 hits (60%), ~{240 + estimated} tokens saved"
+
+
+def test_evicts_least_recently_used_beyond_max_entries(cache):
+    for name in ("a", "b", "c"):
+        cache.put(name, name.upper(), tokens=1)
+    cache.get("a")  # "b" is now the least recently used
+    cache.put("d", "D", tokens=1)
+    assert cache.get("b") is None
+    assert [cache.get(name) for name in ("a", "c", "d")] == ["A", "C", "D"]
+    assert cache.conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0] == 3
+
+
+def test_summaries_survive_reopening(tmp_path):
+    path = str(tmp_path / "cache.db")
+    first = SummaryCache(path)
+    first.put("Write the report", "Write report", tokens=10)
+    first.close()
+    second = SummaryCache(path)
+    assert second.get("Write the report") == "Write report"
+    second.close()
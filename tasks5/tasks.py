@@ -4,55 +4,373 @@
 Usage: python tasks.py <command> [args]
 
 Commands:
-  add <description>
-  list
-  complete <id>
-  delete <id>
+  add <description> | add --from-file FILE
+  list [--limit N]
+  complete <id|range>...          e.g. complete 3 10-250
+  delete <id|range>... [--completed]
 
 Stores tasks in tasks.json at the repository root.
+
+Storage modes (--storage or the TASKS_STORAGE environment variable):
+  json     rewrite tasks.json atomically on every change (default)
+  journal  append each change to tasks.log; tasks.json is a snapshot that is
+           rewritten only when the log grows past LOG_COMPACT_BYTES
+  sqlite   tasks.db with an index on completed; an existing tasks.json is
+           imported on first use
+
+File formats for tasks.json (--format or TASKS_FORMAT; detected from the
+file header when reading, so any format loads):
+  pretty   indented JSON (default)
+  compact  JSON without whitespace
+  binary   columnar records read through mmap
+Use `convert <format>` to rewrite an existing file.
+
+Durability levels (--durability or TASKS_DURABILITY), shared with tasks2,
+tasks3 and Final (PKMS_DURABILITY):
+  strict   fsync every file written and its directory; SQLite synchronous=FULL.
+           A command that printed success survives a power loss.
+  normal   fsync files before renaming them into place (and every journal
+           append); SQLite synchronous=NORMAL. A power loss may undo the last
+           changes, but files are always either old or new, never torn (default)
+  fast     no fsync; SQLite synchronous=OFF. Safe if the program crashes; a
+           power loss can lose recent changes or corrupt tasks.json/tasks.db
+
+Ids are never reused: deleting the newest task records its id in
+tasks.meta.json so the next add continues after it.
+
+Concurrent runs are safe: saves take an advisory lock on tasks.lock and
+re-apply their change if another process saved first (see transaction).
 """
 from __future__ import annotations
 
 import argparse
+import io
 import json
+import mmap
 import os
+import re
+import sqlite3
+import struct
 import sys
 import tempfile
+from array import array
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Any
+from itertools import accumulate, islice
+from typing import List, Dict, Any, Callable, Hashable, Iterator, Optional, Tuple, TypeVar
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+T = TypeVar("T")
 
 TASKS_FILE = os.path.join(os.path.dirname(__file__), "tasks.json")
+STORAGE_MODES = ("json", "journal", "sqlite")
+STORAGE = os.environ.get("TASKS_STORAGE", "json")
+LOG_COMPACT_BYTES = 1024 * 1024
+FORMATS = ("pretty", "compact", "binary")
+# None keeps whatever format tasks.json is already in (pretty for a new file)
+FORMAT = os.environ.get("TASKS_FORMAT") or None
+DURABILITY_LEVELS = ("strict", "normal", "fast")
+DURABILITY = os.environ.get("TASKS_DURABILITY", "normal")
+SQLITE_SYNCHRONOUS = {"strict": "FULL", "normal": "NORMAL", "fast": "OFF"}
+
+# Binary snapshot: a header, then the fields stored column by column so each
+# column is read in one go. Text lengths are in characters, None is NO_TEXT.
+BINARY_MAGIC = b"TSK5"
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct("<4sB3xQQQ")  # magic, version, count, description bytes, created_at bytes
+NO_TEXT = 0xFFFFFFFF
+BINARY_ID = struct.Struct("<q")
+BINARY_LEN = struct.Struct("<I")
+STREAM_CHUNK = 64 * 1024
+
+
+def journal_path() -> str:
+    # the log lives next to the snapshot: tasks.json -> tasks.log
+    return os.path.splitext(TASKS_FILE)[0] + ".log"
+
+
+def db_path() -> str:
+    # sqlite backend: tasks.json -> tasks.db
+    return os.path.splitext(TASKS_FILE)[0] + ".db"
+
+
+def meta_path() -> str:
+    # highest id ever handed out: tasks.json -> tasks.meta.json
+    return os.path.splitext(TASKS_FILE)[0] + ".meta.json"
+
+
+def lock_path() -> str:
+    # advisory lock + version counter: tasks.json -> tasks.lock
+    return os.path.splitext(TASKS_FILE)[0] + ".lock"
+
+
+def sync_file(f: Any) -> None:
+    # flush to the OS always; to the disk unless durability is "fast"
+    f.flush()
+    if DURABILITY != "fast":
+        os.fsync(f.fileno())
+
+
+def sync_dir(path: str) -> None:
+    # strict: also persist the directory entry, so a rename or a newly
+    # created file is not lost on power failure (not possible on Windows)
+    if DURABILITY != "strict" or os.name == "nt":
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def file_lock() -> Iterator[Any]:
+    """Hold the exclusive writer lock. Yields the open lock file."""
+    with open(lock_path(), "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield f
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def read_version() -> int:
+    # bumped by every save, so a changed number means someone else wrote
+    try:
+        with open(lock_path(), "rb") as f:
+            data = f.read(8)
+    except OSError:
+        return 0
+    return struct.unpack("<Q", data)[0] if len(data) == 8 else 0
+
+
+def bump_version(lock_file: Any) -> None:
+    lock_file.seek(0)
+    data = lock_file.read(8)
+    version = struct.unpack("<Q", data)[0] if len(data) == 8 else 0
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(struct.pack("<Q", version + 1))
+    lock_file.flush()
+
+
+class TaskStore:
+    """All tasks, loaded once and indexed by id.
+
+    Lookups, adds and completes are dict operations instead of scans over the
+    list, and the next id comes from a cached high-water mark rather than a
+    max() over every task. The high-water mark is persisted (see meta_path)
+    so the id of a deleted task is never handed out again.
+
+    add/complete/delete only change memory; save() writes all of them at
+    once, so one invocation is one load and one save however many tasks it
+    touches. Use transaction() to save safely alongside other processes.
+    """
+
+    def __init__(self, tasks: List[Dict[str, Any]], last_id: int = 0) -> None:
+        # insertion-ordered, so saving keeps the file's order
+        self.tasks: Dict[Hashable, Dict[str, Any]] = {}
+        self.saved_last_id = last_id
+        self.last_id = last_id
+        self.pending: List[Dict[str, Any]] = []
+        self.version = 0
+        for pos, task in enumerate(tasks):
+            try:
+                tid = int(task.get("id"))
+            except (TypeError, ValueError):
+                # keep tasks with a bad id, just never match them
+                self.tasks[("invalid", pos)] = task
+                continue
+            self.tasks[tid] = task
+            self.last_id = max(self.last_id, tid)
+
+    @classmethod
+    def load(cls) -> "TaskStore":
+        # read the version first: a write that lands while we load only
+        # makes the version look stale, never the data look current
+        version = read_version()
+        store = cls(load_snapshot(), load_last_id())
+        store.version = version
+        # replayed in every mode, so switching back to json never loses changes
+        replay_journal(store)
+        return store
+
+    def __len__(self) -> int:
+        return len(self.tasks)
+
+    def all(self) -> List[Dict[str, Any]]:
+        return list(self.tasks.values())
+
+    def get(self, tid: int) -> Optional[Dict[str, Any]]:
+        return self.tasks.get(tid)
+
+    def insert(self, task: Dict[str, Any]) -> None:
+        tid = int(task["id"])
+        self.tasks[tid] = task
+        self.last_id = max(self.last_id, tid)
+
+    def add(self, description: str) -> Dict[str, Any]:
+        task = {
+            "id": self.last_id + 1,
+            "description": description,
+            "completed": False,
+            "created_at": datetime.utcnow().isoformat() + "Z",
+        }
+        self.insert(task)
+        self.pending.append({"op": "add", "task": task})
+        return task
+
+    def complete(self, tid: int) -> Optional[Dict[str, Any]]:
+        task = self.get(tid)
+        if task is not None and not task.get("completed"):
+            task["completed"] = True
+            self.pending.append({"op": "complete", "id": tid})
+        return task
+
+    def delete(self, tid: int) -> Optional[Dict[str, Any]]:
+        task = self.tasks.pop(tid, None)
+        if task is not None:
+            self.pending.append({"op": "delete", "id": tid})
+        return task
+
+    def completed_ids(self) -> List[int]:
+        return [tid for tid, t in self.tasks.items() if isinstance(tid, int) and t.get("completed")]
+
+    def expand(self, ranges: List[Tuple[int, int]]) -> List[int]:
+        return expand_ranges(ranges, self.last_id)
+
+    def save(self) -> None:
+        if not self.pending:
+            return
+        if self.last_id > self.saved_last_id and self.last_id not in self.tasks:
+            # the newest task is gone, so its id is no longer visible in the data
+            save_last_id(self.last_id)
+            self.saved_last_id = self.last_id
+        events, self.pending = self.pending, []
+        self.commit(events[0] if len(events) == 1 else {"op": "batch", "events": events})
+
+    def commit(self, event: Dict[str, Any]) -> None:
+        # persist one change (already applied in memory) in the active storage mode
+        if STORAGE == "journal":
+            if append_event(event) > LOG_COMPACT_BYTES:
+                compact(self.all())
+        elif os.path.exists(journal_path()):
+            # leaving journal mode: fold the old log into the snapshot
+            compact(self.all())
+        else:
+            save_tasks(self.all())
+
+
+def expand_ranges(ranges: List[Tuple[int, int]], last_id: int) -> List[int]:
+    # ids above the high-water mark cannot exist, so huge ranges stay cheap
+    ids: Dict[int, None] = {}
+    for low, high in ranges:
+        if low == high:
+            ids[low] = None
+        else:
+            ids.update(dict.fromkeys(range(low, min(high, last_id) + 1)))
+    return list(ids)
 
 
 def load_tasks() -> List[Dict[str, Any]]:
+    return TaskStore.load().all()
+
+
+def load_last_id() -> int:
+    path = meta_path()
+    if not os.path.exists(path):
+        return 0
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return int(json.load(f).get("last_id", 0))
+    except (OSError, ValueError, TypeError, AttributeError):
+        # only a lower bound; the ids in the data still count
+        return 0
+
+
+def save_last_id(last_id: int) -> None:
+    path = meta_path()
+    fd, tmp_path = tempfile.mkstemp(prefix="tasks.meta.", dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as tmpf:
+            json.dump({"last_id": last_id}, tmpf)
+            sync_file(tmpf)
+        os.replace(tmp_path, path)
+        sync_dir(path)
+    except OSError as e:
+        print(f"Error writing {path}: {e}", file=sys.stderr)
+        try:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        except Exception:
+            pass
+        sys.exit(4)
+
+
+def detect_format(path: str) -> Optional[str]:
+    try:
+        with open(path, "rb") as f:
+            head = f.read(len(BINARY_MAGIC))
+    except OSError:
+        return None
+    if head == BINARY_MAGIC:
+        return "binary"
+    if head.strip() == b"[]":
+        return None  # an empty list reads the same in both: keep the configured format
+    # json.dump(indent=...) always starts with "[\n" for a non-empty list
+    return "pretty" if head[:2] == b"[\n" else "compact"
+
+
+def load_snapshot() -> List[Dict[str, Any]]:
     if not os.path.exists(TASKS_FILE):
         return []
     try:
-        with open(TASKS_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        with open(TASKS_FILE, "rb") as f:
+            if f.read(len(BINARY_MAGIC)) == BINARY_MAGIC:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                    return decode_binary(buf)
+            f.seek(0)
+            data = json.loads(f.read())
         if not isinstance(data, list):
             print(f"Error: {TASKS_FILE} does not contain a JSON array.", file=sys.stderr)
             sys.exit(4)
         return data
-    except json.JSONDecodeError:
+    except (json.JSONDecodeError, UnicodeDecodeError):
         print(f"Error: {TASKS_FILE} contains invalid JSON. Fix or remove the file.", file=sys.stderr)
         sys.exit(4)
+    except (struct.error, ValueError) as e:
+        print(f"Error: {TASKS_FILE} is not a valid binary task file ({e}).", file=sys.stderr)
+        sys.exit(4)
     except OSError as e:
         print(f"Error reading {TASKS_FILE}: {e}", file=sys.stderr)
         sys.exit(4)
 
 
-def save_tasks(tasks: List[Dict[str, Any]]) -> None:
+def save_tasks(tasks: List[Dict[str, Any]], fmt: Optional[str] = None) -> None:
+    fmt = fmt or FORMAT or detect_format(TASKS_FILE) or "pretty"
     # atomic write: write to temp file then replace
     dirpath = os.path.dirname(TASKS_FILE) or "."
     fd, tmp_path = tempfile.mkstemp(prefix="tasks.json.", dir=dirpath)
     try:
-        with os.fdopen(fd, "w", encoding="utf-8") as tmpf:
-            json.dump(tasks, tmpf, indent=2, ensure_ascii=False)
-            tmpf.flush()
-            os.fsync(tmpf.fileno())
+        with os.fdopen(fd, "wb") as tmpf:
+            tmpf.write(encode_tasks(tasks, fmt))
+            sync_file(tmpf)
         os.replace(tmp_path, TASKS_FILE)
-    except OSError as e:
+        sync_dir(TASKS_FILE)
+    except (OSError, ValueError, TypeError) as e:
         print(f"Error writing {TASKS_FILE}: {e}", file=sys.stderr)
         # best-effort cleanup
         try:
@@ -63,117 +381,672 @@ def save_tasks(tasks: List[Dict[str, Any]]) -> None:
         sys.exit(4)
 
 
-def next_id(tasks: List[Dict[str, Any]]) -> int:
-    if not tasks:
-        return 1
+def encode_tasks(tasks: List[Dict[str, Any]], fmt: str) -> bytes:
+    if fmt == "binary":
+        return encode_binary(tasks)
+    if fmt == "compact":
+        return json.dumps(tasks, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return json.dumps(tasks, indent=2, ensure_ascii=False).encode("utf-8")
+
+
+def text_column(values: List[Optional[str]]) -> Tuple[array, bytes]:
+    lengths = array("I", (NO_TEXT if v is None else len(v) for v in values))
+    return lengths, "".join(v for v in values if v is not None).encode("utf-8")
+
+
+def encode_binary(tasks: List[Dict[str, Any]]) -> bytes:
+    ids = array("q", (int(t["id"]) for t in tasks))  # ValueError for a task without an integer id
+    done = bytes(1 if t.get("completed") else 0 for t in tasks)
+    desc_lens, descs = text_column([str(t.get("description", "")) for t in tasks])
+    created_lens, created = text_column([t.get("created_at") for t in tasks])
+    columns = [ids, desc_lens, created_lens]
+    if sys.byteorder == "big":
+        for column in columns:
+            column.byteswap()
+    header = BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(tasks), len(descs), len(created))
+    return b"".join([header, ids.tobytes(), done, desc_lens.tobytes(), created_lens.tobytes(), descs, created])
+
+
+def decode_binary(buf: Any) -> List[Dict[str, Any]]:
+    magic, version, count, desc_size, created_size = BINARY_HEADER.unpack_from(buf, 0)
+    if version != BINARY_VERSION:
+        raise ValueError(f"unsupported version {version}")
+    pos = BINARY_HEADER.size
+
+    def column(typecode: str) -> array:
+        nonlocal pos
+        values = array(typecode)
+        values.frombytes(buf[pos:pos + values.itemsize * count])
+        if sys.byteorder == "big":
+            values.byteswap()
+        pos += values.itemsize * count
+        return values
+
+    ids = column("q")
+    done = buf[pos:pos + count]
+    pos += count
+    desc_lens = column("I")
+    created_lens = column("I")
+    descs = str(buf[pos:pos + desc_size], "utf-8")
+    created = str(buf[pos + desc_size:pos + desc_size + created_size], "utf-8")
+
+    descriptions = split_text(descs, desc_lens)
+    created_ats = split_text(created, created_lens)
+    return [{"id": tid, "description": desc, "completed": completed == 1, "created_at": created_at}
+            for tid, desc, completed, created_at in zip(ids, descriptions, done, created_ats)]
+
+
+def split_text(text: str, lengths: array) -> List[Optional[str]]:
+    if NO_TEXT not in lengths:
+        ends = list(accumulate(lengths))
+        return [text[start:end] for start, end in zip([0] + ends[:-1], ends)]
+    values: List[Optional[str]] = []
+    pos = 0
+    for length in lengths:
+        if length == NO_TEXT:
+            values.append(None)
+        else:
+            values.append(text[pos:pos + length])
+            pos += length
+    return values
+
+
+# --- Streaming reads: one record in memory at a time ---
+
+def iter_snapshot() -> Iterator[Dict[str, Any]]:
+    """Yield the tasks in tasks.json one by one without loading the whole file."""
+    if not os.path.exists(TASKS_FILE):
+        return
+    try:
+        with open(TASKS_FILE, "rb") as f:
+            if f.read(len(BINARY_MAGIC)) == BINARY_MAGIC:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                    yield from iter_binary(buf)
+                return
+            f.seek(0)
+            yield from iter_json_array(io.TextIOWrapper(f, encoding="utf-8"))
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        print(f"Error: {TASKS_FILE} contains invalid JSON. Fix or remove the file.", file=sys.stderr)
+        sys.exit(4)
+    except (struct.error, ValueError) as e:
+        print(f"Error: {TASKS_FILE} is not a valid task file ({e}).", file=sys.stderr)
+        sys.exit(4)
+    except OSError as e:
+        print(f"Error reading {TASKS_FILE}: {e}", file=sys.stderr)
+        sys.exit(4)
+
+
+WHITESPACE = re.compile(r"\s*")
+
+
+def iter_json_array(f: io.TextIOBase, chunk_size: int = STREAM_CHUNK) -> Iterator[Any]:
+    # Decode one element at a time with raw_decode, reading another chunk
+    # whenever the buffer ends mid-element. The buffer holds one chunk plus
+    # at most one partial element.
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+
+    def fill() -> None:
+        nonlocal buf, pos, eof
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buf, pos = buf[pos:] + chunk, 0
+
+    def next_char() -> str:
+        nonlocal pos
+        while True:
+            pos = WHITESPACE.match(buf, pos).end()
+            if pos < len(buf) or eof:
+                return buf[pos:pos + 1]
+            fill()
+
+    if next_char() != "[":
+        raise ValueError("does not contain a JSON array")
+    pos += 1
+    if next_char() == "]":
+        return
+    while True:
+        next_char()  # raw_decode does not skip leading whitespace
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                if end < len(buf) or eof:
+                    break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            fill()
+        pos = end
+        yield value
+        sep = next_char()
+        pos += 1
+        if sep == "]":
+            return
+        if sep != ",":
+            raise ValueError("expected ',' or ']' between tasks")
+
+
+def iter_binary(buf: Any) -> Iterator[Dict[str, Any]]:
+    # Same layout as decode_binary, but each record is unpacked straight from
+    # the mmap as it is needed instead of materializing whole columns.
+    magic, version, count, desc_size, created_size = BINARY_HEADER.unpack_from(buf, 0)
+    if version != BINARY_VERSION:
+        raise ValueError(f"unsupported version {version}")
+    ids_at = BINARY_HEADER.size
+    done_at = ids_at + BINARY_ID.size * count
+    desc_lens_at = done_at + count
+    created_lens_at = desc_lens_at + BINARY_LEN.size * count
+    d = created_lens_at + BINARY_LEN.size * count
+    c = d + desc_size
+    for i in range(count):
+        dlen = BINARY_LEN.unpack_from(buf, desc_lens_at + BINARY_LEN.size * i)[0]
+        clen = BINARY_LEN.unpack_from(buf, created_lens_at + BINARY_LEN.size * i)[0]
+        description, d = read_text(buf, d, dlen)
+        created_at = None
+        if clen != NO_TEXT:
+            created_at, c = read_text(buf, c, clen)
+        yield {"id": BINARY_ID.unpack_from(buf, ids_at + BINARY_ID.size * i)[0], "description": description,
+               "completed": buf[done_at + i] == 1, "created_at": created_at}
+
+
+def read_text(buf: Any, pos: int, length: int) -> Tuple[str, int]:
+    # lengths are in characters: decode `length` of them starting at byte pos
+    raw = buf[pos:pos + length]
+    if raw.isascii():
+        return raw.decode("ascii"), pos + length
+    # a UTF-8 character is at most 4 bytes; "ignore" drops a character cut off at the end
+    text = buf[pos:pos + 4 * length].decode("utf-8", "ignore")[:length]
+    return text, pos + len(text.encode("utf-8"))
+
+
+def apply_event(store: TaskStore, event: Dict[str, Any]) -> None:
+    # Events are idempotent, so replaying a log over a snapshot that already
+    # contains some of them (crash during compaction) gives the same state.
+    op = event.get("op")
+    if op == "add":
+        task = event["task"]
+        if store.get(int(task["id"])) is None:
+            store.insert(task)
+    elif op == "complete":
+        task = store.get(int(event["id"]))
+        if task is not None:
+            task["completed"] = True
+    elif op == "delete":
+        store.tasks.pop(int(event["id"]), None)
+    elif op == "batch":
+        # one line, so a torn write drops the whole batch rather than part of it
+        for inner in event["events"]:
+            apply_event(store, inner)
+
+
+def replay_journal(store: TaskStore, apply: Optional[Callable[[Dict[str, Any]], None]] = None) -> None:
+    path = journal_path()
+    if not os.path.exists(path):
+        return
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    # torn line from an interrupted append: that change never happened
+                    continue
+                if apply is None:
+                    apply_event(store, event)
+                else:
+                    apply(event)
+    except OSError as e:
+        print(f"Error reading {path}: {e}", file=sys.stderr)
+        sys.exit(4)
+
+
+def iter_tasks() -> Iterator[Dict[str, Any]]:
+    """Yield the current tasks (snapshot plus journal) without loading the snapshot.
+
+    The journal is small (compacted at LOG_COMPACT_BYTES), so it is read into
+    memory and applied to each snapshot record as it streams past.
+    """
+    store = TaskStore([])
+    deleted = set()
+    completed = set()
+
+    def note(event: Dict[str, Any]) -> None:
+        op = event.get("op")
+        if op == "batch":
+            for inner in event["events"]:
+                note(inner)
+        elif op == "delete":
+            deleted.add(int(event["id"]))
+        elif op == "complete":
+            completed.add(int(event["id"]))
+        apply_event(store, event)
+
+    replay_journal(store, note)
+    for task in iter_snapshot():
+        try:
+            tid = int(task.get("id"))
+        except (TypeError, ValueError):
+            yield task
+            continue
+        if tid in deleted:
+            continue
+        if tid in completed:
+            task["completed"] = True
+        # the log may repeat adds already folded into the snapshot
+        store.tasks.pop(tid, None)
+        yield task
+    yield from store.tasks.values()
+
+
+def append_event(event: Dict[str, Any]) -> int:
+    # O(1) bytes written per change: one JSON line, fsynced unless durability
+    # is "fast". Returns the log size.
+    path = journal_path()
+    line = (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+    try:
+        with open(path, "ab+") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size:
+                # start on a fresh line if an earlier append was cut short
+                f.seek(size - 1)
+                if f.read(1) != b"\n":
+                    line = b"\n" + line
+            f.write(line)
+            sync_file(f)
+        if not size:
+            sync_dir(path)
+        size += len(line)
+    except OSError as e:
+        print(f"Error writing {path}: {e}", file=sys.stderr)
+        sys.exit(4)
+    return size
+
+
+def compact(tasks: List[Dict[str, Any]], fmt: Optional[str] = None) -> None:
+    # Snapshot first (atomic replace), then drop the log. A crash in between
+    # only means the log is replayed once more over the new snapshot.
+    save_tasks(tasks, fmt)
+    path = journal_path()
+    try:
+        if STORAGE == "journal":
+            with open(path, "w", encoding="utf-8") as f:
+                sync_file(f)
+        else:
+            os.remove(path)
+            sync_dir(path)
+    except OSError as e:
+        print(f"Error writing {path}: {e}", file=sys.stderr)
+        sys.exit(4)
+
+
+def transaction(change: Callable[[TaskStore], T]) -> T:
+    """Apply change() to the tasks and save it without losing concurrent updates.
+
+    Loading and applying happen without the lock (optimistic). The save takes
+    the lock and checks the version: if another process saved in between,
+    change() is run again on a fresh load so both sets of changes survive.
+    Changes that no longer apply (completing a task someone just deleted)
+    show up as "not found" like they would have sequentially.
+    """
+    store = TaskStore.load()
+    result = change(store)
+    if not store.pending:
+        return result
+    with file_lock() as lock_file:
+        if read_version() != store.version:
+            store = TaskStore.load()
+            result = change(store)
+        store.save()
+        bump_version(lock_file)
+    return result
+
+
+# --- Backends ---
+#
+# A backend runs changes (transaction) and lists incomplete tasks. Changes
+# see a store with get/add/complete/delete/expand/completed_ids, so the
+# commands below work the same on every backend.
+
+class JSONBackend:
+    """tasks.json, plus tasks.log in journal mode, loaded into a TaskStore."""
+
+    def transaction(self, change: Callable[[TaskStore], T]) -> T:
+        return transaction(change)
+
+    def incomplete(self) -> Iterator[Dict[str, Any]]:
+        # streamed: completed tasks are parsed and dropped one at a time
+        return (t for t in iter_tasks() if not t.get("completed"))
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteStore:
+    """The TaskStore operations as queries, run inside a SQLiteBackend transaction."""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+
+    @property
+    def last_id(self) -> int:
+        # AUTOINCREMENT keeps the high-water mark, so ids are never reused
+        row = self.conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'tasks'").fetchone()
+        return row[0] if row else 0
+
+    def get(self, tid: int) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute("SELECT id, description, completed, created_at FROM tasks WHERE id = ?",
+                                (tid,)).fetchone()
+        return row_to_task(row) if row else None
+
+    def add(self, description: str) -> Dict[str, Any]:
+        created_at = datetime.utcnow().isoformat() + "Z"
+        cur = self.conn.execute("INSERT INTO tasks (description, completed, created_at) VALUES (?, 0, ?)",
+                                (description, created_at))
+        return {"id": cur.lastrowid, "description": description, "completed": False, "created_at": created_at}
+
+    def complete(self, tid: int) -> Optional[Dict[str, Any]]:
+        self.conn.execute("UPDATE tasks SET completed = 1 WHERE id = ?", (tid,))
+        return self.get(tid)
+
+    def delete(self, tid: int) -> Optional[Dict[str, Any]]:
+        task = self.get(tid)
+        if task is not None:
+            self.conn.execute("DELETE FROM tasks WHERE id = ?", (tid,))
+        return task
+
+    def expand(self, ranges: List[Tuple[int, int]]) -> List[int]:
+        return expand_ranges(ranges, self.last_id)
+
+    def completed_ids(self) -> List[int]:
+        return [row[0] for row in self.conn.execute("SELECT id FROM tasks WHERE completed = 1 ORDER BY id")]
+
+
+def row_to_task(row: Tuple[Any, ...]) -> Dict[str, Any]:
+    return {"id": row[0], "description": row[1], "completed": bool(row[2]), "created_at": row[3]}
+
+
+class SQLiteBackend:
+    """tasks.db. An existing tasks.json (and tasks.log) is imported on first use."""
+
+    SCHEMA_VERSION = 1
+
+    def __init__(self, path: str) -> None:
+        try:
+            self.conn = sqlite3.connect(path, isolation_level=None, timeout=30)
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute("PRAGMA busy_timeout = 30000")
+            self.conn.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS[DURABILITY]}")
+            if self.conn.execute("PRAGMA user_version").fetchone()[0] < self.SCHEMA_VERSION:
+                self.transaction(lambda store: self.migrate())
+        except sqlite3.Error as e:
+            print(f"Error opening {path}: {e}", file=sys.stderr)
+            sys.exit(4)
+
+    def migrate(self) -> None:
+        # re-checked inside the write lock: another process may have won the race
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] >= self.SCHEMA_VERSION:
+            return
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS tasks (
+                                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                 description TEXT NOT NULL,
+                                 completed INTEGER NOT NULL DEFAULT 0,
+                                 created_at TEXT
+                             )""")
+        # `list` reads only the completed = 0 part of this index
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_completed ON tasks (completed, id)")
+        if os.path.exists(TASKS_FILE) or os.path.exists(journal_path()):
+            json_store = TaskStore.load()
+            rows = []
+            for key, task in json_store.tasks.items():
+                rows.append((key if isinstance(key, int) else None, str(task.get("description", "")),
+                             1 if task.get("completed") else 0, task.get("created_at")))
+            self.conn.executemany("INSERT INTO tasks (id, description, completed, created_at) VALUES (?, ?, ?, ?)",
+                                  rows)
+            # carry over ids used by tasks deleted before the switch
+            last_id = max(SQLiteStore(self.conn).last_id, json_store.last_id)
+            if last_id:
+                self.conn.execute("DELETE FROM sqlite_sequence WHERE name = 'tasks'")
+                self.conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('tasks', ?)", (last_id,))
+            if rows:
+                print(f"Imported {len(rows)} tasks from {TASKS_FILE} into {db_path()}.", file=sys.stderr)
+        self.conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    def transaction(self, change: Callable[[SQLiteStore], T]) -> T:
+        # IMMEDIATE takes the write lock up front, so concurrent writers queue
+        # (busy_timeout) instead of failing halfway through
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = change(SQLiteStore(self.conn))
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+        return result
+
+    def incomplete(self) -> Iterator[Dict[str, Any]]:
+        cur = self.conn.execute("SELECT id, description, completed, created_at FROM tasks "
+                                "WHERE completed = 0 ORDER BY id")
+        return (row_to_task(row) for row in cur)
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+@contextmanager
+def open_backend() -> Iterator[Any]:
+    backend = SQLiteBackend(db_path()) if STORAGE == "sqlite" else JSONBackend()
     try:
-        return max(int(t.get("id", 0)) for t in tasks) + 1
-    except Exception:
-        # fallback
-        return len(tasks) + 1
+        yield backend
+    finally:
+        backend.close()
 
 
 def add_task(description: str) -> Dict[str, Any]:
-    desc = description.strip()
-    if not desc:
+    return add_tasks([description])[0]
+
+
+def add_tasks(descriptions: List[str]) -> List[Dict[str, Any]]:
+    descs = [d.strip() for d in descriptions]
+    if not descs or not all(descs):
         print("Error: description cannot be empty.", file=sys.stderr)
         sys.exit(2)
-    tasks = load_tasks()
-    tid = next_id(tasks)
-    task = {
-        "id": tid,
-        "description": desc,
-        "completed": False,
-        "created_at": datetime.utcnow().isoformat() + "Z",
-    }
-    tasks.append(task)
-    save_tasks(tasks)
-    print(f"Added task {tid}: {desc}")
-    return task
-
-
-def list_tasks() -> None:
-    tasks = load_tasks()
-    incomplete = [t for t in tasks if not t.get("completed")]
-    if not incomplete:
+    with open_backend() as backend:
+        added = backend.transaction(lambda store: [store.add(desc) for desc in descs])
+    if len(added) == 1:
+        print(f"Added task {added[0]['id']}: {descs[0]}")
+    else:
+        print(f"Added {len(added)} tasks ({added[0]['id']}-{added[-1]['id']}).")
+    return added
+
+
+def read_descriptions(path: str) -> List[str]:
+    # one description per line; blank lines are skipped
+    try:
+        if path == "-":
+            lines = sys.stdin.read().splitlines()
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+    except OSError as e:
+        print(f"Error reading {path}: {e}", file=sys.stderr)
+        sys.exit(4)
+    return [line.strip() for line in lines if line.strip()]
+
+
+def list_tasks(limit: Optional[int] = None) -> None:
+    shown = 0
+    with open_backend() as backend:
+        # islice stops reading the file (or the query) after `limit` tasks
+        for t in islice(backend.incomplete(), limit):
+            print(f"{t.get('id')}. {t.get('description')}")
+            shown += 1
+    if not shown:
         print("No incomplete tasks.")
-        return
-    for t in incomplete:
-        print(f"{t.get('id')}. {t.get('description')}")
 
 
-def find_task(tasks: List[Dict[str, Any]], tid: int) -> Dict[str, Any] | None:
-    for t in tasks:
+def convert(fmt: str) -> None:
+    if STORAGE == "sqlite":
+        print("Error: convert rewrites tasks.json; it does not apply to sqlite storage.", file=sys.stderr)
+        sys.exit(2)
+    before = os.path.getsize(TASKS_FILE) if os.path.exists(TASKS_FILE) else 0
+    with file_lock() as lock_file:
+        tasks = load_tasks()
+        if os.path.exists(journal_path()):
+            # the snapshot now holds everything, so the log can start over
+            compact(tasks, fmt)
+        else:
+            save_tasks(tasks, fmt)
+        bump_version(lock_file)
+    print(f"Converted {len(tasks)} tasks to {fmt} ({before} -> {os.path.getsize(TASKS_FILE)} bytes).")
+
+
+def parse_targets(values: List[str]) -> List[Tuple[int, int]]:
+    """Turn ids and ranges such as ["3", "10-250"] into inclusive (low, high) pairs."""
+    ranges = []
+    for value in values:
+        low, sep, high = value.partition("-")
         try:
-            if int(t.get("id")) == tid:
-                return t
-        except Exception:
-            continue
-    return None
+            ranges.append((int(low), int(high) if sep else int(low)))
+        except ValueError:
+            print("Error: id must be an integer or a range like 10-250.", file=sys.stderr)
+            sys.exit(2)
+        if ranges[-1][0] > ranges[-1][1]:
+            print(f"Error: empty range '{value}'.", file=sys.stderr)
+            sys.exit(2)
+    return ranges
+
+
+def report(verb: str, affected: List[int], requested: int) -> None:
+    missing = requested - len(affected)
+    if not affected:
+        print("Error: no matching tasks found.", file=sys.stderr)
+        sys.exit(3)
+    note = f" ({missing} not found)" if missing else ""
+    print(f"{verb} {len(affected)} task{'s' if len(affected) != 1 else ''}{note}.")
 
 
 def complete_task(tid: int) -> None:
-    tasks = load_tasks()
-    task = find_task(tasks, tid)
+    with open_backend() as backend:
+        task = backend.transaction(lambda store: store.complete(tid))
     if task is None:
         print(f"Error: task {tid} not found.", file=sys.stderr)
         sys.exit(3)
-    task["completed"] = True
-    save_tasks(tasks)
     print(f"Task {tid} marked completed.")
 
 
+def complete_tasks(ranges: List[Tuple[int, int]]) -> int:
+    def change(store: Any) -> Tuple[List[int], List[int]]:
+        ids = store.expand(ranges)
+        return ids, [tid for tid in ids if store.complete(tid) is not None]
+
+    with open_backend() as backend:
+        ids, affected = backend.transaction(change)
+    report("Completed", affected, len(ids))
+    return len(affected)
+
+
 def delete_task(tid: int) -> None:
-    tasks = load_tasks()
-    task = find_task(tasks, tid)
+    with open_backend() as backend:
+        task = backend.transaction(lambda store: store.delete(tid))
     if task is None:
         print(f"Error: task {tid} not found.", file=sys.stderr)
         sys.exit(3)
-    tasks = [t for t in tasks if not (int(t.get("id", -1)) == tid)]
-    save_tasks(tasks)
     print(f"Task {tid} deleted.")
 
 
+def delete_tasks(ranges: List[Tuple[int, int]], completed: bool = False) -> int:
+    def change(store: Any) -> Tuple[List[int], List[int]]:
+        ids = store.expand(ranges)
+        if completed:
+            ids = list(dict.fromkeys(ids + store.completed_ids()))
+        return ids, [tid for tid in ids if store.delete(tid) is not None]
+
+    with open_backend() as backend:
+        ids, affected = backend.transaction(change)
+    report("Deleted", affected, len(ids))
+    return len(affected)
+
+
 def parse_args(argv: List[str]) -> argparse.Namespace:
     parser = argparse.ArgumentParser(prog="tasks.py", description="Simple CLI Task Manager")
+    parser.add_argument("--storage", choices=STORAGE_MODES,
+                        help="Storage mode (default: $TASKS_STORAGE or json)")
+    parser.add_argument("--format", choices=FORMATS,
+                        help="File format for tasks.json (default: $TASKS_FORMAT, else keep the file's format)")
+    parser.add_argument("--durability", choices=DURABILITY_LEVELS,
+                        help="fsync policy: strict, normal or fast (default: $TASKS_DURABILITY or normal)")
     sub = parser.add_subparsers(dest="command")
 
     p_add = sub.add_parser("add", help="Add a new task")
-    p_add.add_argument("description", nargs="+", help="Task description")
+    p_add.add_argument("description", nargs="*", help="Task description")
+    p_add.add_argument("--from-file", metavar="FILE",
+                       help="Add one task per line of FILE ('-' for stdin)")
 
-    sub.add_parser("list", help="List incomplete tasks")
+    p_list = sub.add_parser("list", help="List incomplete tasks")
+    p_list.add_argument("--limit", type=int, metavar="N", help="Show at most N tasks (stops reading early)")
 
     p_complete = sub.add_parser("complete", help="Mark task completed")
-    p_complete.add_argument("id", help="Task id to mark complete")
+    p_complete.add_argument("id", nargs="+", help="Task ids or ranges (e.g. 3 10-250) to mark complete")
 
     p_delete = sub.add_parser("delete", help="Delete a task")
-    p_delete.add_argument("id", help="Task id to delete")
+    p_delete.add_argument("id", nargs="*", help="Task ids or ranges (e.g. 3 10-250) to delete")
+    p_delete.add_argument("--completed", action="store_true", help="Delete every completed task")
+
+    p_convert = sub.add_parser("convert", help="Rewrite tasks.json in another format")
+    p_convert.add_argument("format", choices=FORMATS, help="Target format")
 
     return parser.parse_args(argv)
 
 
 def main(argv: List[str]) -> None:
+    global STORAGE, FORMAT, DURABILITY
     args = parse_args(argv)
+    if args.storage:
+        STORAGE = args.storage
+    if args.format:
+        FORMAT = args.format
+    if args.durability:
+        DURABILITY = args.durability
+    if FORMAT is not None and FORMAT not in FORMATS:
+        print(f"Error: unknown format '{FORMAT}'. Use one of: {', '.join(FORMATS)}.", file=sys.stderr)
+        sys.exit(2)
+    if DURABILITY not in DURABILITY_LEVELS:
+        print(f"Error: unknown durability '{DURABILITY}'. Use one of: {', '.join(DURABILITY_LEVELS)}.",
+              file=sys.stderr)
+        sys.exit(2)
+    if STORAGE not in STORAGE_MODES:
+        print(f"Error: unknown storage mode '{STORAGE}'. Use one of: {', '.join(STORAGE_MODES)}.", file=sys.stderr)
+        sys.exit(2)
     cmd = args.command
     if cmd == "add":
-        description = " ".join(args.description)
-        add_task(description)
+        descriptions = [" ".join(args.description)] if args.description else []
+        if args.from_file:
+            descriptions += read_descriptions(args.from_file)
+        add_tasks(descriptions)
     elif cmd == "list":
-        list_tasks()
-    elif cmd == "complete":
-        try:
-            tid = int(args.id)
-        except ValueError:
-            print("Error: id must be an integer.", file=sys.stderr)
+        if args.limit is not None and args.limit < 0:
+            print("Error: --limit must be 0 or more.", file=sys.stderr)
             sys.exit(2)
-        complete_task(tid)
+        list_tasks(args.limit)
+    elif cmd == "complete":
+        ranges = parse_targets(args.id)
+        if len(ranges) == 1 and ranges[0][0] == ranges[0][1]:
+            complete_task(ranges[0][0])
+        else:
+            complete_tasks(ranges)
     elif cmd == "delete":
-        try:
-            tid = int(args.id)
-        except ValueError:
-            print("Error: id must be an integer.", file=sys.stderr)
+        ranges = parse_targets(args.id)
+        if not ranges and not args.completed:
+            print("Error: give task ids, ranges or --completed.", file=sys.stderr)
             sys.exit(2)
-        delete_task(tid)
+        if len(ranges) == 1 and ranges[0][0] == ranges[0][1] and not args.completed:
+            delete_task(ranges[0][0])
+        else:
+            delete_tasks(ranges, args.completed)
+    elif cmd == "convert":
+        convert(args.format)
     else:
         print("No command provided. Use add/list/complete/delete.")
         sys.exit(2)
@@ -1,11 +1,16 @@
 import io
 import json
 import os
+import sqlite3
+import subprocess
 import sys
 import tempfile
+import time
+import tracemalloc
 import unittest
 from contextlib import redirect_stdout
 from pathlib import Path
+from unittest import mock
 
 # Ensure repo root is on sys.path so `import tasks` works when running tests
 repo_root = str(Path(__file__).resolve().parents[1])
@@ -21,6 +26,7 @@ class TestTasksCLI(unittest.TestCase):
         self.tmpdir = tempfile.TemporaryDirectory()
         self.tasks_file = os.path.join(self.tmpdir.name, "tasks.json")
         tasks.TASKS_FILE = self.tasks_file
+        tasks.STORAGE = "json"
 
     def tearDown(self) -> None:
         self.tmpdir.cleanup()
@@ -75,6 +81,454 @@ class TestTasksCLI(unittest.TestCase):
         data = self.read_tasks_file()
         self.assertEqual(data, [])
 
+    def test_ids_not_reused_after_delete(self):
+        with redirect_stdout(io.StringIO()):
+            tasks.add_task("First")
+            tasks.add_task("Second")
+            tasks.delete_task(2)
+            added = tasks.add_task("Third")
+        # 2 was handed out once already, even though no task has it any more
+        self.assertEqual(added["id"], 3)
+        with redirect_stdout(io.StringIO()):
+            tasks.delete_task(1)
+            tasks.delete_task(3)
+            added = tasks.add_task("Fourth")
+        self.assertEqual(added["id"], 4)
+
+
+class TestMultiTarget(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        tasks.TASKS_FILE = os.path.join(self.tmpdir.name, "tasks.json")
+        tasks.STORAGE = "json"
+        with redirect_stdout(io.StringIO()):
+            tasks.add_tasks([f"Task {i}" for i in range(1, 301)])
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def run_main(self, *argv):
+        buf = io.StringIO()
+        with redirect_stdout(buf), mock.patch.object(tasks, "save_tasks", wraps=tasks.save_tasks) as save:
+            tasks.main(list(argv))
+        return buf.getvalue().strip(), save.call_count
+
+    def test_complete_range_is_one_save(self):
+        out, saves = self.run_main("complete", "10-250", "300")
+        self.assertEqual(out, "Completed 242 tasks.")
+        self.assertEqual(saves, 1)
+        done = [t["id"] for t in tasks.load_tasks() if t["completed"]]
+        self.assertEqual(done, list(range(10, 251)) + [300])
+
+    def test_delete_completed_and_ids(self):
+        self.run_main("complete", "1-5")
+        out, saves = self.run_main("delete", "--completed", "7", "400")
+        self.assertEqual(out, "Deleted 6 tasks (1 not found).")
+        self.assertEqual(saves, 1)
+        self.assertEqual([t["id"] for t in tasks.load_tasks()][:3], [6, 8, 9])
+
+    def test_add_from_file(self):
+        path = os.path.join(self.tmpdir.name, "todo.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("Buy milk\n\nCall mom\n")
+        out, saves = self.run_main("add", "--from-file", path)
+        self.assertEqual(out, "Added 2 tasks (301-302).")
+        self.assertEqual(saves, 1)
+        self.assertEqual([t["description"] for t in tasks.load_tasks()[-2:]], ["Buy milk", "Call mom"])
+
+    def test_journal_batch_is_one_line(self):
+        tasks.STORAGE = "journal"
+        try:
+            self.run_main("complete", "1-100")
+        finally:
+            tasks.STORAGE = "json"
+        with open(os.path.join(self.tmpdir.name, "tasks.log"), "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(len(json.loads(lines[0])["events"]), 100)
+        self.assertEqual(sum(t["completed"] for t in tasks.load_tasks()), 100)
+
+
+class TestTaskStore(unittest.TestCase):
+    def make_store(self, n):
+        return tasks.TaskStore([{"id": i, "description": f"Task {i}", "completed": False}
+                                for i in range(1, n + 1)])
+
+    def time_lookups(self, store, n, rounds=20000):
+        ids = [1 + (i * 7919) % n for i in range(rounds)]
+        started = time.perf_counter()
+        for tid in ids:
+            store.get(tid)
+        return time.perf_counter() - started
+
+    def test_lookups_are_constant_time(self):
+        small = self.make_store(1000)
+        large = self.make_store(1_000_000)
+        self.assertEqual(large.last_id, 1_000_000)
+        self.assertEqual(large.get(999_999)["description"], "Task 999999")
+        self.assertIsNone(large.get(1_000_001))
+
+        # best of a few runs to ride out scheduler noise
+        t_small = min(self.time_lookups(small, 1000) for _ in range(3))
+        t_large = min(self.time_lookups(large, 1_000_000) for _ in range(3))
+        # a scan would be ~1000x slower; a dict only pays a little for cache misses
+        self.assertLess(t_large, t_small * 20 + 0.01)
+
+    def test_bad_ids_are_kept_but_never_matched(self):
+        store = tasks.TaskStore([{"id": "x", "description": "odd"}, {"id": 4, "description": "ok"}])
+        self.assertEqual(store.last_id, 4)
+        self.assertEqual([t["description"] for t in store.all()], ["odd", "ok"])
+        self.assertIsNone(store.get("x"))
+
+
+WORKER = """
+import io, sys
+from contextlib import redirect_stdout
+sys.path.insert(0, sys.argv[1])
+import tasks
+tasks.TASKS_FILE, tasks.STORAGE = sys.argv[2], sys.argv[3]
+name, count = sys.argv[4], int(sys.argv[5])
+with redirect_stdout(io.StringIO()):
+    for i in range(count):
+        task = tasks.add_task(f"{name}-{i}")
+        if i % 2:
+            tasks.complete_task(task["id"])
+"""
+
+
+class TestConcurrentWriters(unittest.TestCase):
+    PROCESSES = 8
+    OPS_PER_PROCESS = 30
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.tasks_file = os.path.join(self.tmpdir.name, "tasks.json")
+
+    def tearDown(self) -> None:
+        tasks.STORAGE = "json"
+        self.tmpdir.cleanup()
+
+    def stress(self, storage):
+        started = time.perf_counter()
+        procs = [subprocess.Popen([sys.executable, "-c", WORKER, repo_root, self.tasks_file, storage,
+                                   f"p{n}", str(self.OPS_PER_PROCESS)])
+                 for n in range(self.PROCESSES)]
+        for proc in procs:
+            self.assertEqual(proc.wait(timeout=120), 0)
+        elapsed = time.perf_counter() - started
+
+        tasks.TASKS_FILE, tasks.STORAGE = self.tasks_file, storage
+        if storage == "sqlite":
+            conn = sqlite3.connect(tasks.db_path())
+            state = [{"id": r[0], "description": r[1], "completed": bool(r[2])}
+                     for r in conn.execute("SELECT id, description, completed FROM tasks")]
+            conn.close()
+        else:
+            state = tasks.load_tasks()
+        expected = {f"p{n}-{i}": bool(i % 2) for n in range(self.PROCESSES)
+                    for i in range(self.OPS_PER_PROCESS)}
+        found = {t["description"]: t["completed"] for t in state}
+        lost = sum(1 for desc, done in expected.items() if found.get(desc) != done)
+        ops = self.PROCESSES * (self.OPS_PER_PROCESS + self.OPS_PER_PROCESS // 2)
+        print(f"\n{storage}: {self.PROCESSES} writers, {ops / elapsed:.0f} ops/s, {lost} lost updates",
+              file=sys.stderr)
+
+        self.assertEqual(lost, 0)
+        self.assertEqual(len(state), len(expected))
+        self.assertEqual(sorted(t["id"] for t in state), list(range(1, len(expected) + 1)))
+
+    def test_parallel_writers_json(self):
+        self.stress("json")
+
+    def test_parallel_writers_journal(self):
+        self.stress("journal")
+
+    def test_parallel_writers_sqlite(self):
+        self.stress("sqlite")
+
+
+class TestSQLiteStorage(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.tasks_file = os.path.join(self.tmpdir.name, "tasks.json")
+        self.db_file = os.path.join(self.tmpdir.name, "tasks.db")
+        tasks.TASKS_FILE = self.tasks_file
+        tasks.STORAGE = "sqlite"
+
+    def tearDown(self) -> None:
+        tasks.STORAGE = "json"
+        self.tmpdir.cleanup()
+
+    def run_main(self, *argv):
+        buf = io.StringIO()
+        with redirect_stdout(buf):
+            tasks.main(list(argv))
+        return buf.getvalue().strip()
+
+    def test_commands(self):
+        self.run_main("add", "First")
+        self.run_main("add", "Second")
+        self.run_main("add", "Third")
+        self.assertEqual(self.run_main("complete", "1"), "Task 1 marked completed.")
+        self.assertEqual(self.run_main("list"), "2. Second\n3. Third")
+        self.assertEqual(self.run_main("delete", "--completed", "3"), "Deleted 2 tasks.")
+        self.assertEqual(self.run_main("add", "Fourth"), "Added task 4: Fourth")
+        self.assertFalse(os.path.exists(self.tasks_file))
+
+    def test_list_uses_completed_index(self):
+        self.run_main("add", "Only")
+        conn = sqlite3.connect(self.db_file)
+        plan = " ".join(row[-1] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id, description, completed, created_at FROM tasks "
+            "WHERE completed = 0 ORDER BY id"))
+        conn.close()
+        self.assertIn("idx_tasks_completed", plan)
+
+    def test_existing_json_is_migrated(self):
+        tasks.STORAGE = "json"
+        with redirect_stdout(io.StringIO()):
+            tasks.add_tasks(["Old one", "Old two", "Old three"])
+            tasks.complete_task(1)
+            tasks.delete_task(3)
+        tasks.STORAGE = "sqlite"
+
+        with mock.patch("sys.stderr", new_callable=io.StringIO) as err:
+            out = self.run_main("list")
+        self.assertIn("Imported 2 tasks", err.getvalue())
+        self.assertEqual(out, "2. Old two")
+        # deleted id 3 stays retired, and the import happens only once
+        self.assertEqual(self.run_main("add", "New"), "Added task 4: New")
+        self.assertEqual(self.run_main("list"), "2. Old two\n4. New")
+
+
+class TestFileFormats(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.tasks_file = os.path.join(self.tmpdir.name, "tasks.json")
+        tasks.TASKS_FILE = self.tasks_file
+        tasks.STORAGE = "json"
+        self.sample = [{"id": i, "description": f"Tâche {i}", "completed": i % 3 == 0,
+                        "created_at": None if i == 2 else f"2025-01-0{i}T00:00:00Z"}
+                       for i in range(1, 8)]
+
+    def tearDown(self) -> None:
+        tasks.FORMAT = None
+        self.tmpdir.cleanup()
+
+    def test_round_trip_and_detection(self):
+        for fmt in tasks.FORMATS:
+            with self.subTest(fmt=fmt):
+                tasks.save_tasks(self.sample, fmt)
+                self.assertEqual(tasks.detect_format(self.tasks_file), fmt)
+                self.assertEqual(tasks.load_snapshot(), self.sample)
+
+    def test_empty_list_keeps_the_configured_format(self):
+        tasks.save_tasks([], "pretty")
+        self.assertIsNone(tasks.detect_format(self.tasks_file))
+        tasks.save_tasks(self.sample[:1])
+        self.assertEqual(tasks.detect_format(self.tasks_file), "pretty")
+        tasks.FORMAT = "compact"
+        tasks.save_tasks([])
+        tasks.save_tasks(self.sample[:1])
+        self.assertEqual(tasks.detect_format(self.tasks_file), "compact")
+
+    def test_changes_keep_the_file_format(self):
+        tasks.save_tasks(self.sample, "binary")
+        with redirect_stdout(io.StringIO()):
+            tasks.add_task("Eighth")
+            tasks.complete_task(8)
+        self.assertEqual(tasks.detect_format(self.tasks_file), "binary")
+        self.assertEqual(tasks.load_tasks()[-1]["description"], "Eighth")
+
+    def test_convert_folds_the_journal(self):
+        tasks.save_tasks(self.sample, "pretty")
+        tasks.STORAGE = "journal"
+        try:
+            with redirect_stdout(io.StringIO()) as out:
+                tasks.add_task("Journaled")
+                tasks.main(["convert", "compact"])
+        finally:
+            tasks.STORAGE = "json"
+        self.assertIn("Converted 8 tasks to compact", out.getvalue())
+        self.assertEqual(tasks.detect_format(self.tasks_file), "compact")
+        self.assertEqual(os.path.getsize(os.path.join(self.tmpdir.name, "tasks.log")), 0)
+        self.assertEqual(tasks.load_snapshot()[-1]["description"], "Journaled")
+
+
+class TestStreamingList(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        tasks.TASKS_FILE = os.path.join(self.tmpdir.name, "tasks.json")
+        tasks.STORAGE = "json"
+        # an archive: mostly completed, a few open tasks scattered through it
+        self.archive = [{"id": i, "description": f"Archived task {i} " + "x" * 200,
+                         "completed": i % 500 != 0, "created_at": "2025-01-01T00:00:00Z"}
+                        for i in range(1, 50_001)]
+
+    def tearDown(self) -> None:
+        tasks.STORAGE = "json"
+        self.tmpdir.cleanup()
+
+    def list_output(self, limit=None):
+        buf = io.StringIO()
+        with redirect_stdout(buf):
+            tasks.list_tasks(limit)
+        return buf.getvalue().splitlines()
+
+    def test_stream_matches_full_load_with_journal(self):
+        tasks.save_tasks(self.archive[:1000], "compact")
+        tasks.STORAGE = "journal"
+        with redirect_stdout(io.StringIO()):
+            tasks.add_task("New one")
+            tasks.complete_tasks([(500, 500)])
+            tasks.delete_tasks([(1000, 1000)])
+        # a repeated add (crash during compaction) must not show twice
+        tasks.append_event({"op": "add", "task": self.archive[0]})
+        expected = [t for t in tasks.load_tasks() if not t["completed"]]
+        self.assertEqual([t for t in tasks.iter_tasks() if not t["completed"]], expected)
+        self.assertEqual(self.list_output(), ["1001. New one"])
+
+    def test_limit(self):
+        tasks.save_tasks(self.archive, "pretty")
+        self.assertEqual(self.list_output(limit=2), [f"500. Archived task 500 {'x' * 200}",
+                                                     f"1000. Archived task 1000 {'x' * 200}"])
+        self.assertEqual(len(self.list_output()), 100)
+
+    def test_peak_memory_is_one_record_not_the_file(self):
+        for fmt in ("pretty", "binary"):
+            with self.subTest(fmt=fmt):
+                tasks.save_tasks(self.archive, fmt)
+                size = os.path.getsize(tasks.TASKS_FILE)
+                with open(os.devnull, "w") as sink, redirect_stdout(sink):
+                    tracemalloc.start()
+                    tasks.list_tasks()
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                # the file is ~11 MB; streaming keeps about one read chunk
+                self.assertLess(peak, 1024 * 1024)
+                self.assertLess(peak, size / 10)
+
+
+class TestJournalStorage(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.tasks_file = os.path.join(self.tmpdir.name, "tasks.json")
+        self.log_file = os.path.join(self.tmpdir.name, "tasks.log")
+        tasks.TASKS_FILE = self.tasks_file
+        tasks.STORAGE = "journal"
+        self.compact_bytes = tasks.LOG_COMPACT_BYTES
+
+    def tearDown(self) -> None:
+        tasks.STORAGE = "json"
+        tasks.LOG_COMPACT_BYTES = self.compact_bytes
+        self.tmpdir.cleanup()
+
+    def quiet(self, func, *args):
+        with redirect_stdout(io.StringIO()):
+            return func(*args)
+
+    def test_mutations_append_to_log(self):
+        self.quiet(tasks.add_task, "First")
+        self.quiet(tasks.add_task, "Second")
+        self.quiet(tasks.complete_task, 1)
+        self.quiet(tasks.delete_task, 2)
+
+        # snapshot untouched, one small line per change
+        self.assertFalse(os.path.exists(self.tasks_file))
+        with open(self.log_file, "r", encoding="utf-8") as f:
+            ops = [json.loads(line)["op"] for line in f]
+        self.assertEqual(ops, ["add", "add", "complete", "delete"])
+
+        state = tasks.load_tasks()
+        self.assertEqual([(t["id"], t["completed"]) for t in state], [(1, True)])
+
+    def test_bytes_written_do_not_grow_with_task_count(self):
+        for i in range(200):
+            self.quiet(tasks.add_task, f"Task {i}")
+        before = os.path.getsize(self.log_file)
+        self.quiet(tasks.complete_task, 5)
+        self.assertLess(os.path.getsize(self.log_file) - before, 64)
+
+    def test_compaction_and_replay_are_idempotent(self):
+        tasks.LOG_COMPACT_BYTES = 500
+        for i in range(10):
+            self.quiet(tasks.add_task, f"Task {i}")
+        # log was folded into the snapshot at least once
+        with open(self.tasks_file, "r", encoding="utf-8") as f:
+            self.assertGreater(len(json.load(f)), 0)
+        self.assertLess(os.path.getsize(self.log_file), 500)
+        self.assertEqual([t["id"] for t in tasks.load_tasks()], list(range(1, 11)))
+
+        # crash between snapshot and log truncation: replaying again changes nothing
+        snapshot = tasks.load_tasks()
+        tasks.save_tasks(snapshot)
+        self.assertEqual(tasks.load_tasks(), snapshot)
+
+    def test_torn_last_line_is_ignored(self):
+        self.quiet(tasks.add_task, "Kept")
+        with open(self.log_file, "a", encoding="utf-8") as f:
+            f.write('{"op": "add", "task": {"id": 2, "desc')
+        self.assertEqual([t["id"] for t in tasks.load_tasks()], [1])
+        # the next change still lands on its own line
+        self.quiet(tasks.add_task, "After crash")
+        self.assertEqual([t["description"] for t in tasks.load_tasks()], ["Kept", "After crash"])
+
+    def test_switching_back_to_json_keeps_changes(self):
+        self.quiet(tasks.add_task, "Journaled")
+        tasks.STORAGE = "json"
+        self.quiet(tasks.add_task, "Saved as json")
+        self.assertFalse(os.path.exists(self.log_file))
+        with open(self.tasks_file, "r", encoding="utf-8") as f:
+            self.assertEqual([t["description"] for t in json.load(f)], ["Journaled", "Saved as json"])
+
+
+class TestDurability(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        tasks.TASKS_FILE = os.path.join(self.tmpdir.name, "tasks.json")
+
+    def tearDown(self) -> None:
+        tasks.STORAGE = "json"
+        tasks.DURABILITY = "normal"
+        self.tmpdir.cleanup()
+
+    def count_fsyncs(self, storage, level):
+        """fsync calls made by one add, split into (files, directories)."""
+        tasks.STORAGE = storage
+        files, dirs = [], []
+        real_fsync = os.fsync
+
+        def fsync(fd):
+            (dirs if os.path.isdir(f"/proc/self/fd/{fd}") else files).append(fd)
+            real_fsync(fd)
+
+        with mock.patch("os.fsync", fsync), redirect_stdout(io.StringIO()):
+            tasks.main(["--durability", level, "add", f"{storage} {level}"])
+        return len(files), len(dirs)
+
+    @unittest.skipUnless(os.path.isdir("/proc/self/fd"), "needs /proc to tell directories apart")
+    def test_levels_control_fsync(self):
+        self.assertEqual(self.count_fsyncs("json", "strict"), (1, 1))
+        self.assertEqual(self.count_fsyncs("json", "normal"), (1, 0))
+        self.assertEqual(self.count_fsyncs("json", "fast"), (0, 0))
+        self.assertEqual(self.count_fsyncs("journal", "normal"), (1, 0))
+        self.assertEqual(self.count_fsyncs("journal", "fast"), (0, 0))
+        self.assertEqual(len(tasks.load_tasks()), 5)
+
+    def test_sqlite_synchronous_follows_level(self):
+        tasks.STORAGE = "sqlite"
+        for level, expected in (("strict", 2), ("normal", 1), ("fast", 0)):
+            tasks.DURABILITY = level
+            with tasks.open_backend() as backend:
+                self.assertEqual(backend.conn.execute("PRAGMA synchronous").fetchone()[0], expected)
+
+    def test_unknown_level_is_rejected(self):
+        tasks.DURABILITY = "paranoid"
+        with mock.patch("sys.stderr", new_callable=io.StringIO) as err, self.assertRaises(SystemExit) as ctx:
+            tasks.main(["list"])
+        self.assertEqual(ctx.exception.code, 2)
+        self.assertIn("unknown durability", err.getvalue())
+
 
 if __name__ == "__main__":
     unittest.main()